@@ -0,0 +1,98 @@
+"""Vectorized payroll analytics across many months.
+
+The functions here take a frame of payroll rows (``ANALYTICS_COLUMNS``, one
+row per employee per month) and answer time-series and group-by questions
+with pandas group-bys. They never touch the database.
+"""
+
+ANALYTICS_COLUMNS = [
+    'year', 'month', 'employee_id', 'department', 'designation',
+    'gross_salary', 'total_deductions', 'net_salary',
+]
+GROUP_COLUMNS = ('department', 'designation')
+TOTAL_COLUMNS = ['total_gross_salary', 'total_deductions', 'total_net_salary']
+
+
+def empty_frame():
+    import pandas as pd
+    return pd.DataFrame({
+        'year': pd.Series(dtype='int64'),
+        'month': pd.Series(dtype='int64'),
+        'employee_id': pd.Series(dtype='int64'),
+        'department': pd.Series(dtype='object'),
+        'designation': pd.Series(dtype='object'),
+        'gross_salary': pd.Series(dtype='float64'),
+        'total_deductions': pd.Series(dtype='float64'),
+        'net_salary': pd.Series(dtype='float64'),
+    })
+
+
+def to_records(frame):
+    """``frame`` as a list of dicts of plain Python values, NaN as None."""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def aggregate(frame, keys):
+    return frame.groupby(keys, dropna=False).agg(
+        headcount=('employee_id', 'size'),
+        total_gross_salary=('gross_salary', 'sum'),
+        total_deductions=('total_deductions', 'sum'),
+        total_net_salary=('net_salary', 'sum'),
+    )
+
+
+def fill_periods(grouped, periods):
+    """Reindex a ``(year, month)``-indexed aggregate onto ``periods`` so
+    months without payroll show up with zero headcount and totals."""
+    import pandas as pd
+    index = pd.MultiIndex.from_tuples(periods, names=['year', 'month'])
+    grouped = grouped.reindex(index)
+    grouped[['headcount'] + TOTAL_COLUMNS] = grouped[['headcount'] + TOTAL_COLUMNS].fillna(0)
+    grouped['headcount'] = grouped['headcount'].astype('int64')
+    return grouped.reset_index()
+
+
+def monthly_trends(frame, periods):
+    """Headcount, pay totals and average/median net pay for each
+    ``(year, month)`` in ``periods``."""
+    grouped = aggregate(frame, ['year', 'month'])
+    net = frame.groupby(['year', 'month'])['net_salary']
+    grouped['average_net_salary'] = net.mean()
+    grouped['median_net_salary'] = net.median()
+    return to_records(fill_periods(grouped, periods))
+
+
+def group_trends(frame, periods, column):
+    """Headcount and pay totals per month for every value of ``column``,
+    ordered by value with missing values last."""
+    import pandas as pd
+    # A sentinel keeps missing values as an ordinary group through reindex.
+    missing = '\0'
+    frame = frame.assign(**{column: frame[column].fillna(missing)})
+    grouped = aggregate(frame, [column, 'year', 'month'])
+    values = sorted(grouped.index.get_level_values(column).unique(), key=lambda value: (value == missing, value))
+    index = pd.MultiIndex.from_tuples(
+        [(value, year, month) for value in values for year, month in periods], names=[column, 'year', 'month']
+    )
+    grouped = grouped.reindex(index)
+    grouped[['headcount'] + TOTAL_COLUMNS] = grouped[['headcount'] + TOTAL_COLUMNS].fillna(0)
+    grouped['headcount'] = grouped['headcount'].astype('int64')
+    records = to_records(grouped.reset_index())
+
+    size = len(periods)
+    return [{
+        column: None if value == missing else value,
+        'series': [{key: v for key, v in record.items() if key != column} for record in records[n * size:(n + 1) * size]],
+    } for n, value in enumerate(values)]
+
+
+def range_totals(frame, months):
+    """Totals over the whole range, and the headcount change from its first
+    month to its last."""
+    totals = {
+        column: float(frame[source].sum())
+        for column, source in zip(TOTAL_COLUMNS, ['gross_salary', 'total_deductions', 'net_salary'])
+    }
+    totals['employees'] = int(frame['employee_id'].nunique())
+    totals['headcount_change'] = months[-1]['headcount'] - months[0]['headcount'] if months else 0
+    return totals
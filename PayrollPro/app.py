@@ -1,27 +1,157 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import (
+    Blueprint, Flask, current_app, render_template, request, jsonify, session, redirect, url_for,
+    stream_with_context, abort, g, has_app_context, has_request_context
+)
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
 import os
+import base64
+import csv
+import io
+import json
+import time
+import uuid
+import hmac
+import random
+import hashlib
+import heapq
+import zipfile
+import calendar
+import click
 from functools import wraps
-import pandas as pd
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import groupby, islice
+from sqlalchemy import and_, bindparam, event, func, insert, or_, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import attributes
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
+from payroll_engine import (
+    SALARY_COMPONENTS, DEDUCTION_COMPONENTS, PAYROLL_COLUMNS, compute_payroll, payroll_records,
+    simulate_payroll, working_days_in_month
+)
+from migrations import (
+    PARTITION_KEYS, allocate_ids, create_year_partition, detach_year_partition, is_partitioned, sequential_scans,
+    upgrade
+)
+from attendance_bitmap import (
+    ALL_DAYS, STATUS_MASKS, count_days, day_bit, empty_masks, expand, pack_ids, status_on, unpack_ids
+)
+from cache import TTLCache
+from analytics import ANALYTICS_COLUMNS, GROUP_COLUMNS, empty_frame, group_trends, monthly_trends, range_totals
+from metrics import COUNT_BUCKETS, LATENCY_BUCKETS, ROW_BUCKETS, Counter, Gauge, Histogram, render
+from serializers import (
+    ATTENDANCE_FIELDS, EMPLOYEE_ATTENDANCE_FIELDS, EMPLOYEE_DETAIL_FIELDS, EMPLOYEE_LEAVE_FIELDS,
+    EMPLOYEE_LIST_FIELDS, EMPLOYEE_PROFILE_FIELDS, LEAVE_FIELDS, PAYROLL_FIELDS, PAYSLIP_EXPORT_FIELDS,
+    PAYSLIP_FIELDS, serialize
+)
 
-database_url = os.environ.get('DATABASE_URL')
-if not database_url:
-    raise RuntimeError(
-        "DATABASE_URL environment variable is not set. "
-        "Please configure the PostgreSQL database connection."
+# Configuration
+def engine_options(url):
+    """Pool and timeout settings for the engine at ``url``, from the
+    ``DB_*`` environment variables."""
+    options = {
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    if url.startswith('sqlite'):
+        return options
+    options.update(
+        pool_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30)),
     )
+    statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    if statement_timeout and url.startswith('postgres'):
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
 
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+class Config:
+    """Production settings. They are read from the environment when the
+    object is created rather than at import, so a script can set variables
+    before building an app with ``create_app``."""
+    def __init__(self):
+        database_url = self.database_url()
+        if not database_url:
+            raise RuntimeError(
+                "DATABASE_URL environment variable is not set. "
+                "Please configure the PostgreSQL database connection."
+            )
+        self.SECRET_KEY = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
+        self.SQLALCHEMY_DATABASE_URI = database_url
+        self.SQLALCHEMY_ENGINE_OPTIONS = engine_options(database_url)
+        read_url = os.environ.get('DATABASE_READ_URL')
+        if read_url:
+            self.SQLALCHEMY_BINDS = {'replica': {'url': read_url, **engine_options(read_url)}}
+        self.REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+        self.SQLALCHEMY_TRACK_MODIFICATIONS = False
+        self.ATTENDANCE_BATCH_SIZE = int(os.environ.get('ATTENDANCE_BATCH_SIZE', 1000))
+        self.ATTENDANCE_STORAGE = os.environ.get('ATTENDANCE_STORAGE', 'rows')
+        if self.ATTENDANCE_STORAGE not in ('rows', 'bitmap'):
+            raise RuntimeError("ATTENDANCE_STORAGE must be 'rows' or 'bitmap'")
+        self.PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 100))
+        self.MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+        self.STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 1000))
+        self.SYNC_OVERLAP_SECONDS = int(os.environ.get('SYNC_OVERLAP_SECONDS', 10))
+        self.SYNC_MAX_ITEMS = int(os.environ.get('SYNC_MAX_ITEMS', 5000))
+        # SQLite takes one writer at a time, so parallel shards would only wait on each other.
+        self.PAYROLL_WORKERS = int(os.environ.get(
+            'PAYROLL_WORKERS', 1 if database_url.startswith('sqlite') else os.cpu_count() or 1
+        ))
+        self.PAYROLL_SHARD_SIZE = int(os.environ.get('PAYROLL_SHARD_SIZE', 2000))
+        self.PAYROLL_CHUNK_SIZE = int(os.environ.get('PAYROLL_CHUNK_SIZE', 500))
+        self.PAYROLL_JOB_STALE_SECONDS = int(os.environ.get('PAYROLL_JOB_STALE_SECONDS', 600))
+        self.PAYSLIP_WORKERS = int(os.environ.get('PAYSLIP_WORKERS', 2))
+        self.ONBOARDING_BATCH_SIZE = int(os.environ.get('ONBOARDING_BATCH_SIZE', 1000))
+        self.PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+        self.EMPLOYEE_CACHE_SIZE = int(os.environ.get('EMPLOYEE_CACHE_SIZE', 10000))
+        self.EMPLOYEE_CACHE_TTL = int(os.environ.get('EMPLOYEE_CACHE_TTL', 300))
+        self.METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+        self.METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+        self.SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 0))
+        # Unset directories default to the app's instance folder; see create_app.
+        self.ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')
+        self.ARCHIVE_ROW_GROUP_SIZE = int(os.environ.get('ARCHIVE_ROW_GROUP_SIZE', 50000))
+        self.ANALYTICS_DIR = os.environ.get('ANALYTICS_DIR')
+        self.ANALYTICS_MAX_MONTHS = int(os.environ.get('ANALYTICS_MAX_MONTHS', 60))
+        self.ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', 120))
+        self.SIMULATION_MAX_SCENARIOS = int(os.environ.get('SIMULATION_MAX_SCENARIOS', 1000))
+        self.ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 32))
+
+    def database_url(self):
+        return os.environ.get('DATABASE_URL')
+
+class DevelopmentConfig(Config):
+    """Like ``Config``, but without ``DATABASE_URL`` the app uses
+    ``payroll.db`` in the instance folder."""
+    def database_url(self):
+        return os.environ.get('DATABASE_URL') or 'sqlite:///payroll.db'
+
+CONFIGS = {'production': Config, 'development': DevelopmentConfig}
 
-db = SQLAlchemy(app)
-CORS(app)
+class RoutingSession(FlaskSession):
+    """Session that sends plain SELECTs to the ``replica`` bind during
+    requests marked by ``read_replica``. Everything else goes to the primary,
+    and so does the rest of the request once it has written anything."""
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('read_replica'):
+            if not self._flushing and not (self.new or self.dirty or self.deleted) \
+                    and getattr(clause, 'is_select', False):
+                return self._db.engines['replica']
+            g.read_replica = False
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+bp = Blueprint('payroll', __name__, cli_group=None)
+# Both caches are sized from the config by ``create_app``.
+employee_cache = TTLCache(0, 0)
+# Snapshot frames never change once written, so they only expire by LRU.
+snapshot_cache = TTLCache(0, float('inf'))
 
 # Models
 class User(db.Model):
@@ -53,85 +183,2416 @@ class Employee(db.Model):
     other_deductions = db.Column(db.Float, default=0)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    attendance_records = db.relationship('Attendance', backref='employee', lazy=True)
+    payroll_records = db.relationship('Payroll', backref='employee', lazy=True)
+    leave_records = db.relationship('Leave', backref='employee', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_employees_updated', 'updated_at'),
+    )
+
+class Attendance(db.Model):
+    __tablename__ = 'attendance'
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # 'present', 'absent', 'half-day', 'leave'
+    remarks = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('uq_attendance_employee_date', 'employee_id', 'date', unique=True),
+        db.Index('ix_attendance_date', 'date', 'id'),
+        db.Index('ix_attendance_updated', 'updated_at'),
+    )
+
+class AttendanceMonthlySummary(db.Model):
+    __tablename__ = 'attendance_monthly_summary'
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    present_days = db.Column(db.Integer, nullable=False, default=0)
+    half_days = db.Column(db.Integer, nullable=False, default=0)
+    absent_days = db.Column(db.Integer, nullable=False, default=0)
+    leave_days = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_attendance_summary_period', 'year', 'month'),
+    )
+
+class AttendanceMonth(db.Model):
+    """A month of one employee's attendance packed into status bitmasks, used
+    instead of ``Attendance`` rows when ``ATTENDANCE_STORAGE`` is 'bitmap'."""
+    __tablename__ = 'attendance_months'
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    present_mask = db.Column(db.Integer, nullable=False, default=0)
+    half_day_mask = db.Column(db.Integer, nullable=False, default=0)
+    absent_mask = db.Column(db.Integer, nullable=False, default=0)
+    leave_mask = db.Column(db.Integer, nullable=False, default=0)
+    day_ids = db.Column(db.LargeBinary)  # attendance id per day, see attendance_bitmap.DAY_IDS
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_attendance_months_period', 'year', 'month'),
+        db.Index('ix_attendance_months_updated', 'updated_at'),
+    )
+
+class AttendanceRemark(db.Model):
+    """Remarks for bitmap-stored attendance. Only days with a remark have a row."""
+    __tablename__ = 'attendance_remarks'
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    remarks = db.Column(db.String(200))
+    
+    __table_args__ = (
+        db.Index('ix_attendance_remarks_date', 'date'),
+    )
+
+class Leave(db.Model):
+    __tablename__ = 'leaves'
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
+    leave_type = db.Column(db.String(50), nullable=False)  # 'sick', 'casual', 'earned'
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    days = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.Text)
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'approved', 'rejected'
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_leaves_status_applied', 'status', 'applied_at'),
+        db.Index('ix_leaves_employee_applied', 'employee_id', 'applied_at'),
+        db.Index('ix_leaves_updated', 'updated_at'),
+    )
+
+class Payroll(db.Model):
+    __tablename__ = 'payroll'
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    basic_salary = db.Column(db.Float, nullable=False)
+    hra = db.Column(db.Float, default=0)
+    da = db.Column(db.Float, default=0)
+    ta = db.Column(db.Float, default=0)
+    other_allowances = db.Column(db.Float, default=0)
+    gross_salary = db.Column(db.Float, nullable=False)
+    pf_deduction = db.Column(db.Float, default=0)
+    tax_deduction = db.Column(db.Float, default=0)
+    other_deductions = db.Column(db.Float, default=0)
+    total_deductions = db.Column(db.Float, nullable=False)
+    net_salary = db.Column(db.Float, nullable=False)
+    working_days = db.Column(db.Integer, default=0)
+    present_days = db.Column(db.Integer, default=0)
+    absent_days = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(20), default='draft')  # 'draft', 'processed', 'paid'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('uq_payroll_employee_period', 'employee_id', 'year', 'month', unique=True),
+        db.Index('ix_payroll_period_created', 'year', 'month', 'created_at'),
+        db.Index('ix_payroll_updated', 'updated_at'),
+    )
+
+class PayrollSummaryCache(db.Model):
+    __tablename__ = 'payroll_summary_cache'
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    summary = db.Column(db.Text, nullable=False)  # JSON report body
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PayrollSnapshot(db.Model):
+    """An on-disk analytics snapshot of a closed month's payroll, valid for
+    as long as this row exists."""
+    __tablename__ = 'payroll_snapshots'
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    row_count = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class PayrollDirty(db.Model):
+    """An (employee, month) whose payroll inputs changed after it was
+    processed and that is waiting for ``recompute_dirty_payroll``."""
+    __tablename__ = 'payroll_dirty'
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    marked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class IdCounter(db.Model):
+    """The highest id handed out for ``name`` by ``migrations.allocate_ids``
+    on databases without sequences."""
+    __tablename__ = 'id_counters'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class ArchivedYear(db.Model):
+    """A year of ``table_name`` moved out of the live table into a Parquet
+    file by ``archive_year``."""
+    __tablename__ = 'archived_years'
+    table_name = db.Column(db.String(50), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(500), nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PayslipDocument(db.Model):
+    """A payslip rendered from the employee's payroll row as it was at
+    ``payroll_updated_at``. ``content_hash`` is the SHA-256 of ``content``
+    and names the document in its URL."""
+    __tablename__ = 'payslip_documents'
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    payroll_updated_at = db.Column(db.DateTime)
+    content_hash = db.Column(db.String(64), nullable=False)
+    content = db.Column(db.LargeBinary, nullable=False)
+    rendered_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_payslip_documents_hash', 'content_hash'),
+    )
+
+class PayrollJob(db.Model):
+    __tablename__ = 'payroll_jobs'
+    id = db.Column(db.String(36), primary_key=True)
+    month = db.Column(db.Integer, nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    shard_by = db.Column(db.String(20), nullable=False)  # 'department' or 'employee_range'
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'completed', 'failed'
+    total_employees = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    shards = db.relationship('PayrollJobShard', backref='job', lazy=True, order_by='PayrollJobShard.shard_no')
+
+class PayrollJobShard(db.Model):
+    __tablename__ = 'payroll_job_shards'
+    job_id = db.Column(db.String(36), db.ForeignKey('payroll_jobs.id'), primary_key=True)
+    shard_no = db.Column(db.Integer, primary_key=True)
+    department = db.Column(db.String(50))
+    first_employee_id = db.Column(db.Integer)
+    last_employee_id = db.Column(db.Integer)
+    total_employees = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'completed', 'failed'
+    processed_count = db.Column(db.Integer, nullable=False, default=0)
+    chunks_done = db.Column(db.Integer, default=0)
+    employees_done = db.Column(db.Integer, default=0)  # employees up to the checkpoint
+    checkpoint_employee_id = db.Column(db.Integer)  # last employee id of the last committed chunk
+    heartbeat_at = db.Column(db.DateTime)  # last commit of a running shard; see payroll_job_stale
+    failed_employee_ids = db.Column(db.Text)  # JSON list, retried first on resume
+    error = db.Column(db.Text)
+    finished_at = db.Column(db.DateTime)
+
+# Authentication decorator
+def login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('.login'))
+        if session.get('role') != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def read_replica(f):
+    """Serve a GET's reads from the replica, when one is configured, unless
+    this client wrote something in the last ``REPLICA_STICKY_SECONDS``."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if (request.method in ('GET', 'HEAD') and 'replica' in db.engines
+                and session.get('primary_until', 0) < time.time()):
+            g.read_replica = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.pop('read_replica', None)
+    return decorated_function
+
+@bp.after_app_request
+def stick_to_primary_after_write(response):
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and 'replica' in db.engines:
+        session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+def dialect_insert(model):
+    """Return an INSERT for ``model`` that supports ``on_conflict_*`` on the
+    configured database."""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    return upsert(model)
+
+def bulk_request_rows(key):
+    """Read the rows of a bulk upload: a CSV file field, a ``text/csv`` body,
+    a JSON array or a JSON object holding the array under ``key``."""
+    if 'file' in request.files:
+        text = request.files['file'].read().decode('utf-8-sig')
+        return list(csv.DictReader(io.StringIO(text)))
+    if request.mimetype == 'text/csv':
+        return list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+    rows = request.get_json(silent=True)
+    if isinstance(rows, dict):
+        rows = rows.get(key, [])
+    return rows
+
+# Request metrics
+REQUEST_LABELS = ('method', 'route')
+request_seconds = Histogram(
+    'payroll_request_duration_seconds', 'Time to handle a request, including streamed bodies.',
+    LATENCY_BUCKETS, REQUEST_LABELS
+)
+request_sql_statements = Histogram(
+    'payroll_request_sql_statements', 'SQL statements executed per request.', COUNT_BUCKETS, REQUEST_LABELS
+)
+request_sql_seconds = Histogram(
+    'payroll_request_sql_duration_seconds', 'Time spent executing SQL per request.', LATENCY_BUCKETS, REQUEST_LABELS
+)
+request_sql_rows = Histogram(
+    'payroll_request_sql_rows', 'Rows returned or affected per request, as reported by the database driver.',
+    ROW_BUCKETS, REQUEST_LABELS
+)
+request_serialize_seconds = Histogram(
+    'payroll_request_serialize_duration_seconds', 'Time spent encoding JSON per request.',
+    LATENCY_BUCKETS, REQUEST_LABELS
+)
+slow_queries = Counter('payroll_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.', ('route',))
+employee_cache_counters = {
+    name: Counter(f'payroll_employee_cache_{name}_total', f'Employee cache {name}.')
+    for name in ('hits', 'misses', 'evictions', 'invalidations')
+}
+employee_cache_entries = Gauge('payroll_employee_cache_entries', 'Entries in the employee cache.')
+
+def current_request_metrics():
+    return g.get('request_metrics') if has_request_context() else None
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Adds the time spent encoding JSON to the current request's metrics."""
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            request_metrics = current_request_metrics()
+            if request_metrics is not None:
+                request_metrics['serialize_seconds'] += time.perf_counter() - started
+
+@bp.before_app_request
+def start_request_metrics():
+    if current_app.config['METRICS_ENABLED']:
+        g.request_metrics = {
+            'started': time.perf_counter(), 'statements': 0, 'sql_seconds': 0.0, 'rows': 0, 'serialize_seconds': 0.0
+        }
+
+@bp.after_app_request
+def record_request_metrics(response):
+    request_metrics = current_request_metrics()
+    if request_metrics is None:
+        return response
+    labels = (request.method, request.url_rule.rule if request.url_rule else 'unmatched')
+
+    # Streamed bodies are still being produced here, so record on close.
+    def record():
+        request_seconds.observe(time.perf_counter() - request_metrics['started'], *labels)
+        request_sql_statements.observe(request_metrics['statements'], *labels)
+        request_sql_seconds.observe(request_metrics['sql_seconds'], *labels)
+        request_sql_rows.observe(request_metrics['rows'], *labels)
+        request_serialize_seconds.observe(request_metrics['serialize_seconds'], *labels)
+
+    response.call_on_close(record)
+    return response
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    request_metrics = current_request_metrics()
+    if request_metrics is not None:
+        request_metrics['statements'] += 1
+        request_metrics['sql_seconds'] += elapsed
+        request_metrics['rows'] += max(cursor.rowcount, 0)
+    threshold = current_app.config['SLOW_QUERY_MS'] if has_app_context() else 0
+    if threshold and elapsed * 1000 >= threshold:
+        route = request.url_rule.rule if has_request_context() and request.url_rule else 'background'
+        slow_queries.inc(route)
+        current_app.logger.warning('Slow query (%.1f ms, %s): %s', elapsed * 1000, route, ' '.join(statement.split())[:2000])
+
+@event.listens_for(Engine, 'handle_error')
+def discard_query_timer(context):
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+# Keyset pagination
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, keys):
+    """Decode a cursor produced by ``encode_cursor`` back into values typed
+    like the ``keys`` columns. Raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError('Invalid cursor')
+        decoded = []
+        for key, value in zip(keys, values):
+            python_type = key.type.python_type
+            decoded.append(python_type.fromisoformat(value) if hasattr(python_type, 'fromisoformat') else python_type(value))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    return decoded
+
+def wants_pagination():
+    return any(arg in request.args for arg in ('limit', 'cursor', 'stream'))
+
+def select_fields(model, fields):
+    """Build a column projection of ``model`` returning exactly ``fields``.
+    ``employee_name`` is taken from a join on ``Employee`` so listings never
+    lazy-load an employee per row."""
+    columns = [
+        Employee.name.label('employee_name') if field == 'employee_name' else getattr(model, field)
+        for field in fields
+    ]
+    stmt = db.select(*columns)
+    if 'employee_name' in fields:
+        stmt = stmt.join(Employee, Employee.id == model.employee_id)
+    return stmt
+
+def page_limit():
+    return min(max(int(request.args.get('limit', current_app.config['PAGE_SIZE'])), 1), current_app.config['MAX_PAGE_SIZE'])
+
+def stream_json_array(rows, fields):
+    """Stream ``rows`` as one JSON array without holding them in memory."""
+    def generate():
+        yield '['
+        first = True
+        for row in rows:
+            yield ('' if first else ',') + current_app.json.dumps(serialize(row, fields))
+            first = False
+        yield ']'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+def keyset_response(stmt, keys, fields, descending=False):
+    """Serve ``stmt`` ordered by the unique ``keys`` columns.
+
+    ``?limit=N&cursor=C`` returns ``{'items': [...], 'next_cursor': ...}``;
+    pass the cursor back to fetch the following page. Each page also carries a
+    ``since`` token; the first page's token fetches what changed after the
+    listing started (see ``sync_response``). ``?stream=1`` instead streams
+    every row as one JSON array read through a server-side cursor, so memory
+    stays flat however large the result is.
+    """
+    token = sync_token()
+    order = [key.desc() for key in keys] if descending else list(keys)
+    stmt = stmt.add_columns(*[key for key in keys if key.key not in fields]).order_by(*order)
+
+    if request.args.get('stream'):
+        return stream_json_array(
+            db.session.execute(stmt.execution_options(yield_per=current_app.config['STREAM_BATCH_SIZE'])), fields
+        )
+
+    try:
+        limit = page_limit()
+        cursor = request.args.get('cursor')
+        if cursor:
+            after = decode_cursor(cursor, keys)
+            boundary = tuple_(*keys) < tuple_(*after) if descending else tuple_(*keys) > tuple_(*after)
+            stmt = stmt.filter(boundary)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows = db.session.execute(stmt.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], key.key) for key in keys])
+
+    return jsonify({'items': [serialize(row, fields) for row in rows], 'next_cursor': next_cursor, 'since': token})
+
+# Delta sync
+def sync_token():
+    """A ``since`` token for changes made from now on."""
+    return encode_cursor([datetime.utcnow()])
+
+def sync_response(column, load, fields):
+    """Serve ``?since=<token>`` for a listing whose rows record their last
+    change in the ``updated_at`` ``column``.
+
+    ``load(since)`` returns the rows changed at or after ``since``, or every
+    row when ``since`` is None. ``?since=0`` returns the whole listing; any
+    other token returns the rows inserted or updated (including deactivated)
+    since the token was issued. Both answer ``{'items': [...], 'since': ...}``
+    with the token for the next call. Tokens reach back
+    ``SYNC_OVERLAP_SECONDS`` so rows committed late, or not yet on the
+    replica, are not missed; clients merge by ``id``, so repeats are harmless.
+    More than ``SYNC_MAX_ITEMS`` changes answer 410 and the client reloads.
+    """
+    token = sync_token()
+    since = request.args['since']
+    if since == '0':
+        since = None
+    else:
+        try:
+            since = decode_cursor(since, [column])[0] - timedelta(seconds=current_app.config['SYNC_OVERLAP_SECONDS'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    rows = load(since)
+    if since is not None:
+        rows = list(islice(rows, current_app.config['SYNC_MAX_ITEMS'] + 1))
+        if len(rows) > current_app.config['SYNC_MAX_ITEMS']:
+            return jsonify({'error': 'Too many changes since this token, reload the full list'}), 410
+    return jsonify({'items': [serialize(row, fields) for row in rows], 'since': token})
+
+def delta_response(stmt, column, fields, order):
+    """``sync_response`` for a listing query, filtered on ``column``."""
+    def load(since):
+        if since is None:
+            return db.session.execute(stmt.order_by(*order))
+        return db.session.execute(
+            stmt.filter(column >= since).order_by(*order).limit(current_app.config['SYNC_MAX_ITEMS'] + 1)
+        )
+
+    return sync_response(column, load, fields)
+
+# Attendance rollup
+SUMMARY_COLUMNS = {
+    'present': 'present_days',
+    'half-day': 'half_days',
+    'absent': 'absent_days',
+    'leave': 'leave_days'
+}
+
+def attendance_delta(deltas, employee_id, day, old_status, new_status):
+    """Record in ``deltas`` how changing one day's status from ``old_status``
+    to ``new_status`` moves the monthly summary counts."""
+    key = (int(employee_id), day.year, day.month)
+    counts = deltas.setdefault(key, dict.fromkeys(SUMMARY_COLUMNS.values(), 0))
+    if old_status in SUMMARY_COLUMNS:
+        counts[SUMMARY_COLUMNS[old_status]] -= 1
+    if new_status in SUMMARY_COLUMNS:
+        counts[SUMMARY_COLUMNS[new_status]] += 1
+    return deltas
+
+def apply_attendance_deltas(deltas):
+    """Add the counts collected by ``attendance_delta`` to the rollup table.
+    Runs in the caller's transaction so the rollup never drifts from the
+    attendance rows."""
+    rows = [
+        dict(employee_id=employee_id, year=year, month=month, **counts)
+        for (employee_id, year, month), counts in deltas.items()
+        if any(counts.values())
+    ]
+    if not rows:
+        return
+    stmt = dialect_insert(AttendanceMonthlySummary)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['employee_id', 'year', 'month'],
+        set_={
+            column: getattr(AttendanceMonthlySummary, column) + getattr(stmt.excluded, column)
+            for column in SUMMARY_COLUMNS.values()
+        }
+    )
+    db.session.execute(stmt, rows)
+
+def rebuild_attendance_summary(year=None, month=None):
+    """Recompute the rollup from the stored attendance, optionally for a
+    single year or month. Returns the number of summary rows written."""
+    if current_app.config['ATTENDANCE_STORAGE'] == 'bitmap':
+        return rebuild_attendance_summary_from_bitmaps(year, month)
+    attendance_year = func.extract('year', Attendance.date)
+    attendance_month = func.extract('month', Attendance.date)
+
+    query = db.select(
+        Attendance.employee_id, attendance_year, attendance_month, Attendance.status, func.count()
+    ).group_by(Attendance.employee_id, attendance_year, attendance_month, Attendance.status)
+    delete = db.delete(AttendanceMonthlySummary)
+    if year:
+        query = query.filter(attendance_year == year)
+        delete = delete.filter(AttendanceMonthlySummary.year == year)
+    if month:
+        query = query.filter(attendance_month == month)
+        delete = delete.filter(AttendanceMonthlySummary.month == month)
+
+    archived = archived_years('attendance')
+    if archived:
+        # Archived rows are gone from the table but their rollup is kept.
+        delete = delete.filter(AttendanceMonthlySummary.year.notin_(archived))
+
+    summaries = {}
+    for employee_id, row_year, row_month, status, days in db.session.execute(query):
+        if status not in SUMMARY_COLUMNS:
+            continue
+        key = (employee_id, int(row_year), int(row_month))
+        counts = summaries.setdefault(key, dict.fromkeys(SUMMARY_COLUMNS.values(), 0))
+        counts[SUMMARY_COLUMNS[status]] += days
+    return replace_attendance_summary(delete, summaries)
+
+def rebuild_attendance_summary_from_bitmaps(year=None, month=None):
+    """``rebuild_attendance_summary`` for packed attendance: every count is
+    the popcount of one mask."""
+    query = db.select(
+        AttendanceMonth.employee_id, AttendanceMonth.year, AttendanceMonth.month,
+        *[getattr(AttendanceMonth, column) for column in STATUS_MASKS.values()]
+    )
+    delete = db.delete(AttendanceMonthlySummary)
+    if year:
+        query = query.filter(AttendanceMonth.year == year)
+        delete = delete.filter(AttendanceMonthlySummary.year == year)
+    if month:
+        query = query.filter(AttendanceMonth.month == month)
+        delete = delete.filter(AttendanceMonthlySummary.month == month)
+
+    archived = archived_years('attendance')
+    if archived:
+        delete = delete.filter(AttendanceMonthlySummary.year.notin_(archived))
+
+    summaries = {}
+    for row in db.session.execute(query):
+        counts = count_days(row._asdict())
+        if any(counts.values()):
+            summaries[(row.employee_id, row.year, row.month)] = {
+                SUMMARY_COLUMNS[status]: days for status, days in counts.items()
+            }
+    return replace_attendance_summary(delete, summaries)
+
+def replace_attendance_summary(delete, summaries):
+    db.session.execute(delete)
+    if summaries:
+        db.session.execute(insert(AttendanceMonthlySummary), [
+            dict(employee_id=employee_id, year=row_year, month=row_month, **counts)
+            for (employee_id, row_year, row_month), counts in summaries.items()
+        ])
+    db.session.commit()
+    return len(summaries)
+
+@bp.cli.command('rebuild-attendance-summary')
+@click.option('--year', type=int, help='Only rebuild this year.')
+@click.option('--month', type=int, help='Only rebuild this month.')
+def rebuild_attendance_summary_command(year, month):
+    """Backfill the monthly attendance rollup from the stored attendance."""
+    count = rebuild_attendance_summary(year, month)
+    click.echo(f'Rebuilt {count} attendance summary rows')
+
+# Attendance writes
+ATTENDANCE_STATUSES = ('present', 'absent', 'half-day', 'leave')
+
+def validate_attendance_rows(rows):
+    """Validate raw attendance dicts in one pass.
+
+    Returns ``(records, errors)`` where ``records`` holds ``(row, record)``
+    pairs of clean rows and their original index, and ``errors`` lists
+    ``{'row', 'error'}`` entries. When the same employee and date appear more
+    than once the first row is kept and the others are reported as errors.
+    """
+    parsed = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            employee_id = int(row['employee_id'])
+            date = datetime.strptime(str(row['date']).strip(), '%Y-%m-%d').date()
+        except (KeyError, TypeError, ValueError) as e:
+            errors.append({'row': index, 'error': f'Invalid employee_id or date: {e}'})
+            continue
+        status = str(row.get('status') or '').strip()
+        if status not in ATTENDANCE_STATUSES:
+            errors.append({'row': index, 'error': f'Invalid status: {status!r}'})
+            continue
+        remarks = row.get('remarks') or ''
+        if not isinstance(remarks, str):
+            errors.append({'row': index, 'error': f'Remarks must be a string, not {type(remarks).__name__}'})
+            continue
+        if len(remarks) > 200:
+            errors.append({'row': index, 'error': 'Remarks longer than 200 characters'})
+            continue
+        parsed.append((index, {'employee_id': employee_id, 'date': date, 'status': status, 'remarks': remarks}))
+
+    employee_ids = {record['employee_id'] for _, record in parsed}
+    known = {
+        employee_id for (employee_id,) in db.session.execute(
+            db.select(Employee.id).filter(Employee.id.in_(employee_ids))
+        )
+    } if employee_ids else set()
+
+    records = {}
+    for index, record in parsed:
+        if record['employee_id'] not in known:
+            errors.append({'row': index, 'error': f"Unknown employee_id: {record['employee_id']}"})
+            continue
+        key = (record['employee_id'], record['date'])
+        if key in records:
+            errors.append({'row': index, 'error': f'Duplicate of row {records[key][0]}'})
+            continue
+        records[key] = (index, record)
+
+    return list(records.values()), errors
+
+def write_attendance_rows(records, overwrite):
+    """Write ``records`` as ``Attendance`` rows with a single
+    ``INSERT ... ON CONFLICT``. Returns the status each day had before."""
+    keys = [(r['employee_id'], r['date']) for r in records]
+    existing = dict(
+        ((employee_id, date), status) for employee_id, date, status in db.session.execute(
+            db.select(Attendance.employee_id, Attendance.date, Attendance.status)
+            .filter(tuple_(Attendance.employee_id, Attendance.date).in_(keys))
+        )
+    )
+
+    stmt = dialect_insert(Attendance)
+    if overwrite:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['employee_id', 'date'],
+            set_={
+                'status': stmt.excluded.status,
+                'remarks': stmt.excluded.remarks,
+                'updated_at': stmt.excluded.updated_at
+            }
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=['employee_id', 'date'])
+    db.session.execute(stmt, records)
+    return existing
+
+def write_attendance_bitmaps(records, overwrite):
+    """Write ``records`` into the packed ``AttendanceMonth`` rows. Returns the
+    status each day had before.
+
+    The month rows are created if missing and locked first, so concurrent
+    writes to the same month wait for each other instead of losing days.
+    New days get attendance ids from ``allocate_ids`` unless the record
+    carries its row ``id``; rewritten days keep theirs. Remarks are stored
+    only when non-empty."""
+    months = {}
+    for record in records:
+        if record['status'] not in STATUS_MASKS:
+            raise ValueError(f"Invalid status: {record['status']!r}")
+        day = record['date']
+        months.setdefault((record['employee_id'], day.year, day.month), []).append(record)
+    if not months:
+        return {}
+
+    db.session.execute(
+        dialect_insert(AttendanceMonth).on_conflict_do_nothing(index_elements=['employee_id', 'year', 'month']),
+        [{'employee_id': employee_id, 'year': year, 'month': month} for employee_id, year, month in months]
+    )
+    mask_columns = [getattr(AttendanceMonth, column) for column in STATUS_MASKS.values()]
+    stored = {
+        (row.employee_id, row.year, row.month): row._asdict()
+        for row in db.session.execute(
+            db.select(
+                AttendanceMonth.employee_id, AttendanceMonth.year, AttendanceMonth.month, *mask_columns,
+                AttendanceMonth.day_ids
+            )
+            .filter(tuple_(AttendanceMonth.employee_id, AttendanceMonth.year, AttendanceMonth.month).in_(list(months)))
+            .with_for_update()
+        )
+    }
+
+    existing = {}
+    updates = []
+    written = []
+    new_days = []
+    for (employee_id, year, month), month_records in months.items():
+        masks = stored[(employee_id, year, month)]
+        ids = unpack_ids(masks['day_ids'])
+        bits = empty_masks()
+        days = 0
+        for record in month_records:
+            status = status_on(masks, record['date'])
+            if status:
+                existing[(employee_id, record['date'])] = status
+                if not overwrite:
+                    continue
+            bit = day_bit(record['date'])
+            days |= bit
+            for column in bits:
+                bits[column] &= ~bit
+            bits[STATUS_MASKS[record['status']]] |= bit
+            index = record['date'].day - 1
+            if record.get('id'):
+                ids[index] = record['id']
+            elif not ids[index]:
+                new_days.append((ids, index))
+            written.append(record)
+        if days:
+            updates.append({
+                'p_employee_id': employee_id, 'p_year': year, 'p_month': month, 'p_keep': ALL_DAYS ^ days,
+                'p_day_ids': ids, **{f'p_{column}': value for column, value in bits.items()}
+            })
+    if not updates:
+        return existing
+
+    given = max((record.get('id') or 0 for record in written), default=0)
+    if new_days or given:
+        new_ids = allocate_ids(db.session.connection(), db.metadata, 'attendance', len(new_days), given)
+        for (ids, index), new_id in zip(new_days, new_ids):
+            ids[index] = new_id
+    for update in updates:
+        update['p_day_ids'] = pack_ids(update['p_day_ids'])
+    table = AttendanceMonth.__table__
+    db.session.execute(
+        table.update()
+        .where(
+            table.c.employee_id == bindparam('p_employee_id'),
+            table.c.year == bindparam('p_year'),
+            table.c.month == bindparam('p_month')
+        )
+        .values({
+            'day_ids': bindparam('p_day_ids'),
+            **{
+                column: table.c[column].op('&')(bindparam('p_keep')).op('|')(bindparam(f'p_{column}'))
+                for column in STATUS_MASKS.values()
+            }
+        }),
+        updates
+    )
+
+    cleared = [(r['employee_id'], r['date']) for r in written if r['remarks'] == '']
+    if cleared:
+        db.session.execute(
+            db.delete(AttendanceRemark)
+            .filter(tuple_(AttendanceRemark.employee_id, AttendanceRemark.date).in_(cleared))
+        )
+    remarks = [
+        {'employee_id': r['employee_id'], 'date': r['date'], 'remarks': r['remarks']}
+        for r in written if r['remarks'] != ''
+    ]
+    if remarks:
+        stmt = dialect_insert(AttendanceRemark)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['employee_id', 'date'], set_={'remarks': stmt.excluded.remarks}
+        )
+        db.session.execute(stmt, remarks)
+    return existing
+
+def upsert_attendance(records, overwrite=True):
+    """Insert or update attendance in the configured ``ATTENDANCE_STORAGE``,
+    keep the monthly rollup in step and flag the affected payroll months
+    dirty. With ``overwrite=False`` days that already have attendance are left
+    alone. Does not commit."""
+    if not records:
+        return 0
+    years = {record['date'].year for record in records}
+    if min(years) < datetime.now().year:
+        archived = years & archived_years('attendance')
+        if archived:
+            raise ValueError(f'Attendance for {min(archived)} is archived')
+    if current_app.config['ATTENDANCE_STORAGE'] == 'bitmap':
+        existing = write_attendance_bitmaps(records, overwrite)
+    else:
+        existing = write_attendance_rows(records, overwrite)
+
+    deltas = {}
+    written = 0
+    for record in records:
+        key = (record['employee_id'], record['date'])
+        if key in existing and not overwrite:
+            continue
+        attendance_delta(deltas, record['employee_id'], record['date'], existing.get(key), record['status'])
+        written += 1
+    apply_attendance_deltas(deltas)
+    mark_payroll_dirty(deltas.keys())
+    invalidate_employee_cache(('attendance',) + key for key in deltas)
+    return written
+
+def import_attendance(rows, overwrite=True):
+    """Validate raw attendance dicts and upsert the clean ones, committing
+    every ``ATTENDANCE_BATCH_SIZE`` rows. A batch that fails is rolled back
+    and reported row by row. Returns ``(upserted, errors)``."""
+    records, errors = validate_attendance_rows(rows)
+    batch_size = current_app.config['ATTENDANCE_BATCH_SIZE']
+    upserted = 0
+    for offset in range(0, len(records), batch_size):
+        chunk = records[offset:offset + batch_size]
+        try:
+            upserted += upsert_attendance([record for _, record in chunk], overwrite)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            errors.extend({'row': index, 'error': str(e)} for index, _ in chunk)
+    return upserted, errors
+
+@bp.cli.command('import-attendance')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--keep-existing', is_flag=True, help='Leave days that already have attendance unchanged.')
+def import_attendance_command(path, keep_existing):
+    """Backfill attendance from a CSV file with employee_id, date, status and remarks columns."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+    upserted, errors = import_attendance(rows, overwrite=not keep_existing)
+    for error in sorted(errors, key=lambda e: e['row']):
+        click.echo(f"Row {error['row'] + 2}: {error['error']}", err=True)
+    click.echo(f'Imported {upserted} of {len(rows)} attendance rows')
+    if errors:
+        raise SystemExit(1)
+
+# Packed attendance
+AttendanceDay = namedtuple('AttendanceDay', ATTENDANCE_FIELDS)
+
+def month_bounds(start_date, end_date):
+    """The (year, month) periods of the half-open date range, as bounds for
+    a comparison against ``(year, month)`` columns."""
+    last_day = end_date - timedelta(days=1)
+    return (start_date.year, start_date.month), (last_day.year, last_day.month)
+
+def bitmap_attendance_days(employee_id=None, start_date=None, end_date=None, before=None, reverse=True,
+                           changed_since=None):
+    """Expand packed attendance back into ``AttendanceDay`` rows with their
+    stored ids, newest day first and then by id, highest first, like the
+    ``Attendance`` listing; ``reverse=False`` gives the opposite order. ``before`` is a
+    ``(date, id)`` keyset bound. With ``changed_since`` only months written
+    since then are expanded, every recorded day of them. Months are read
+    lazily, one at a time, so a page only loads the months it covers."""
+    period = tuple_(AttendanceMonth.year, AttendanceMonth.month)
+    criteria = []
+    if changed_since:
+        criteria.append(AttendanceMonth.updated_at >= changed_since)
+    if employee_id:
+        criteria.append(AttendanceMonth.employee_id == employee_id)
+    if start_date and end_date:
+        first, last = month_bounds(start_date, end_date)
+        criteria.extend([period >= tuple_(*first), period <= tuple_(*last)])
+    if before:
+        criteria.append(period <= tuple_(before[0].year, before[0].month))
+    order = [AttendanceMonth.year, AttendanceMonth.month]
+    months = db.session.execute(
+        db.select(
+            AttendanceMonth.employee_id, Employee.name.label('employee_name'), AttendanceMonth.year,
+            AttendanceMonth.month, *[getattr(AttendanceMonth, column) for column in STATUS_MASKS.values()],
+            AttendanceMonth.day_ids
+        )
+        .join(Employee, Employee.id == AttendanceMonth.employee_id)
+        .filter(*criteria)
+        .order_by(*[column.desc() for column in order] if reverse else order)
+        .execution_options(yield_per=current_app.config['STREAM_BATCH_SIZE'])
+    )
+
+    for (year, month), rows in groupby(months, key=lambda row: (row.year, row.month)):
+        rows = list(rows)
+        month_start = datetime(year, month, 1).date()
+        remark_filter = [
+            AttendanceRemark.date >= month_start,
+            AttendanceRemark.date < month_start + timedelta(days=calendar.monthrange(year, month)[1]),
+        ]
+        if employee_id:
+            remark_filter.append(AttendanceRemark.employee_id == employee_id)
+        remarks = {
+            (remark.employee_id, remark.date): remark.remarks
+            for remark in db.session.execute(
+                db.select(AttendanceRemark.employee_id, AttendanceRemark.date, AttendanceRemark.remarks)
+                .filter(*remark_filter)
+            )
+        }
+        days = []
+        for row in rows:
+            ids = unpack_ids(row.day_ids)
+            for day, status in expand(row._asdict(), year, month):
+                if start_date and not start_date <= day < end_date:
+                    continue
+                attendance_id = ids[day.day - 1]
+                if before and (day, attendance_id) >= tuple(before):
+                    continue
+                days.append(AttendanceDay(
+                    attendance_id, row.employee_id, row.employee_name, day, status,
+                    remarks.get((row.employee_id, day), '')
+                ))
+        days.sort(key=lambda attendance: (attendance.date, attendance.id), reverse=reverse)
+        yield from days
+
+def bitmap_attendance_response(employee_id=None, start_date=None, end_date=None):
+    """The admin attendance listing served from packed attendance, with the
+    same fields, order and ``?limit``/``?cursor``/``?stream``/``?since``
+    handling as ``keyset_response`` and ``sync_response``."""
+    if 'since' in request.args:
+        return sync_response(
+            AttendanceMonth.updated_at,
+            lambda since: bitmap_attendance_days(employee_id, start_date, end_date, changed_since=since),
+            ATTENDANCE_FIELDS
+        )
+    if request.args.get('stream'):
+        return stream_json_array(bitmap_attendance_days(employee_id, start_date, end_date), ATTENDANCE_FIELDS)
+    if not wants_pagination():
+        return jsonify([
+            serialize(day, ATTENDANCE_FIELDS) for day in bitmap_attendance_days(employee_id, start_date, end_date)
+        ])
+
+    token = sync_token()
+    try:
+        limit = page_limit()
+        cursor = request.args.get('cursor')
+        before = decode_cursor(cursor, [Attendance.date, Attendance.id]) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    days = list(islice(bitmap_attendance_days(employee_id, start_date, end_date, before), limit + 1))
+    next_cursor = None
+    if len(days) > limit:
+        days = days[:limit]
+        next_cursor = encode_cursor([days[-1].date, days[-1].id])
+
+    return jsonify({
+        'items': [serialize(day, ATTENDANCE_FIELDS) for day in days], 'next_cursor': next_cursor, 'since': token
+    })
+
+def pack_attendance(delete_rows=False):
+    """Copy ``Attendance`` rows into the packed tables, a batch of employees
+    per transaction. Packed days that have a row are overwritten and keep the
+    row's id, so it is safe to re-run. With ``delete_rows`` the copied rows are removed. Returns
+    the number of days packed."""
+    unknown = db.session.execute(
+        db.select(func.count()).select_from(Attendance).filter(Attendance.status.notin_(STATUS_MASKS))
+    ).scalar()
+    if unknown:
+        raise ValueError(f'{unknown} attendance rows have a status that cannot be packed')
+
+    employee_ids = db.session.execute(
+        db.select(Attendance.employee_id).distinct().order_by(Attendance.employee_id)
+    ).scalars().all()
+    # Roughly ATTENDANCE_BATCH_SIZE months per batch.
+    step = max(current_app.config['ATTENDANCE_BATCH_SIZE'] // 12, 1)
+    packed = 0
+    for offset in range(0, len(employee_ids), step):
+        batch = Attendance.employee_id.in_(employee_ids[offset:offset + step])
+        records = [
+            row._asdict() for row in db.session.execute(
+                db.select(
+                    Attendance.id, Attendance.employee_id, Attendance.date, Attendance.status, Attendance.remarks
+                ).filter(batch)
+            )
+        ]
+        write_attendance_bitmaps(records, overwrite=True)
+        if delete_rows:
+            db.session.execute(db.delete(Attendance).filter(batch))
+        db.session.commit()
+        packed += len(records)
+    employee_cache.clear()
+    return packed
+
+@bp.cli.command('pack-attendance')
+@click.option('--delete-rows', is_flag=True, help='Delete the attendance rows once packed.')
+def pack_attendance_command(delete_rows):
+    """Copy row attendance into the packed tables used by ATTENDANCE_STORAGE=bitmap."""
+    try:
+        packed = pack_attendance(delete_rows)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Packed {packed} attendance days')
+
+# Employee onboarding
+EMPLOYEE_TEXT_LIMITS = {'name': 100, 'email': 120, 'phone': 20, 'department': 50, 'designation': 50}
+
+def validate_employee_rows(rows):
+    """Validate raw employee dicts in one pass, like ``validate_attendance_rows``.
+
+    Returns ``(records, errors)`` where ``records`` holds ``(row, employee,
+    credentials)`` triples; ``credentials`` is a ``(username, password)``
+    pair or None. Emails and usernames must be new and unique in the batch.
+    """
+    parsed = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            employee = {field: str(row.get(field) or '').strip() for field in EMPLOYEE_TEXT_LIMITS}
+            employee['date_of_joining'] = datetime.strptime(str(row['date_of_joining']).strip(), '%Y-%m-%d').date()
+            employee['basic_salary'] = float(row['basic_salary'])
+            for column in SALARY_COMPONENTS[1:] + DEDUCTION_COMPONENTS:
+                employee[column] = float(row.get(column) or 0)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            errors.append({'row': index, 'error': f'Invalid date_of_joining or salary: {e}'})
+            continue
+        missing = [field for field in ('name', 'email', 'department', 'designation') if not employee[field]]
+        if missing:
+            errors.append({'row': index, 'error': f"Missing {', '.join(missing)}"})
+            continue
+        too_long = [field for field, limit in EMPLOYEE_TEXT_LIMITS.items() if len(employee[field]) > limit]
+        if too_long:
+            errors.append({'row': index, 'error': f"Too long: {', '.join(too_long)}"})
+            continue
+        username = str(row.get('username') or '').strip()
+        password = str(row.get('password') or '')
+        if bool(username) != bool(password):
+            errors.append({'row': index, 'error': 'username and password must be given together'})
+            continue
+        if len(username) > 80:
+            errors.append({'row': index, 'error': 'Too long: username'})
+            continue
+        parsed.append((index, employee, (username, password) if username else None))
+
+    emails = [employee['email'] for _, employee, _ in parsed]
+    usernames = [credentials[0] for _, _, credentials in parsed if credentials]
+    taken_emails = set(db.session.execute(
+        db.select(Employee.email).filter(Employee.email.in_(emails))
+    ).scalars()) if emails else set()
+    taken_usernames = set(db.session.execute(
+        db.select(User.username).filter(User.username.in_(usernames))
+    ).scalars()) if usernames else set()
+
+    records = []
+    for index, employee, credentials in parsed:
+        if employee['email'] in taken_emails:
+            errors.append({'row': index, 'error': f"Duplicate email: {employee['email']}"})
+            continue
+        if credentials and credentials[0] in taken_usernames:
+            errors.append({'row': index, 'error': f'Duplicate username: {credentials[0]}'})
+            continue
+        taken_emails.add(employee['email'])
+        if credentials:
+            taken_usernames.add(credentials[0])
+        records.append((index, employee, credentials))
+
+    return records, errors
+
+password_hash_executor = None
+
+def hash_passwords(passwords):
+    """Hash ``passwords`` with ``generate_password_hash``, spread over a
+    process pool since each hash is deliberately CPU-expensive."""
+    global password_hash_executor
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if workers <= 1 or len(passwords) < 2:
+        return [generate_password_hash(password) for password in passwords]
+    if password_hash_executor is None:
+        password_hash_executor = ProcessPoolExecutor(max_workers=workers)
+    chunksize = max(1, len(passwords) // (workers * 4))
+    return list(password_hash_executor.map(generate_password_hash, passwords, chunksize=chunksize))
+
+def insert_employees(records):
+    """Insert validated ``(employee, credentials)`` pairs with one multi-row
+    INSERT per table, linking each user to its new employee id by email.
+    ``credentials`` carry the already hashed password. Does not commit.
+    Returns the number of employees and users created."""
+    created = db.session.execute(
+        insert(Employee).returning(Employee.id, Employee.email),
+        [employee for employee, _ in records]
+    ).all()
+    employee_ids = {email: employee_id for employee_id, email in created}
+    users = [
+        {'username': username, 'password': password_hash, 'role': 'employee',
+         'employee_id': employee_ids[employee['email']]}
+        for employee, credentials in records if credentials
+        for username, password_hash in [credentials]
+    ]
+    if users:
+        db.session.execute(insert(User), users)
+    return len(created), len(users)
+
+# Payroll processing
+def load_payroll_cohort(month, year, *criteria, new_only=True):
+    """Load employees with their attendance counts from the monthly rollup, as
+    a DataFrame, using three bulk queries. Extra ``criteria`` on ``Employee``
+    narrow the cohort. With ``new_only`` (the default) only active employees
+    without a payroll row for the month are loaded."""
+    import pandas as pd
+    employee_columns = [Employee.id.label('employee_id')] + [
+        getattr(Employee, column) for column in SALARY_COMPONENTS + DEDUCTION_COMPONENTS
+    ]
+    if new_only:
+        criteria = (Employee.is_active == True,) + criteria
+    employees = pd.DataFrame(
+        db.session.execute(db.select(*employee_columns).filter(*criteria)).all(),
+        columns=['employee_id'] + SALARY_COMPONENTS + DEDUCTION_COMPONENTS
+    )
+    shard = db.select(Employee.id).filter(*criteria)
+
+    if new_only:
+        existing = {
+            employee_id for (employee_id,) in db.session.execute(
+                db.select(Payroll.employee_id).filter(
+                    Payroll.month == month, Payroll.year == year, Payroll.employee_id.in_(shard)
+                )
+            )
+        }
+        employees = employees[~employees['employee_id'].isin(existing)]
+
+    counts = pd.DataFrame(
+        db.session.execute(
+            db.select(
+                AttendanceMonthlySummary.employee_id,
+                AttendanceMonthlySummary.present_days,
+                AttendanceMonthlySummary.half_days,
+                AttendanceMonthlySummary.absent_days
+            ).filter(
+                AttendanceMonthlySummary.year == year, AttendanceMonthlySummary.month == month,
+                AttendanceMonthlySummary.employee_id.in_(shard)
+            )
+        ).all(),
+        columns=['employee_id', 'present', 'half-day', 'absent']
+    ).set_index('employee_id')
+    attendance = pd.DataFrame({
+        'present_days': counts['present'] + counts['half-day'],
+        'absent_days': counts['absent']
+    })
+
+    return employees.merge(attendance, how='left', left_on='employee_id', right_index=True)
+
+def load_simulation_cohort(month=None, year=None):
+    """Active employees' current salary structure with their department and
+    designation, as a DataFrame for ``simulate_payroll``. Absences come from
+    the rollup for ``month`` when given; otherwise attendance is full."""
+    import pandas as pd
+    columns = ['employee_id', 'department', 'designation'] + SALARY_COMPONENTS + DEDUCTION_COMPONENTS
+    employees = pd.DataFrame(
+        db.session.execute(
+            db.select(Employee.id, *[getattr(Employee, column) for column in columns[1:]])
+            .filter(Employee.is_active == True)
+        ).all(),
+        columns=columns
+    )
+    absent_days = dict(db.session.execute(
+        db.select(AttendanceMonthlySummary.employee_id, AttendanceMonthlySummary.absent_days)
+        .filter_by(year=year, month=month)
+    ).all()) if month else {}
+    employees['absent_days'] = employees['employee_id'].map(absent_days).fillna(0).astype(int)
+    return employees
+
+def insert_payroll(month, year, *criteria):
+    """Compute and insert payroll for every active employee (matching
+    ``criteria``) that has no row for the month yet, without committing.
+    Returns the number of rows created.
+
+    ``(employee_id, year, month)`` is the idempotency key of a payroll row:
+    inserts that hit an existing key are skipped by the database, so a retried
+    or concurrent run never duplicates or overwrites a row."""
+    cohort = load_payroll_cohort(month, year, *criteria)
+    if cohort.empty:
+        return 0
+
+    frame = compute_payroll(cohort, working_days_in_month(month, year))
+    records = payroll_records(frame, month, year)
+
+    stmt = dialect_insert(Payroll).on_conflict_do_nothing(
+        index_elements=['employee_id', 'year', 'month']
+    ).returning(Payroll.employee_id)
+    created = db.session.execute(stmt, records).all()
+    invalidate_payroll_summary([(month, year)])
+    invalidate_employee_cache(('payslips', employee_id) for (employee_id,) in created)
+    return len(created)
+
+def run_payroll(month, year, *criteria):
+    """Process and commit payroll for the month in one transaction. Returns
+    the number of rows created."""
+    created = insert_payroll(month, year, *criteria)
+    db.session.commit()
+    submit_payslip_render(month, year, *criteria)
+    return created
+
+# Leave decisions
+def set_leave_status(leaves, status):
+    """Apply an approve/reject decision to ``leaves``, without committing.
+
+    Newly approved leaves are expanded into 'leave' attendance days with one
+    batched upsert that leaves days with existing attendance untouched. Every
+    change into or out of 'approved' flags the spanned payroll months dirty.
+    Returns the number of attendance days created."""
+    changed = [leave for leave in leaves if leave.status != status]
+    if not changed:
+        return 0
+
+    mark_payroll_dirty(
+        (leave.employee_id, year, month)
+        for leave in changed if 'approved' in (leave.status, status)
+        for year, month in months_between(leave.start_date, leave.end_date)
+    )
+    for leave in changed:
+        leave.status = status
+
+    if status != 'approved':
+        return 0
+    days = {}
+    for leave in changed:
+        day = leave.start_date
+        while day <= leave.end_date:
+            days[(leave.employee_id, day)] = {
+                'employee_id': leave.employee_id,
+                'date': day,
+                'status': 'leave',
+                'remarks': f'{leave.leave_type} leave'[:200]
+            }
+            day += timedelta(days=1)
+    return upsert_attendance(list(days.values()), overwrite=False)
+
+# Incremental recomputation
+RECOMPUTABLE_STATUSES = ('draft', 'processed')
+
+def mark_payroll_dirty(keys):
+    """Flag ``(employee_id, year, month)`` keys for recomputation. Runs in the
+    caller's transaction."""
+    keys = {(int(employee_id), year, month) for employee_id, year, month in keys}
+    if not keys:
+        return
+    now = datetime.utcnow()
+    stmt = dialect_insert(PayrollDirty)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['employee_id', 'year', 'month'], set_={'marked_at': stmt.excluded.marked_at}
+    )
+    db.session.execute(stmt, [
+        {'employee_id': employee_id, 'year': year, 'month': month, 'marked_at': now}
+        for employee_id, year, month in keys
+    ])
+
+def mark_open_payroll_dirty(employee_id):
+    """Flag every payroll month of an employee that can still be recomputed."""
+    mark_payroll_dirty(db.session.execute(
+        db.select(Payroll.employee_id, Payroll.year, Payroll.month).filter(
+            Payroll.employee_id == employee_id, Payroll.status.in_(RECOMPUTABLE_STATUSES)
+        )
+    ).all())
+
+def months_between(start_date, end_date):
+    """Yield ``(year, month)`` for every month touched by the date range."""
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def recompute_dirty_payroll(month=None, year=None):
+    """Regenerate the payroll rows flagged dirty, optionally for one month.
+
+    Only rows still in ``draft``/``processed`` status are rewritten; ``paid``
+    rows are never touched. Dirty flags for months without a payroll row are
+    simply cleared, since a normal run will compute them from current data.
+    Returns counts of rows recomputed, paid rows skipped and flags cleared."""
+    started = datetime.utcnow()
+    query = db.select(PayrollDirty.employee_id, PayrollDirty.year, PayrollDirty.month)
+    if month and year:
+        query = query.filter(PayrollDirty.month == month, PayrollDirty.year == year)
+    dirty = db.session.execute(query).all()
+    if not dirty:
+        return {'recomputed': 0, 'skipped_paid': 0, 'cleared': 0}
+
+    periods = {}
+    for employee_id, dirty_year, dirty_month in dirty:
+        periods.setdefault((dirty_month, dirty_year), []).append(employee_id)
+
+    recomputed = skipped_paid = 0
+    chunk_size = current_app.config['PAYROLL_CHUNK_SIZE']
+    for (period_month, period_year), employee_ids in periods.items():
+        for offset in range(0, len(employee_ids), chunk_size):
+            chunk = employee_ids[offset:offset + chunk_size]
+            rows = dict(db.session.execute(
+                db.select(Payroll.employee_id, Payroll.status).filter(
+                    Payroll.month == period_month, Payroll.year == period_year,
+                    Payroll.employee_id.in_(chunk)
+                )
+            ).all())
+            skipped_paid += sum(1 for status in rows.values() if status not in RECOMPUTABLE_STATUSES)
+            open_ids = [employee_id for employee_id, status in rows.items() if status in RECOMPUTABLE_STATUSES]
+            if not open_ids:
+                continue
+
+            cohort = load_payroll_cohort(period_month, period_year, Employee.id.in_(open_ids), new_only=False)
+            frame = compute_payroll(cohort, working_days_in_month(period_month, period_year))
+            records = payroll_records(frame, period_month, period_year)
+            # Parameters are prefixed so they do not collide with column names,
+            # which an executemany UPDATE would otherwise also SET.
+            columns = [column for column in PAYROLL_COLUMNS if column != 'employee_id']
+            payroll = Payroll.__table__
+            db.session.execute(
+                payroll.update()
+                .where(
+                    payroll.c.employee_id == bindparam('p_employee_id'),
+                    payroll.c.month == period_month,
+                    payroll.c.year == period_year,
+                    or_(*(payroll.c.status == status for status in RECOMPUTABLE_STATUSES))
+                )
+                .values({column: bindparam(f'p_{column}') for column in columns}),
+                [{f'p_{column}': record[column] for column in PAYROLL_COLUMNS} for record in records]
+            )
+            recomputed += len(records)
+            invalidate_employee_cache(('payslips', record['employee_id']) for record in records)
+        invalidate_payroll_summary([(period_month, period_year)])
+
+    cleared = db.session.execute(
+        db.delete(PayrollDirty).filter(
+            tuple_(PayrollDirty.employee_id, PayrollDirty.year, PayrollDirty.month).in_([tuple(key) for key in dirty]),
+            PayrollDirty.marked_at <= started
+        )
+    ).rowcount
+    db.session.commit()
+    for period_month, period_year in periods:
+        submit_payslip_render(period_month, period_year)
+    return {'recomputed': recomputed, 'skipped_paid': skipped_paid, 'cleared': cleared}
+
+# Payroll jobs
+payroll_executor = None
+
+def get_payroll_executor():
+    global payroll_executor
+    if payroll_executor is None:
+        payroll_executor = ThreadPoolExecutor(
+            max_workers=current_app.config['PAYROLL_WORKERS'], thread_name_prefix='payroll'
+        )
+    return payroll_executor
+
+def plan_payroll_shards(job):
+    """Split the active workforce into shards, either one per department or
+    into runs of ``PAYROLL_SHARD_SIZE`` consecutive employee ids."""
+    if job.shard_by == 'department':
+        groups = db.session.execute(
+            db.select(Employee.department, func.count())
+            .filter(Employee.is_active == True)
+            .group_by(Employee.department)
+            .order_by(Employee.department)
+        ).all()
+        return [
+            PayrollJobShard(job_id=job.id, shard_no=number, department=department, total_employees=count)
+            for number, (department, count) in enumerate(groups)
+        ]
+
+    ids = db.session.execute(
+        db.select(Employee.id).filter(Employee.is_active == True).order_by(Employee.id)
+    ).scalars().all()
+    size = current_app.config['PAYROLL_SHARD_SIZE']
+    return [
+        PayrollJobShard(
+            job_id=job.id, shard_no=number, first_employee_id=ids[offset],
+            last_employee_id=ids[min(offset + size, len(ids)) - 1],
+            total_employees=min(size, len(ids) - offset)
+        )
+        for number, offset in enumerate(range(0, len(ids), size))
+    ]
+
+def shard_criteria(shard):
+    if shard.first_employee_id is not None:
+        return [Employee.id >= shard.first_employee_id, Employee.id <= shard.last_employee_id]
+    if shard.department is None:
+        return [Employee.department.is_(None)]
+    return [Employee.department == shard.department]
+
+def submit_payroll_job(month, year, shard_by='employee_range'):
+    """Record a payroll job and its shards, then hand the shards to the worker
+    pool. Returns the job at once; with ``PAYROLL_WORKERS = 0`` the shards run
+    inline before returning. A job already queued or running for the month
+    is returned instead of starting a second one, after resuming it if it
+    has gone stale."""
+    active = PayrollJob.query.filter(
+        PayrollJob.month == month, PayrollJob.year == year, PayrollJob.status.in_(['queued', 'running'])
+    ).first()
+    if active:
+        if payroll_job_stale(active):
+            current_app.logger.warning('Resuming stale payroll job %s', active.id)
+            resume_payroll_job(active)
+        return active
+
+    job = PayrollJob(id=str(uuid.uuid4()), month=month, year=year, shard_by=shard_by)
+    shards = plan_payroll_shards(job)
+    job.total_employees = sum(shard.total_employees for shard in shards)
+    db.session.add(job)
+    db.session.add_all(shards)
+    db.session.commit()
+
+    if not shards:
+        finish_payroll_job(job.id)
+    start_payroll_shards(job, shards)
+    return job
+
+def start_payroll_shards(job, shards):
+    """Hand ``shards`` to the worker pool, or run them one after another
+    with ``PAYROLL_WORKERS = 0``. Shards run in their own app context, so
+    they are given the app itself."""
+    app = current_app._get_current_object()
+    for shard in shards:
+        if app.config['PAYROLL_WORKERS']:
+            get_payroll_executor().submit(run_payroll_shard, app, job.id, shard.shard_no)
+        else:
+            run_payroll_shard(app, job.id, shard.shard_no)
+
+def run_payroll_shard(app, job_id, shard_no):
+    """Process a shard in chunks of ``PAYROLL_CHUNK_SIZE`` employees.
+
+    Each chunk's payroll rows and the shard checkpoint are committed together,
+    so a crash loses at most the chunk in flight and a resumed shard starts
+    after the last committed chunk. A chunk that fails is retried one employee
+    at a time; employees that still fail are recorded on the shard and
+    retried first when the job is resumed."""
+    with app.app_context():
+        shard = db.session.get(PayrollJobShard, (job_id, shard_no))
+        job = shard.job
+        db.session.execute(
+            db.update(PayrollJob)
+            .filter(PayrollJob.id == job_id)
+            .values(status='running', started_at=func.coalesce(PayrollJob.started_at, datetime.utcnow()))
+        )
+        shard.status = 'running'
+        shard.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+
+        criteria = shard_criteria(shard)
+        failed = set(json.loads(shard.failed_employee_ids or '[]'))
+        retry = sorted(failed)
+        failed.clear()
+        try:
+            for employee_id in retry:
+                if not run_payroll_chunk(shard, failed, Employee.id == employee_id):
+                    failed.add(employee_id)
+
+            while True:
+                after = shard.checkpoint_employee_id or 0
+                chunk = db.session.execute(
+                    db.select(Employee.id)
+                    .filter(Employee.is_active == True, Employee.id > after, *criteria)
+                    .order_by(Employee.id)
+                    .limit(current_app.config['PAYROLL_CHUNK_SIZE'])
+                ).scalars().all()
+                if not chunk:
+                    break
+                bounds = [Employee.id > after, Employee.id <= chunk[-1], *criteria]
+                if not run_payroll_chunk(shard, failed, *bounds, chunk=chunk):
+                    for employee_id in chunk:
+                        if not run_payroll_chunk(shard, failed, Employee.id == employee_id):
+                            failed.add(employee_id)
+                    advance_payroll_shard(shard, chunk)
+                    shard.failed_employee_ids = json.dumps(sorted(failed))
+                    db.session.commit()
+
+            shard.status = 'failed' if failed else 'completed'
+            shard.error = f'Payroll failed for employees {sorted(failed)}' if failed else None
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception('Payroll shard %s/%s failed', job_id, shard_no)
+            shard = db.session.get(PayrollJobShard, (job_id, shard_no))
+            shard.status = 'failed'
+            shard.error = str(e)
+        shard.failed_employee_ids = json.dumps(sorted(failed))
+        shard.finished_at = datetime.utcnow()
+        db.session.commit()
+        finish_payroll_job(job_id)
+        submit_payslip_render(shard.job.month, shard.job.year, *criteria)
+
+def run_payroll_chunk(shard, failed, *criteria, chunk=None):
+    """Insert payroll for one chunk and commit it together with the shard's
+    progress. Only a planned ``chunk`` of employee ids moves the checkpoint;
+    retries of single employees do not. Returns False, with the transaction
+    rolled back, on failure."""
+    job = shard.job
+    try:
+        created = insert_payroll(job.month, job.year, *criteria)
+        shard.processed_count = (shard.processed_count or 0) + created
+        if chunk is not None:
+            advance_payroll_shard(shard, chunk)
+        shard.failed_employee_ids = json.dumps(sorted(failed))
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Payroll chunk failed in shard %s/%s', shard.job_id, shard.shard_no)
+        return False
+
+def advance_payroll_shard(shard, chunk):
+    """Move the shard's checkpoint past ``chunk``, a planned chunk of employee
+    ids, and record the progress. The caller commits."""
+    shard.checkpoint_employee_id = chunk[-1]
+    shard.chunks_done = (shard.chunks_done or 0) + 1
+    shard.employees_done = (shard.employees_done or 0) + len(chunk)
+    shard.heartbeat_at = datetime.utcnow()
+
+def payroll_job_stale(job):
+    """Whether a queued or running job has committed nothing for
+    ``PAYROLL_JOB_STALE_SECONDS``, e.g. because the process running it died.
+    Running shards commit after every chunk, so a live job never goes
+    quiet for that long unless one chunk takes longer."""
+    if job.status not in ('queued', 'running'):
+        return False
+    last = max([shard.heartbeat_at for shard in job.shards if shard.heartbeat_at] + [job.created_at])
+    return datetime.utcnow() - last > timedelta(seconds=current_app.config['PAYROLL_JOB_STALE_SECONDS'])
+
+def resume_payroll_job(job):
+    """Requeue the failed shards, and every unfinished one if the job is
+    stale. Shards pick up from their checkpoint, so finished chunks are not
+    redone. Shards of a live job that are still queued or running are left
+    alone."""
+    unfinished = ('failed', 'queued', 'running') if payroll_job_stale(job) else ('failed',)
+    shards = [shard for shard in job.shards if shard.status in unfinished]
+    now = datetime.utcnow()
+    for shard in shards:
+        shard.status = 'queued'
+        shard.error = None
+        shard.finished_at = None
+        shard.heartbeat_at = now
+    if shards and job.status in ('completed', 'failed'):
+        job.status = 'queued'
+        job.finished_at = None
+    db.session.commit()
+
+    start_payroll_shards(job, shards)
+    return len(shards)
+
+def finish_payroll_job(job_id):
+    """Mark the job finished once no shard is left queued or running. Safe to
+    call from every shard: only the update that flips the status wins."""
+    pending = db.session.execute(
+        db.select(func.count()).select_from(PayrollJobShard).filter(
+            PayrollJobShard.job_id == job_id, PayrollJobShard.status.in_(['queued', 'running'])
+        )
+    ).scalar()
+    if pending:
+        return
+    failed = db.session.execute(
+        db.select(func.count()).select_from(PayrollJobShard).filter(
+            PayrollJobShard.job_id == job_id, PayrollJobShard.status == 'failed'
+        )
+    ).scalar()
+    now = datetime.utcnow()
+    db.session.execute(
+        db.update(PayrollJob)
+        .filter(PayrollJob.id == job_id, PayrollJob.status.in_(['queued', 'running']))
+        .values(status='failed' if failed else 'completed', finished_at=now,
+                started_at=func.coalesce(PayrollJob.started_at, now))
+    )
+    db.session.commit()
+
+def payroll_job_status(job):
+    shards = job.shards
+    processed = sum(shard.processed_count for shard in shards)
+    done = [shard for shard in shards if shard.status in ('completed', 'failed')]
+    # Employees can join or leave while a shard runs, so a finished shard
+    # counts as its planned size.
+    employees_done = sum(
+        shard.total_employees if shard in done else min(shard.employees_done or 0, shard.total_employees)
+        for shard in shards
+    )
+    elapsed = None
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+    return {
+        'job_id': job.id,
+        'month': job.month,
+        'year': job.year,
+        'status': job.status,
+        'shard_by': job.shard_by,
+        'total_shards': len(shards),
+        'completed_shards': len(done),
+        'total_employees': job.total_employees,
+        'employees_done': employees_done,
+        'processed_count': processed,
+        'chunks_done': sum(shard.chunks_done or 0 for shard in shards),
+        'failed_employee_ids': sorted(
+            employee_id for shard in shards for employee_id in json.loads(shard.failed_employee_ids or '[]')
+        ),
+        'stale': payroll_job_stale(job),
+        'progress': round(employees_done / job.total_employees, 4) if job.total_employees else 1.0,
+        'elapsed_seconds': round(elapsed, 3) if elapsed is not None else None,
+        'employees_per_second': round(processed / elapsed, 1) if elapsed else None,
+        'errors': [
+            {'shard': shard.shard_no, 'department': shard.department,
+             'first_employee_id': shard.first_employee_id, 'last_employee_id': shard.last_employee_id,
+             'error': shard.error}
+            for shard in shards if shard.error
+        ]
+    }
+
+# Payslip export
+class StreamBuffer:
+    """Write-only file object that hands back whatever was written since the
+    last ``drain``. ``zipfile`` and ``pyarrow`` write into it while the export
+    generators yield its contents, so no archive is ever held in memory."""
+    # pyarrow checks ``closed`` on file-like sinks and closes them when done.
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def payslip_rows_query(month, year):
+    """The month's payslips with the employee details the document shows."""
+    return (
+        select_fields(Payroll, [f for f in PAYSLIP_EXPORT_FIELDS if f not in ('department', 'designation')])
+        .add_columns(Employee.department, Employee.designation)
+        .filter(Payroll.month == month, Payroll.year == year)
+        .order_by(Payroll.employee_id)
+    )
+
+def payslip_export_rows(month, year):
+    """Stream the month's payslips with employee details through a
+    server-side cursor, one ``STREAM_BATCH_SIZE`` partition at a time."""
+    stmt = payslip_rows_query(month, year)
+    return db.session.execute(stmt.execution_options(yield_per=current_app.config['STREAM_BATCH_SIZE'])).partitions()
+
+def render_payslip(template, row):
+    return template.render(slip=row, month_name=calendar.month_name[row.month]).encode('utf-8')
+
+def export_payslip_zip(partitions, month, year):
+    template = current_app.jinja_env.get_template('payslip.html')
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for rows in partitions:
+            for row in rows:
+                name = secure_filename(f'{row.employee_id:06d}_{row.employee_name}_{year}-{month:02d}.html')
+                archive.writestr(name, render_payslip(template, row))
+            yield buffer.drain()
+    yield buffer.drain()
+
+def export_payslip_csv(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PAYSLIP_EXPORT_FIELDS)
+    for rows in partitions:
+        writer.writerows([getattr(row, field) for field in PAYSLIP_EXPORT_FIELDS] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def export_payslip_parquet(partitions, pa, pq):
+    arrow_types = {int: pa.int64(), float: pa.float64(), str: pa.string(), bool: pa.bool_()}
+    columns = {column.key: column for column in Payroll.__table__.c}
+    columns.update(employee_name=Employee.name, department=Employee.department, designation=Employee.designation)
+    schema = pa.schema([(field, arrow_types[columns[field].type.python_type]) for field in PAYSLIP_EXPORT_FIELDS])
+    buffer = StreamBuffer()
+    with pq.ParquetWriter(buffer, schema) as writer:
+        for rows in partitions:
+            writer.write_table(pa.Table.from_pylist([row._asdict() for row in rows], schema=schema))
+            yield buffer.drain()
+    yield buffer.drain()
+
+# Payslip documents
+DOCUMENT_COLUMNS = ('payroll_updated_at', 'content_hash', 'content', 'rendered_at')
+
+payslip_executor = None
+
+def get_payslip_executor():
+    global payslip_executor
+    if payslip_executor is None:
+        payslip_executor = ThreadPoolExecutor(
+            max_workers=current_app.config['PAYSLIP_WORKERS'], thread_name_prefix='payslip'
+        )
+    return payslip_executor
+
+def render_payslips(month, year, *criteria, force=False):
+    """Render and store the documents of the month's payslips (narrowed by
+    ``criteria`` on ``Payroll`` or ``Employee``) that are missing or were
+    rendered from an older version of their payroll row, or all of them with
+    ``force``. Each ``PAYROLL_CHUNK_SIZE`` batch is committed on its own.
+    Returns the number of documents rendered."""
+    template = current_app.jinja_env.get_template('payslip.html')
+    stmt = payslip_rows_query(month, year).add_columns(Payroll.updated_at).filter(*criteria)
+    if not force:
+        stmt = stmt.outerjoin(PayslipDocument, and_(
+            PayslipDocument.employee_id == Payroll.employee_id,
+            PayslipDocument.year == Payroll.year, PayslipDocument.month == Payroll.month
+        )).filter(or_(
+            PayslipDocument.content_hash.is_(None),
+            PayslipDocument.payroll_updated_at.is_distinct_from(Payroll.updated_at)
+        ))
+
+    rendered = 0
+    after = 0
+    while True:
+        rows = db.session.execute(
+            stmt.filter(Payroll.employee_id > after).limit(current_app.config['PAYROLL_CHUNK_SIZE'])
+        ).all()
+        if not rows:
+            return rendered
+        now = datetime.utcnow()
+        records = []
+        for row in rows:
+            content = render_payslip(template, row)
+            records.append({
+                'employee_id': row.employee_id, 'year': year, 'month': month,
+                'payroll_updated_at': row.updated_at, 'content_hash': hashlib.sha256(content).hexdigest(),
+                'content': content, 'rendered_at': now,
+            })
+        upsert = dialect_insert(PayslipDocument)
+        # A render that read the row before a later one did must not
+        # overwrite the newer document.
+        db.session.execute(upsert.on_conflict_do_update(
+            index_elements=['employee_id', 'year', 'month'],
+            set_={column: upsert.excluded[column] for column in DOCUMENT_COLUMNS},
+            where=or_(
+                PayslipDocument.payroll_updated_at.is_(None),
+                PayslipDocument.payroll_updated_at <= upsert.excluded.payroll_updated_at
+            )
+        ), records)
+        db.session.commit()
+        rendered += len(records)
+        after = rows[-1].employee_id
+
+def submit_payslip_render(month, year, *criteria):
+    """Queue ``render_payslips`` for the month on the payslip worker pool,
+    after payroll rows were written and committed. With
+    ``PAYSLIP_WORKERS = 0`` the documents are rendered before returning."""
+    app = current_app._get_current_object()
+    if app.config['PAYSLIP_WORKERS']:
+        get_payslip_executor().submit(run_payslip_render, app, month, year, *criteria)
+    else:
+        run_payslip_render(app, month, year, *criteria)
+
+def run_payslip_render(app, month, year, *criteria):
+    # A failed render only costs the first download of each payslip an
+    # inline render, so it is logged rather than retried.
+    with app.app_context():
+        try:
+            render_payslips(month, year, *criteria)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Rendering payslips for %s/%s failed', month, year)
+
+def current_payslip_hash(employee_id, year, month):
+    """The content hash of the employee's payslip document for the month,
+    rendering it first when the background render has not caught up with the
+    payroll row. Months whose payroll row is gone (archived years) keep the
+    document rendered before. None when there is no payslip."""
+    key = dict(employee_id=employee_id, year=year, month=month)
+    document = db.session.execute(
+        db.select(PayslipDocument.content_hash, PayslipDocument.payroll_updated_at).filter_by(**key)
+    ).first()
+    payroll = db.session.execute(db.select(Payroll.updated_at).filter_by(**key)).first()
+    if payroll is None:
+        return document.content_hash if document else None
+    if document is None or document.payroll_updated_at != payroll.updated_at:
+        render_payslips(month, year, Payroll.employee_id == employee_id)
+        document = db.session.execute(db.select(PayslipDocument.content_hash).filter_by(**key)).first()
+    return document.content_hash
+
+@bp.cli.command('render-payslips')
+@click.option('--year', type=int, required=True, help='Year to render.')
+@click.option('--month', type=int, help='Only render this month.')
+@click.option('--force', is_flag=True, help='Re-render up-to-date documents too, e.g. after editing the template.')
+def render_payslips_command(year, month, force):
+    """Render the missing and outdated payslip documents of a year or month."""
+    rendered = sum(render_payslips(m, year, force=force) for m in ([month] if month else range(1, 13)))
+    click.echo(f'Rendered {rendered} payslip documents')
+
+# Cold archive
+ARCHIVED_TABLES = {'attendance': Attendance, 'payroll': Payroll}
+ARROW_TYPES = {'int': 'int64', 'float': 'float64', 'bool': 'bool_', 'str': 'string', 'date': 'date32'}
+
+def archived_years(table_name):
+    return set(db.session.execute(db.select(ArchivedYear.year).filter_by(table_name=table_name)).scalars())
+
+def archive_year_filter(model, year):
+    if model in (Attendance, AttendanceRemark):
+        return [model.date >= datetime(year, 1, 1).date(), model.date < datetime(year + 1, 1, 1).date()]
+    return [model.year == year]
+
+def arrow_schema(table, pa):
+    return pa.schema([
+        (column.name, pa.timestamp('us') if column.type.python_type is datetime
+         else getattr(pa, ARROW_TYPES[column.type.python_type.__name__])())
+        for column in table.columns
+    ])
+
+def archive_rows(model, year):
+    """A year of ``model`` rows as dicts, sorted by employee."""
+    table = model.__table__
+    order = [table.c.employee_id, table.c.date] if model is Attendance else [table.c.employee_id, table.c.month]
+    rows = db.session.execute(
+        db.select(table).filter(*archive_year_filter(model, year)).order_by(*order)
+        .execution_options(yield_per=current_app.config['ARCHIVE_ROW_GROUP_SIZE'])
+    )
+    return (row._asdict() for row in rows)
+
+def packed_archive_rows(year):
+    """A year of packed attendance as ``attendance`` rows sorted by employee
+    and date, with the ids stored for the packed days."""
+    batch_size = current_app.config['ARCHIVE_ROW_GROUP_SIZE']
+    months = db.session.execute(
+        db.select(AttendanceMonth).filter_by(year=year)
+        .order_by(AttendanceMonth.employee_id, AttendanceMonth.month)
+        .execution_options(yield_per=batch_size)
+    ).scalars()
+    remarks = db.session.execute(
+        db.select(AttendanceRemark.employee_id, AttendanceRemark.date, AttendanceRemark.remarks)
+        .filter(*archive_year_filter(AttendanceRemark, year))
+        .order_by(AttendanceRemark.employee_id, AttendanceRemark.date)
+        .execution_options(yield_per=batch_size)
+    )
+    remark = next(remarks, None)
+    for packed in months:
+        masks = {column: getattr(packed, column) for column in STATUS_MASKS.values()}
+        ids = unpack_ids(packed.day_ids)
+        for day, status in expand(masks, year, packed.month):
+            while remark is not None and (remark.employee_id, remark.date) < (packed.employee_id, day):
+                remark = next(remarks, None)
+            text = ''
+            if remark is not None and (remark.employee_id, remark.date) == (packed.employee_id, day):
+                text = remark.remarks or ''
+            yield {
+                'id': ids[day.day - 1], 'employee_id': packed.employee_id, 'date': day,
+                'status': status, 'remarks': text, 'created_at': None, 'updated_at': packed.updated_at,
+            }
+
+def attendance_archive_rows(year):
+    """A year of attendance rows and packed days merged by employee and
+    date. A day stored both ways (rows kept by ``pack-attendance``) is
+    archived from the configured ``ATTENDANCE_STORAGE``."""
+    sources = [archive_rows(Attendance, year), packed_archive_rows(year)]
+    if current_app.config['ATTENDANCE_STORAGE'] == 'bitmap':
+        sources.reverse()
+    key = lambda row: (row['employee_id'], row['date'])
+    # merge() keeps the order of its inputs for equal keys.
+    for _, days in groupby(heapq.merge(*sources, key=key), key=key):
+        yield next(days)
+
+def write_archive(table, rows, path, pa, pq):
+    """Write ``rows`` of ``table``, dicts sorted by employee, to a
+    zstd-compressed Parquet file so reads filtered on ``employee_id`` can
+    skip whole row groups. Returns the number of rows written."""
+    schema = arrow_schema(table, pa)
+    batch_size = current_app.config['ARCHIVE_ROW_GROUP_SIZE']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    with pq.ParquetWriter(path + '.tmp', schema, compression='zstd') as writer:
+        for batch in iter(lambda: list(islice(rows, batch_size)), []):
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            written += len(batch)
+    if pq.ParquetFile(path + '.tmp').metadata.num_rows != written:
+        raise RuntimeError(f'Archive {path} is incomplete')
+    os.replace(path + '.tmp', path)
+    return written
+
+def archive_year(year, drop=False):
+    """Move a closed ``year`` of attendance and payroll out of the live
+    tables into Parquet files under ``ARCHIVE_DIR``.
+
+    On PostgreSQL the year's partitions are detached (and dropped with
+    ``drop``); elsewhere the rows are deleted. Packed attendance is archived
+    with the rows and deleted from ``attendance_months`` and
+    ``attendance_remarks``. The monthly attendance rollup
+    and cached payroll reports are kept. Returns the rows archived per table.
+    Raises ValueError if the year is not closed."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if year >= datetime.now().year:
+        raise ValueError('Only past years can be archived')
+    unpaid = db.session.execute(
+        db.select(func.count()).select_from(Payroll).filter(Payroll.year == year, Payroll.status != 'paid')
+    ).scalar()
+    if unpaid:
+        raise ValueError(f'{unpaid} payroll records for {year} are not paid')
+    if db.session.query(PayrollDirty.query.filter_by(year=year).exists()).scalar():
+        raise ValueError(f'Payroll for {year} is waiting to be recomputed')
+
+    archived = {}
+    for table_name, model in ARCHIVED_TABLES.items():
+        if db.session.get(ArchivedYear, (table_name, year)):
+            continue
+        path = os.path.join(current_app.config['ARCHIVE_DIR'], table_name, f'{table_name}_{year}.parquet')
+        rows = attendance_archive_rows(year) if model is Attendance else archive_rows(model, year)
+        archived[table_name] = write_archive(model.__table__, rows, path, pa, pq)
+        db.session.add(ArchivedYear(table_name=table_name, year=year, path=path, row_count=archived[table_name]))
+        connection = db.session.connection()
+        if is_partitioned(connection, table_name):
+            detach_year_partition(connection, table_name, year, drop)
+        # Rows that landed in the default partition, or an unpartitioned table.
+        db.session.execute(db.delete(model).filter(*archive_year_filter(model, year)))
+        if model is Attendance:
+            db.session.execute(db.delete(AttendanceMonth).filter_by(year=year))
+            db.session.execute(db.delete(AttendanceRemark).filter(*archive_year_filter(AttendanceRemark, year)))
+        db.session.commit()
+    return archived
+
+def read_archive(path, columns, filters):
+    """Read ``columns`` of the archived rows matching the pyarrow ``filters``
+    as named tuples, so they serialize like result rows."""
+    import pyarrow.parquet as pq
+
+    ArchivedRow = namedtuple('ArchivedRow', columns)
+    table = pq.read_table(path, columns=list(columns), filters=filters)
+    return [ArchivedRow(**row) for row in table.to_pylist()]
+
+def archived_payroll(month, year):
+    """Payroll rows of an archived month, or None if the month is live."""
+    archive = db.session.get(ArchivedYear, ('payroll', year))
+    if archive is None:
+        return None
+    return read_archive(
+        archive.path, ('employee_id', 'gross_salary', 'total_deductions', 'net_salary'), [('month', '=', month)]
+    )
+
+# Payroll reports
+def payroll_totals(month, year):
+    row = db.session.execute(
+        db.select(
+            func.count(Payroll.id),
+            func.coalesce(func.sum(Payroll.gross_salary), 0),
+            func.coalesce(func.sum(Payroll.total_deductions), 0),
+            func.coalesce(func.sum(Payroll.net_salary), 0),
+            func.min(Payroll.net_salary),
+            func.max(Payroll.net_salary)
+        ).filter(Payroll.month == month, Payroll.year == year)
+    ).one()
+    return {
+        'total_employees': row[0],
+        'total_gross_salary': row[1],
+        'total_deductions': row[2],
+        'total_net_salary': row[3],
+        'min_net_salary': row[4],
+        'max_net_salary': row[5]
+    }
+
+def median_net_salary(month, year, count):
+    """Median net salary, read as the one or two middle rows so it works on
+    databases without a percentile aggregate."""
+    if not count:
+        return None
+    middle = db.session.execute(
+        db.select(Payroll.net_salary)
+        .filter(Payroll.month == month, Payroll.year == year)
+        .order_by(Payroll.net_salary)
+        .offset((count - 1) // 2)
+        .limit(2 - count % 2)
+    ).scalars().all()
+    return sum(middle) / len(middle)
+
+def payroll_breakdown(month, year, column):
+    rows = db.session.execute(
+        db.select(
+            column,
+            func.count(Payroll.id),
+            func.sum(Payroll.gross_salary),
+            func.sum(Payroll.total_deductions),
+            func.sum(Payroll.net_salary)
+        ).join(Employee, Employee.id == Payroll.employee_id)
+        .filter(Payroll.month == month, Payroll.year == year)
+        .group_by(column)
+        .order_by(column)
+    ).all()
+    return [{
+        column.key: value,
+        'total_employees': employees,
+        'total_gross_salary': gross,
+        'total_deductions': deductions,
+        'total_net_salary': net
+    } for value, employees, gross, deductions, net in rows]
+
+def archived_payroll_totals(rows):
+    """``payroll_totals`` over rows from ``archived_payroll``."""
+    net_salaries = [row.net_salary for row in rows]
+    return {
+        'total_employees': len(rows),
+        'total_gross_salary': sum(row.gross_salary for row in rows),
+        'total_deductions': sum(row.total_deductions for row in rows),
+        'total_net_salary': sum(net_salaries),
+        'min_net_salary': min(net_salaries, default=None),
+        'max_net_salary': max(net_salaries, default=None)
+    }
+
+def archived_median_net_salary(rows):
+    if not rows:
+        return None
+    count = len(rows)
+    net_salaries = sorted(row.net_salary for row in rows)
+    middle = net_salaries[(count - 1) // 2:(count - 1) // 2 + 2 - count % 2]
+    return sum(middle) / len(middle)
+
+def archived_payroll_breakdown(rows, column):
+    """``payroll_breakdown`` over archived rows, grouped by the employee's
+    current ``column`` like the live report."""
+    values = dict(db.session.execute(
+        db.select(Employee.id, column).filter(Employee.id.in_({row.employee_id for row in rows}))
+    ).all()) if rows else {}
+    groups = {}
+    for row in rows:
+        if row.employee_id in values:
+            groups.setdefault(values[row.employee_id], []).append(row)
+    return [{
+        column.key: value,
+        'total_employees': len(group),
+        'total_gross_salary': sum(row.gross_salary for row in group),
+        'total_deductions': sum(row.total_deductions for row in group),
+        'total_net_salary': sum(row.net_salary for row in group)
+    } for value, group in sorted(groups.items(), key=lambda item: (item[0] is None, item[0]))]
+
+def compute_payroll_summary(month, year):
+    archived = archived_payroll(month, year)
+    if archived is None:
+        summary = payroll_totals(month, year)
+        summary['median_net_salary'] = median_net_salary(month, year, summary['total_employees'])
+        summary['by_department'] = payroll_breakdown(month, year, Employee.department)
+        summary['by_designation'] = payroll_breakdown(month, year, Employee.designation)
+    else:
+        summary = archived_payroll_totals(archived)
+        summary['median_net_salary'] = archived_median_net_salary(archived)
+        summary['by_department'] = archived_payroll_breakdown(archived, Employee.department)
+        summary['by_designation'] = archived_payroll_breakdown(archived, Employee.designation)
+
+    previous_month, previous_year = (12, year - 1) if month == 1 else (month - 1, year)
+    previous_archived = archived_payroll(previous_month, previous_year)
+    if previous_archived is None:
+        previous = payroll_totals(previous_month, previous_year)
+    else:
+        previous = archived_payroll_totals(previous_archived)
+    summary['previous_month'] = {'month': previous_month, 'year': previous_year}
+    summary['change_from_previous_month'] = {
+        key: summary[key] - previous[key]
+        for key in ['total_employees', 'total_gross_salary', 'total_deductions', 'total_net_salary']
+    }
+    return summary
+
+def is_finalized(month, year):
+    """A month is closed once it is over; its report is then worth caching."""
+    now = datetime.now()
+    return (year, month) < (now.year, now.month)
+
+def payroll_summary_for(month, year):
+    """Return the report for a month, served from ``payroll_summary_cache``
+    for finalized months."""
+    if not is_finalized(month, year):
+        return compute_payroll_summary(month, year)
+
+    cached = db.session.get(PayrollSummaryCache, (year, month))
+    if cached:
+        return json.loads(cached.summary)
+
+    # The cached copy outlives any replica lag, so compute it on the primary.
+    g.pop('read_replica', None)
+    summary = compute_payroll_summary(month, year)
+    stmt = dialect_insert(PayrollSummaryCache)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['year', 'month'],
+        set_={'summary': stmt.excluded.summary, 'computed_at': stmt.excluded.computed_at}
+    )
+    db.session.execute(stmt, [{
+        'year': year, 'month': month, 'summary': json.dumps(summary), 'computed_at': datetime.utcnow()
+    }])
+    db.session.commit()
+    return summary
+
+def invalidate_payroll_summary(periods, connection=None):
+    """Drop cached reports for the given ``(month, year)`` pairs. The month
+    after each one is dropped too, since its report holds deltas against it."""
+    keys = set()
+    for month, year in periods:
+        keys.add((year, month))
+        keys.add((year + 1, 1) if month == 12 else (year, month + 1))
+    if not keys:
+        return
+    stmt = db.delete(PayrollSummaryCache).filter(
+        tuple_(PayrollSummaryCache.year, PayrollSummaryCache.month).in_(list(keys))
+    )
+    (connection or db.session).execute(stmt)
+    stmt = db.delete(PayrollSnapshot).filter(
+        tuple_(PayrollSnapshot.year, PayrollSnapshot.month).in_([(year, month) for month, year in periods])
+    )
+    (connection or db.session).execute(stmt)
+
+@event.listens_for(db.session, 'after_flush')
+def invalidate_changed_payroll_summaries(session, flush_context):
+    periods = {
+        (obj.month, obj.year)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, Payroll)
+    }
+    if periods:
+        invalidate_payroll_summary(periods, session.connection())
+
+# Payroll analytics
+def snapshot_path(year, month):
+    return os.path.join(current_app.config['ANALYTICS_DIR'], f'payroll_{year}_{month:02d}.parquet')
+
+def load_payroll_frame(periods):
+    """Payroll joined with ``Employee`` for ``periods`` as one DataFrame of
+    ``ANALYTICS_COLUMNS``: live months in a single query, archived years from
+    their Parquet files."""
+    import pandas as pd
+    archived = {
+        archive.year: archive.path for archive in db.session.execute(
+            db.select(ArchivedYear).filter_by(table_name='payroll')
+            .filter(ArchivedYear.year.in_({year for year, _ in periods}))
+        ).scalars()
+    }
+    live = [(year, month) for year, month in periods if year not in archived]
+    frames = []
+    if live:
+        rows = db.session.execute(
+            db.select(*[
+                getattr(Employee if column in GROUP_COLUMNS else Payroll, column) for column in ANALYTICS_COLUMNS
+            ])
+            .join(Employee, Employee.id == Payroll.employee_id)
+            .filter(tuple_(Payroll.year, Payroll.month).in_(live))
+        ).all()
+        frames.append(pd.DataFrame.from_records(rows, columns=ANALYTICS_COLUMNS))
+    for year, path in archived.items():
+        months = [month for period_year, month in periods if period_year == year]
+        frame = pd.read_parquet(
+            path, columns=['year', 'month', 'employee_id', 'gross_salary', 'total_deductions', 'net_salary'],
+            filters=[('month', 'in', months)]
+        )
+        employees = pd.DataFrame.from_records(db.session.execute(
+            db.select(Employee.id, Employee.department, Employee.designation)
+            .filter(Employee.id.in_(frame['employee_id'].unique().tolist()))
+        ).all(), columns=['employee_id', 'department', 'designation'])
+        frames.append(frame.merge(employees, on='employee_id')[ANALYTICS_COLUMNS])
+    frames = [frame for frame in frames if len(frame)]
+    return pd.concat(frames, ignore_index=True).astype(empty_frame().dtypes) if frames else empty_frame()
+
+def payroll_analytics_frame(periods):
+    """The analytics frame for ``periods``.
+
+    Closed months are snapshotted to Parquet under ``ANALYTICS_DIR`` the
+    first time they are read (when pyarrow is installed) and served from the
+    snapshot, kept in memory, until their payroll changes; see
+    ``invalidate_payroll_summary``. Only the open months and months without
+    a snapshot are read from the database."""
+    import pandas as pd
+    try:
+        import pyarrow  # noqa: F401
+        snapshots = True
+    except ImportError:
+        snapshots = False
+
+    frames = {}
+    closed = [(year, month) for year, month in periods if is_finalized(month, year)]
+    if snapshots and closed:
+        for snapshot in db.session.execute(
+            db.select(PayrollSnapshot).filter(tuple_(PayrollSnapshot.year, PayrollSnapshot.month).in_(closed))
+        ).scalars():
+            key = (snapshot.year, snapshot.month, snapshot.created_at)
+            frame = snapshot_cache.get(key)
+            if frame is None:
+                try:
+                    frame = pd.read_parquet(snapshot_path(snapshot.year, snapshot.month))
+                except FileNotFoundError:
+                    continue
+                if len(frame) != snapshot.row_count:
+                    continue
+                snapshot_cache.set(key, frame)
+            frames[(snapshot.year, snapshot.month)] = frame
+
+    missing = [period for period in periods if period not in frames]
+    if missing:
+        to_snapshot = [period for period in missing if snapshots and period in closed]
+        if to_snapshot:
+            # Snapshots outlive any replica lag, so read them from the primary.
+            g.pop('read_replica', None)
+        loaded = load_payroll_frame(missing)
+        if to_snapshot:
+            os.makedirs(current_app.config['ANALYTICS_DIR'], exist_ok=True)
+            by_period = dict(iter(loaded.groupby(['year', 'month'])))
+            created_at = datetime.utcnow()
+            written = []
+            for year, month in to_snapshot:
+                frame = by_period.get((year, month), empty_frame()).reset_index(drop=True)
+                path = snapshot_path(year, month)
+                frame.to_parquet(path + '.tmp', compression='zstd', index=False)
+                os.replace(path + '.tmp', path)
+                written.append({'year': year, 'month': month, 'row_count': len(frame), 'created_at': created_at})
+                snapshot_cache.set((year, month, created_at), frame)
+            stmt = dialect_insert(PayrollSnapshot)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['year', 'month'],
+                set_={'row_count': stmt.excluded.row_count, 'created_at': stmt.excluded.created_at}
+            )
+            db.session.execute(stmt, written)
+            db.session.commit()
+        frames = list(frames.values()) + [loaded]
+    else:
+        frames = list(frames.values())
+
+    frames = [frame for frame in frames if len(frame)]
+    return pd.concat(frames, ignore_index=True) if frames else empty_frame()
+
+def parse_period(value):
+    year, month = (int(part) for part in value.split('-'))
+    if not 1 <= month <= 12:
+        raise ValueError(value)
+    return year, month
+
+# Employee read cache
+def employee_cache_entry(value):
+    """The ``(body, etag)`` cached for the JSON response ``value``."""
+    body = current_app.json.response(value).get_data()
+    return body, hashlib.sha1(body).hexdigest()
+
+def employee_cache_response(entry, req):
+    body, etag = entry
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(req)
+
+def cached_employee_response(key, load):
+    """Serve the JSON for ``load()`` from ``employee_cache`` with an ETag,
+    answering 304 when the client already holds the current body. ``key``
+    must name everything the response depends on, starting with its kind and
+    the employee id (see ``employee_cache_keys``)."""
+    entry = employee_cache.get(key)
+    if entry is None:
+        generation = employee_cache.generation
+        entry = employee_cache_entry(load())
+        # A replica may not have caught up with a just-invalidated write yet.
+        settle = current_app.config['REPLICA_STICKY_SECONDS'] if g.get('read_replica') else 0
+        employee_cache.set(key, entry, generation, settle=settle)
+    return employee_cache_response(entry, request)
+
+def employee_cache_keys(obj):
+    if isinstance(obj, Employee):
+        return [('profile', obj.id)]
+    if isinstance(obj, Leave):
+        return [('leaves', obj.employee_id)]
+    if isinstance(obj, Payroll):
+        return [('payslips', obj.employee_id)]
+    if isinstance(obj, Attendance):
+        return [('attendance', obj.employee_id, obj.date.year, obj.date.month)]
+    return []
+
+def invalidate_employee_cache(keys, session=None):
+    """Drop cached employee responses once the current transaction commits.
+    Invalidating earlier would let a concurrent request cache the old rows
+    again before the write is visible."""
+    (session or db.session).info.setdefault('employee_cache_keys', set()).update(keys)
+
+@event.listens_for(db.session, 'after_flush')
+def invalidate_changed_employee_responses(session, flush_context):
+    keys = [
+        key
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        for key in employee_cache_keys(obj)
+    ]
+    if keys:
+        invalidate_employee_cache(keys, session)
+
+@event.listens_for(db.session, 'after_commit')
+def apply_employee_cache_invalidations(session):
+    keys = session.info.pop('employee_cache_keys', None)
+    if keys:
+        employee_cache.invalidate(keys)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_employee_cache_invalidations(session):
+    session.info.pop('employee_cache_keys', None)
+
+# Employee self-service reads, shared with the async routes in asgi.py
+def employee_profile_query(employee_id):
+    return select_fields(Employee, EMPLOYEE_PROFILE_FIELDS).filter(Employee.id == employee_id)
+
+def employee_payslips_query(employee_id):
+    return (
+        select_fields(Payroll, PAYSLIP_FIELDS)
+        .filter(Payroll.employee_id == employee_id)
+        .order_by(Payroll.year.desc(), Payroll.month.desc())
+    )
+
+def archived_payroll_paths_query():
+    return db.select(ArchivedYear.path).filter_by(table_name='payroll')
+
+def with_archived_payslips(payslips, archives, employee_id):
+    """``payslips`` merged with the employee's payslips in the ``archives``
+    Parquet files, newest first."""
+    if not archives:
+        return payslips
+    return sorted(list(payslips) + [
+        payslip for path in archives
+        for payslip in read_archive(path, PAYSLIP_FIELDS, [('employee_id', '=', employee_id)])
+    ], key=lambda p: (p.year, p.month), reverse=True)
+
+def employee_leaves_query(employee_id):
+    return (
+        select_fields(Leave, EMPLOYEE_LEAVE_FIELDS)
+        .filter(Leave.employee_id == employee_id)
+        .order_by(Leave.applied_at.desc())
+    )
+
+def attendance_month(month, year):
+    """The half-open date range of ``month``/``year`` (default: this month)."""
+    if not month or not year:
+        now = datetime.now()
+        month = now.month
+        year = now.year
     
-    attendance_records = db.relationship('Attendance', backref='employee', lazy=True)
-    payroll_records = db.relationship('Payroll', backref='employee', lazy=True)
-    leave_records = db.relationship('Leave', backref='employee', lazy=True)
+    start_date = datetime(int(year), int(month), 1).date()
+    if int(month) == 12:
+        end_date = datetime(int(year) + 1, 1, 1).date()
+    else:
+        end_date = datetime(int(year), int(month) + 1, 1).date()
+    return start_date, end_date
 
-class Attendance(db.Model):
-    __tablename__ = 'attendance'
-    id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
-    status = db.Column(db.String(20), nullable=False)  # 'present', 'absent', 'half-day', 'leave'
-    remarks = db.Column(db.String(200))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+def employee_attendance_query(employee_id, start_date, end_date):
+    return select_fields(Attendance, EMPLOYEE_ATTENDANCE_FIELDS).filter(
+        Attendance.employee_id == employee_id,
+        Attendance.date >= start_date,
+        Attendance.date < end_date
+    ).order_by(Attendance.date)
 
-class Leave(db.Model):
-    __tablename__ = 'leaves'
-    id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
-    leave_type = db.Column(db.String(50), nullable=False)  # 'sick', 'casual', 'earned'
-    start_date = db.Column(db.Date, nullable=False)
-    end_date = db.Column(db.Date, nullable=False)
-    days = db.Column(db.Integer, nullable=False)
-    reason = db.Column(db.Text)
-    status = db.Column(db.String(20), default='pending')  # 'pending', 'approved', 'rejected'
-    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+def archived_attendance(path, employee_id, start_date, end_date):
+    return sorted(read_archive(path, EMPLOYEE_ATTENDANCE_FIELDS, [
+        ('employee_id', '=', employee_id), ('date', '>=', start_date), ('date', '<', end_date)
+    ]), key=lambda a: a.date)
 
-class Payroll(db.Model):
-    __tablename__ = 'payroll'
-    id = db.Column(db.Integer, primary_key=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
-    month = db.Column(db.Integer, nullable=False)
-    year = db.Column(db.Integer, nullable=False)
-    basic_salary = db.Column(db.Float, nullable=False)
-    hra = db.Column(db.Float, default=0)
-    da = db.Column(db.Float, default=0)
-    ta = db.Column(db.Float, default=0)
-    other_allowances = db.Column(db.Float, default=0)
-    gross_salary = db.Column(db.Float, nullable=False)
-    pf_deduction = db.Column(db.Float, default=0)
-    tax_deduction = db.Column(db.Float, default=0)
-    other_deductions = db.Column(db.Float, default=0)
-    total_deductions = db.Column(db.Float, nullable=False)
-    net_salary = db.Column(db.Float, nullable=False)
-    working_days = db.Column(db.Integer, default=0)
-    present_days = db.Column(db.Integer, default=0)
-    absent_days = db.Column(db.Integer, default=0)
-    status = db.Column(db.String(20), default='draft')  # 'draft', 'processed', 'paid'
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+def archived_attendance_path_query(year):
+    return db.select(ArchivedYear.path).filter_by(table_name='attendance', year=year)
 
-# Authentication decorator
-def login_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
+def packed_month_query(employee_id, year, month):
+    return db.select(
+        *[getattr(AttendanceMonth, column) for column in STATUS_MASKS.values()], AttendanceMonth.day_ids
+    ).filter_by(
+        employee_id=employee_id, year=year, month=month
+    )
 
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return redirect(url_for('login'))
-        if session.get('role') != 'admin':
-            return jsonify({'error': 'Admin access required'}), 403
-        return f(*args, **kwargs)
-    return decorated_function
+def month_remarks_query(employee_id, start_date, end_date):
+    return db.select(AttendanceRemark.date, AttendanceRemark.remarks).filter(
+        AttendanceRemark.employee_id == employee_id,
+        AttendanceRemark.date >= start_date,
+        AttendanceRemark.date < end_date
+    )
+
+def packed_month_days(employee_id, masks, remarks, year, month):
+    """One employee's packed month as ``AttendanceDay`` rows in date order;
+    ``masks`` is the ``packed_month_query`` row (None when nothing was
+    recorded) and ``remarks`` maps dates to remarks."""
+    if masks is None:
+        return []
+    ids = unpack_ids(masks.day_ids)
+    return [
+        AttendanceDay(ids[day.day - 1], employee_id, None, day, status, remarks.get(day, ''))
+        for day, status in expand(masks._asdict(), year, month)
+    ]
 
 # Routes
-@app.route('/')
+@bp.route('/')
 def index():
     if 'user_id' in session:
         if session.get('role') == 'admin':
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('.admin_dashboard'))
         else:
-            return redirect(url_for('employee_dashboard'))
-    return redirect(url_for('login'))
+            return redirect(url_for('.employee_dashboard'))
+    return redirect(url_for('.login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         data = request.get_json()
@@ -153,26 +2614,27 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('login'))
+    return redirect(url_for('.login'))
 
-@app.route('/admin')
+@bp.route('/admin')
 @admin_required
 def admin_dashboard():
     return render_template('admin_dashboard.html')
 
-@app.route('/employee')
+@bp.route('/employee')
 @login_required
 def employee_dashboard():
     if session.get('role') != 'employee':
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('.admin_dashboard'))
     return render_template('employee_dashboard.html')
 
 # Admin API Routes
-@app.route('/api/admin/employees', methods=['GET', 'POST'])
+@bp.route('/api/admin/employees', methods=['GET', 'POST'])
 @admin_required
+@read_replica
 def manage_employees():
     if request.method == 'POST':
         data = request.get_json()
@@ -211,43 +2673,70 @@ def manage_employees():
         return jsonify({'success': True, 'employee_id': employee.id})
     
     # GET - List all employees
-    employees = Employee.query.all()
-    return jsonify([{
-        'id': e.id,
-        'name': e.name,
-        'email': e.email,
-        'phone': e.phone,
-        'department': e.department,
-        'designation': e.designation,
-        'date_of_joining': e.date_of_joining.strftime('%Y-%m-%d'),
-        'basic_salary': e.basic_salary,
-        'is_active': e.is_active
-    } for e in employees])
-
-@app.route('/api/admin/employees/<int:employee_id>', methods=['GET', 'PUT', 'DELETE'])
+    stmt = select_fields(Employee, EMPLOYEE_LIST_FIELDS)
+    
+    if 'since' in request.args:
+        return delta_response(stmt, Employee.updated_at, EMPLOYEE_LIST_FIELDS, [Employee.id])
+    
+    if wants_pagination():
+        return keyset_response(stmt, [Employee.id], EMPLOYEE_LIST_FIELDS)
+    
+    employees = db.session.execute(stmt).all()
+    return jsonify([serialize(e, EMPLOYEE_LIST_FIELDS) for e in employees])
+
+@bp.route('/api/admin/employees/bulk', methods=['POST'])
+@admin_required
+def bulk_employees():
+    rows = bulk_request_rows('employees')
+    if not isinstance(rows, list):
+        return jsonify({'success': False, 'error': 'Expected a JSON array or CSV upload'}), 400
+    
+    started = time.perf_counter()
+    records, errors = validate_employee_rows(rows)
+    
+    with_credentials = [(index, credentials) for index, _, credentials in records if credentials]
+    hashes = dict(zip(
+        (index for index, _ in with_credentials),
+        hash_passwords([password for _, (_, password) in with_credentials])
+    ))
+    
+    batch_size = current_app.config['ONBOARDING_BATCH_SIZE']
+    created = users_created = 0
+    for offset in range(0, len(records), batch_size):
+        chunk = records[offset:offset + batch_size]
+        try:
+            counts = insert_employees([
+                (employee, (credentials[0], hashes[index]) if credentials else None)
+                for index, employee, credentials in chunk
+            ])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            errors.extend({'row': index, 'error': str(e)} for index, _, _ in chunk)
+            continue
+        created += counts[0]
+        users_created += counts[1]
+    
+    elapsed = time.perf_counter() - started
+    return jsonify({
+        'success': True,
+        'received': len(rows),
+        'created': created,
+        'users_created': users_created,
+        'failed': len(errors),
+        'errors': sorted(errors, key=lambda e: e['row']),
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(len(rows) / elapsed, 1) if elapsed else None
+    })
+
+@bp.route('/api/admin/employees/<int:employee_id>', methods=['GET', 'PUT', 'DELETE'])
 @admin_required
+@read_replica
 def employee_detail(employee_id):
     employee = Employee.query.get_or_404(employee_id)
     
     if request.method == 'GET':
-        return jsonify({
-            'id': employee.id,
-            'name': employee.name,
-            'email': employee.email,
-            'phone': employee.phone,
-            'department': employee.department,
-            'designation': employee.designation,
-            'date_of_joining': employee.date_of_joining.strftime('%Y-%m-%d'),
-            'basic_salary': employee.basic_salary,
-            'hra': employee.hra,
-            'da': employee.da,
-            'ta': employee.ta,
-            'other_allowances': employee.other_allowances,
-            'pf_deduction': employee.pf_deduction,
-            'tax_deduction': employee.tax_deduction,
-            'other_deductions': employee.other_deductions,
-            'is_active': employee.is_active
-        })
+        return jsonify(serialize(employee, EMPLOYEE_DETAIL_FIELDS))
     
     if request.method == 'PUT':
         data = request.get_json()
@@ -266,6 +2755,10 @@ def employee_detail(employee_id):
         employee.other_deductions = float(data.get('other_deductions', employee.other_deductions))
         employee.is_active = data.get('is_active', employee.is_active)
         
+        if any(attributes.get_history(employee, column).has_changes()
+               for column in SALARY_COMPONENTS + DEDUCTION_COMPONENTS):
+            mark_open_payroll_dirty(employee.id)
+        
         db.session.commit()
         return jsonify({'success': True})
     
@@ -274,30 +2767,23 @@ def employee_detail(employee_id):
         db.session.commit()
         return jsonify({'success': True})
 
-@app.route('/api/admin/attendance', methods=['GET', 'POST'])
+@bp.route('/api/admin/attendance', methods=['GET', 'POST'])
 @admin_required
+@read_replica
 def manage_attendance():
     if request.method == 'POST':
         data = request.get_json()
         
-        # Check if attendance already exists
-        existing = Attendance.query.filter_by(
-            employee_id=data['employee_id'],
-            date=datetime.strptime(data['date'], '%Y-%m-%d').date()
-        ).first()
-        
-        if existing:
-            existing.status = data['status']
-            existing.remarks = data.get('remarks', '')
-        else:
-            attendance = Attendance(
-                employee_id=data['employee_id'],
-                date=datetime.strptime(data['date'], '%Y-%m-%d').date(),
-                status=data['status'],
-                remarks=data.get('remarks', '')
-            )
-            db.session.add(attendance)
-        
+        try:
+            upsert_attendance([{
+                'employee_id': int(data['employee_id']),
+                'date': datetime.strptime(data['date'], '%Y-%m-%d').date(),
+                'status': data['status'],
+                'remarks': data.get('remarks', '')
+            }])
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': str(e)}), 400
         db.session.commit()
         return jsonify({'success': True})
     
@@ -306,10 +2792,11 @@ def manage_attendance():
     month = request.args.get('month')
     year = request.args.get('year')
     
-    query = Attendance.query
+    query = select_fields(Attendance, ATTENDANCE_FIELDS)
+    start_date = end_date = None
     
     if employee_id:
-        query = query.filter_by(employee_id=employee_id)
+        query = query.filter(Attendance.employee_id == employee_id)
     if month and year:
         start_date = datetime(int(year), int(month), 1).date()
         if int(month) == 12:
@@ -318,163 +2805,290 @@ def manage_attendance():
             end_date = datetime(int(year), int(month) + 1, 1).date()
         query = query.filter(Attendance.date >= start_date, Attendance.date < end_date)
     
-    records = query.order_by(Attendance.date.desc()).all()
+    if current_app.config['ATTENDANCE_STORAGE'] == 'bitmap':
+        return bitmap_attendance_response(int(employee_id) if employee_id else None, start_date, end_date)
+    
+    if 'since' in request.args:
+        return delta_response(
+            query, Attendance.updated_at, ATTENDANCE_FIELDS, [Attendance.date.desc(), Attendance.id.desc()]
+        )
+    
+    if wants_pagination():
+        return keyset_response(query, [Attendance.date, Attendance.id], ATTENDANCE_FIELDS, descending=True)
+    
+    records = db.session.execute(query.order_by(Attendance.date.desc())).all()
+    
+    return jsonify([serialize(a, ATTENDANCE_FIELDS) for a in records])
+
+@bp.route('/api/admin/attendance/bulk', methods=['POST'])
+@admin_required
+def bulk_attendance():
+    rows = bulk_request_rows('records')
+    if not isinstance(rows, list):
+        return jsonify({'success': False, 'error': 'Expected a JSON array or CSV upload'}), 400
     
-    return jsonify([{
-        'id': a.id,
-        'employee_id': a.employee_id,
-        'employee_name': a.employee.name,
-        'date': a.date.strftime('%Y-%m-%d'),
-        'status': a.status,
-        'remarks': a.remarks
-    } for a in records])
+    started = time.perf_counter()
+    upserted, errors = import_attendance(rows)
+    
+    elapsed = time.perf_counter() - started
+    return jsonify({
+        'success': True,
+        'received': len(rows),
+        'upserted': upserted,
+        'failed': len(errors),
+        'errors': sorted(errors, key=lambda e: e['row']),
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(len(rows) / elapsed, 1) if elapsed else None
+    })
 
-@app.route('/api/admin/leaves', methods=['GET', 'PUT'])
+@bp.route('/api/admin/leaves', methods=['GET', 'PUT'])
 @admin_required
+@read_replica
 def manage_leaves():
     if request.method == 'PUT':
         data = request.get_json()
         leave = Leave.query.get_or_404(data['leave_id'])
-        leave.status = data['status']
+        try:
+            set_leave_status([leave], data['status'])
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': str(e)}), 400
         db.session.commit()
         return jsonify({'success': True})
     
     # GET all leave applications
     status = request.args.get('status', 'pending')
-    leaves = Leave.query.filter_by(status=status).order_by(Leave.applied_at.desc()).all()
-    
-    return jsonify([{
-        'id': l.id,
-        'employee_id': l.employee_id,
-        'employee_name': l.employee.name,
-        'leave_type': l.leave_type,
-        'start_date': l.start_date.strftime('%Y-%m-%d'),
-        'end_date': l.end_date.strftime('%Y-%m-%d'),
-        'days': l.days,
-        'reason': l.reason,
-        'status': l.status,
-        'applied_at': l.applied_at.strftime('%Y-%m-%d %H:%M')
-    } for l in leaves])
-
-@app.route('/api/admin/payroll/process', methods=['POST'])
+    query = select_fields(Leave, LEAVE_FIELDS)
+    
+    if 'since' in request.args:
+        # Changes cover every status, so clients see leaves move out of theirs.
+        if request.args['since'] == '0':
+            query = query.filter(Leave.status == status)
+        return delta_response(query, Leave.updated_at, LEAVE_FIELDS, [Leave.applied_at.desc(), Leave.id.desc()])
+    
+    leaves = db.session.execute(
+        query
+        .filter(Leave.status == status)
+        .order_by(Leave.applied_at.desc())
+    ).all()
+    
+    return jsonify([serialize(l, LEAVE_FIELDS) for l in leaves])
+
+@bp.route('/api/admin/leaves/bulk', methods=['PUT'])
+@admin_required
+def bulk_leaves():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    status = data.get('status')
+    if status not in ('approved', 'rejected'):
+        return jsonify({'success': False, 'error': 'status must be approved or rejected'}), 400
+    leave_ids = data.get('leave_ids', [])
+    if not isinstance(leave_ids, list) or not all(
+        isinstance(leave_id, int) and not isinstance(leave_id, bool) for leave_id in leave_ids
+    ):
+        return jsonify({'success': False, 'error': 'leave_ids must be a list of integers'}), 400
+    leave_ids = set(leave_ids)
+    
+    leaves = Leave.query.filter(Leave.id.in_(leave_ids)).all() if leave_ids else []
+    found = {leave.id for leave in leaves}
+    unchanged = sorted(leave.id for leave in leaves if leave.status == status)
+    try:
+        attendance_created = set_leave_status(leaves, status)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'updated': len(leaves) - len(unchanged),
+        'unchanged': unchanged,
+        'not_found': sorted(leave_ids - found),
+        'attendance_created': attendance_created
+    })
+
+@bp.route('/api/admin/payroll/process', methods=['POST'])
 @admin_required
 def process_payroll():
     data = request.get_json()
     month = int(data['month'])
     year = int(data['year'])
+    shard_by = data.get('shard_by', 'employee_range')
+    if shard_by not in ('department', 'employee_range'):
+        return jsonify({'success': False, 'error': 'shard_by must be department or employee_range'}), 400
+    if db.session.get(ArchivedYear, ('payroll', year)):
+        return jsonify({'success': False, 'error': f'Payroll for {year} is archived'}), 400
     
-    employees = Employee.query.filter_by(is_active=True).all()
-    processed_count = 0
+    job = submit_payroll_job(month, year, shard_by)
     
-    for employee in employees:
-        # Check if payroll already exists
-        existing = Payroll.query.filter_by(
-            employee_id=employee.id,
-            month=month,
-            year=year
-        ).first()
-        
-        if existing:
-            continue
-        
-        # Calculate attendance
-        start_date = datetime(year, month, 1).date()
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1).date()
-        else:
-            end_date = datetime(year, month + 1, 1).date()
-        
-        working_days = (end_date - start_date).days
-        
-        attendance_records = Attendance.query.filter(
-            Attendance.employee_id == employee.id,
-            Attendance.date >= start_date,
-            Attendance.date < end_date
-        ).all()
-        
-        present_days = sum(1 for a in attendance_records if a.status in ['present', 'half-day'])
-        absent_days = sum(1 for a in attendance_records if a.status == 'absent')
-        
-        # Calculate salary
-        gross_salary = (
-            employee.basic_salary +
-            employee.hra +
-            employee.da +
-            employee.ta +
-            employee.other_allowances
-        )
-        
-        total_deductions = (
-            employee.pf_deduction +
-            employee.tax_deduction +
-            employee.other_deductions
-        )
-        
-        # Adjust for absences
-        per_day_salary = gross_salary / working_days
-        absence_deduction = per_day_salary * absent_days
-        
-        net_salary = gross_salary - total_deductions - absence_deduction
-        
-        payroll = Payroll(
-            employee_id=employee.id,
-            month=month,
-            year=year,
-            basic_salary=employee.basic_salary,
-            hra=employee.hra,
-            da=employee.da,
-            ta=employee.ta,
-            other_allowances=employee.other_allowances,
-            gross_salary=gross_salary,
-            pf_deduction=employee.pf_deduction,
-            tax_deduction=employee.tax_deduction,
-            other_deductions=employee.other_deductions + absence_deduction,
-            total_deductions=total_deductions + absence_deduction,
-            net_salary=net_salary,
-            working_days=working_days,
-            present_days=present_days,
-            absent_days=absent_days,
-            status='processed'
-        )
-        
-        db.session.add(payroll)
-        processed_count += 1
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': url_for('.payroll_job', job_id=job.id),
+        'message': f'Payroll job queued for {job.total_employees} employees'
+    }), 202
+
+@bp.route('/api/admin/payroll/jobs/<job_id>', methods=['GET'])
+@admin_required
+def payroll_job(job_id):
+    job = PayrollJob.query.get_or_404(job_id)
+    return jsonify(payroll_job_status(job))
+
+@bp.route('/api/admin/payroll/jobs/<job_id>/resume', methods=['POST'])
+@admin_required
+def resume_payroll(job_id):
+    job = PayrollJob.query.get_or_404(job_id)
+    resumed = resume_payroll_job(job)
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'resumed_shards': resumed,
+        'status_url': url_for('.payroll_job', job_id=job.id)
+    }), 202
+
+@bp.route('/api/admin/payroll/recompute', methods=['POST'])
+@admin_required
+def recompute_payroll():
+    data = request.get_json(silent=True) or {}
+    month = data.get('month')
+    year = data.get('year')
     
-    db.session.commit()
+    result = recompute_dirty_payroll(int(month) if month else None, int(year) if year else None)
+    
+    return jsonify({'success': True, **result})
+
+@bp.route('/api/admin/payroll/simulate', methods=['POST'])
+@admin_required
+def payroll_simulation():
+    data = request.get_json(silent=True) or {}
+    scenarios = data.get('scenarios')
+    if not isinstance(scenarios, list) or not scenarios or not all(isinstance(s, dict) for s in scenarios):
+        return jsonify({'success': False, 'error': 'scenarios must be a non-empty list of objects'}), 400
+    if len(scenarios) > current_app.config['SIMULATION_MAX_SCENARIOS']:
+        return jsonify({
+            'success': False, 'error': f"At most {current_app.config['SIMULATION_MAX_SCENARIOS']} scenarios"
+        }), 400
+    group_by = data.get('group_by')
+    if group_by not in (None, 'department', 'designation'):
+        return jsonify({'success': False, 'error': 'group_by must be department or designation'}), 400
+    month = data.get('month')
+    year = data.get('year')
+    if bool(month) != bool(year) or (month and not 1 <= int(month) <= 12):
+        return jsonify({'success': False, 'error': 'Give both month and year, or neither'}), 400
+    
+    started = time.perf_counter()
+    now = datetime.now()
+    working_days = working_days_in_month(int(month or now.month), int(year or now.year))
+    employees = load_simulation_cohort(int(month) if month else None, int(year) if year else None)
+    try:
+        baseline, results = simulate_payroll(employees, scenarios, working_days, group_by)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
-        'processed_count': processed_count,
-        'message': f'Payroll processed for {processed_count} employees'
+        'employees': len(employees),
+        'month': month,
+        'year': year,
+        'working_days': working_days,
+        'baseline': baseline,
+        'scenarios': results,
+        'elapsed_seconds': round(time.perf_counter() - started, 3)
     })
 
-@app.route('/api/admin/payroll', methods=['GET'])
+@bp.route('/api/admin/payroll', methods=['GET'])
 @admin_required
+@read_replica
 def get_payroll():
     month = request.args.get('month')
     year = request.args.get('year')
     
-    query = Payroll.query
+    query = select_fields(Payroll, PAYROLL_FIELDS)
     
     if month and year:
-        query = query.filter_by(month=int(month), year=int(year))
-    
-    payrolls = query.order_by(Payroll.created_at.desc()).all()
-    
-    return jsonify([{
-        'id': p.id,
-        'employee_id': p.employee_id,
-        'employee_name': p.employee.name,
-        'month': p.month,
-        'year': p.year,
-        'gross_salary': p.gross_salary,
-        'total_deductions': p.total_deductions,
-        'net_salary': p.net_salary,
-        'status': p.status
-    } for p in payrolls])
-
-@app.route('/api/admin/reports/summary', methods=['GET'])
+        query = query.filter(Payroll.month == int(month), Payroll.year == int(year))
+    
+    if 'since' in request.args:
+        return delta_response(
+            query, Payroll.updated_at, PAYROLL_FIELDS, [Payroll.created_at.desc(), Payroll.id.desc()]
+        )
+    
+    if wants_pagination():
+        return keyset_response(query, [Payroll.created_at, Payroll.id], PAYROLL_FIELDS, descending=True)
+    
+    payrolls = db.session.execute(query.order_by(Payroll.created_at.desc(), Payroll.id.desc())).all()
+    
+    return jsonify([serialize(p, PAYROLL_FIELDS) for p in payrolls])
+
+@bp.route('/api/admin/payroll/export', methods=['GET'])
+@admin_required
+@read_replica
+def export_payroll():
+    month = request.args.get('month', type=int)
+    year = request.args.get('year', type=int)
+    export_format = request.args.get('format', 'zip')
+    if not month or not year or not 1 <= month <= 12:
+        return jsonify({'error': 'month and year are required'}), 400
+    if export_format not in ('zip', 'csv', 'parquet'):
+        return jsonify({'error': 'format must be zip, csv or parquet'}), 400
+    
+    if not db.session.query(Payroll.query.filter_by(month=month, year=year).exists()).scalar():
+        return jsonify({'error': 'No payroll processed for this month'}), 404
+    
+    if export_format == 'zip':
+        mimetype = 'application/zip'
+        chunks = export_payslip_zip(payslip_export_rows(month, year), month, year)
+    elif export_format == 'csv':
+        mimetype = 'text/csv'
+        chunks = export_payslip_csv(payslip_export_rows(month, year))
+    else:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            return jsonify({'error': 'Parquet export requires pyarrow'}), 501
+        mimetype = 'application/vnd.apache.parquet'
+        chunks = export_payslip_parquet(payslip_export_rows(month, year), pa, pq)
+    
+    filename = f'payslips_{year}-{month:02d}.{export_format}'
+    return current_app.response_class(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@bp.route('/api/admin/metrics', methods=['GET'])
+def metrics():
+    token = current_app.config['METRICS_TOKEN']
+    bearer = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(bearer, f'Bearer {token}')):
+        if 'user_id' not in session:
+            return redirect(url_for('.login'))
+        if session.get('role') != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
+    
+    cache_stats = employee_cache.stats()
+    for name, counter in employee_cache_counters.items():
+        counter.set_total(cache_stats[name])
+    employee_cache_entries.set(cache_stats['size'])
+    
+    return current_app.response_class(
+        render([
+            request_seconds, request_sql_statements, request_sql_seconds, request_sql_rows,
+            request_serialize_seconds, slow_queries, *employee_cache_counters.values(), employee_cache_entries
+        ]),
+        mimetype='text/plain; version=0.0.4'
+    )
+
+@bp.route('/api/admin/cache/stats', methods=['GET'])
+@admin_required
+def cache_stats():
+    return jsonify({'employee': employee_cache.stats()})
+
+@bp.route('/api/admin/reports/summary', methods=['GET'])
 @admin_required
+@read_replica
 def payroll_summary():
     month = request.args.get('month')
     year = request.args.get('year')
@@ -484,78 +3098,152 @@ def payroll_summary():
         month = now.month
         year = now.year
     
-    payrolls = Payroll.query.filter_by(month=int(month), year=int(year)).all()
+    summary = payroll_summary_for(int(month), int(year))
+    
+    return jsonify({
+        'month': month,
+        'year': year,
+        **summary
+    })
+
+@bp.route('/api/admin/analytics/payroll', methods=['GET'])
+@admin_required
+@read_replica
+def payroll_analytics():
+    now = datetime.now()
+    try:
+        end = parse_period(request.args['end']) if 'end' in request.args else (now.year, now.month)
+        start = parse_period(request.args['start']) if 'start' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'start and end must look like YYYY-MM'}), 400
+    group_by = request.args.get('group_by', 'department')
+    if group_by not in GROUP_COLUMNS:
+        return jsonify({'error': 'group_by must be department or designation'}), 400
+    
+    # Months as year * 12 + month - 1; the default range is the last 12 months.
+    last = end[0] * 12 + end[1] - 1
+    first = start[0] * 12 + start[1] - 1 if start else last - 11
+    periods = [(n // 12, n % 12 + 1) for n in range(first, last + 1)]
+    if not periods:
+        return jsonify({'error': 'start must not be after end'}), 400
+    if len(periods) > current_app.config['ANALYTICS_MAX_MONTHS']:
+        return jsonify({'error': f"At most {current_app.config['ANALYTICS_MAX_MONTHS']} months"}), 400
+    
+    frame = payroll_analytics_frame(periods)
+    months = monthly_trends(frame, periods)
+    return jsonify({
+        'start': '%d-%02d' % periods[0],
+        'end': '%d-%02d' % periods[-1],
+        'group_by': group_by,
+        'months': months,
+        'groups': group_trends(frame, periods, group_by),
+        'totals': range_totals(frame, months)
+    })
+
+@bp.route('/api/admin/reports/attendance', methods=['GET'])
+@admin_required
+@read_replica
+def attendance_summary():
+    month = request.args.get('month')
+    year = request.args.get('year')
+    
+    if not month or not year:
+        now = datetime.now()
+        month = now.month
+        year = now.year
     
-    total_gross = sum(p.gross_salary for p in payrolls)
-    total_deductions = sum(p.total_deductions for p in payrolls)
-    total_net = sum(p.net_salary for p in payrolls)
+    rows = db.session.execute(
+        db.select(AttendanceMonthlySummary, Employee.name)
+        .join(Employee, Employee.id == AttendanceMonthlySummary.employee_id)
+        .filter(AttendanceMonthlySummary.year == int(year), AttendanceMonthlySummary.month == int(month))
+        .order_by(Employee.name)
+    ).all()
     
     return jsonify({
         'month': month,
         'year': year,
-        'total_employees': len(payrolls),
-        'total_gross_salary': total_gross,
-        'total_deductions': total_deductions,
-        'total_net_salary': total_net
+        'employees': [{
+            'employee_id': s.employee_id,
+            'employee_name': name,
+            'present_days': s.present_days,
+            'half_days': s.half_days,
+            'absent_days': s.absent_days,
+            'leave_days': s.leave_days
+        } for s, name in rows],
+        'total_present_days': sum(s.present_days for s, _ in rows),
+        'total_half_days': sum(s.half_days for s, _ in rows),
+        'total_absent_days': sum(s.absent_days for s, _ in rows),
+        'total_leave_days': sum(s.leave_days for s, _ in rows)
     })
 
 # Employee API Routes
-@app.route('/api/employee/profile', methods=['GET'])
+@bp.route('/api/employee/profile', methods=['GET'])
 @login_required
+@read_replica
 def employee_profile():
     if session.get('role') != 'employee':
         return jsonify({'error': 'Access denied'}), 403
     
-    employee = Employee.query.get_or_404(session['employee_id'])
+    employee_id = session['employee_id']
     
-    return jsonify({
-        'id': employee.id,
-        'name': employee.name,
-        'email': employee.email,
-        'phone': employee.phone,
-        'department': employee.department,
-        'designation': employee.designation,
-        'date_of_joining': employee.date_of_joining.strftime('%Y-%m-%d'),
-        'basic_salary': employee.basic_salary,
-        'hra': employee.hra,
-        'da': employee.da,
-        'ta': employee.ta,
-        'other_allowances': employee.other_allowances
-    })
+    def load():
+        employee = db.session.execute(employee_profile_query(employee_id)).first()
+        if employee is None:
+            abort(404)
+        return serialize(employee, EMPLOYEE_PROFILE_FIELDS)
+    
+    return cached_employee_response(('profile', employee_id), load)
 
-@app.route('/api/employee/payslips', methods=['GET'])
+@bp.route('/api/employee/payslips', methods=['GET'])
 @login_required
+@read_replica
 def employee_payslips():
     if session.get('role') != 'employee':
         return jsonify({'error': 'Access denied'}), 403
     
-    payslips = Payroll.query.filter_by(
-        employee_id=session['employee_id']
-    ).order_by(Payroll.year.desc(), Payroll.month.desc()).all()
-    
-    return jsonify([{
-        'id': p.id,
-        'month': p.month,
-        'year': p.year,
-        'basic_salary': p.basic_salary,
-        'hra': p.hra,
-        'da': p.da,
-        'ta': p.ta,
-        'other_allowances': p.other_allowances,
-        'gross_salary': p.gross_salary,
-        'pf_deduction': p.pf_deduction,
-        'tax_deduction': p.tax_deduction,
-        'other_deductions': p.other_deductions,
-        'total_deductions': p.total_deductions,
-        'net_salary': p.net_salary,
-        'working_days': p.working_days,
-        'present_days': p.present_days,
-        'absent_days': p.absent_days,
-        'status': p.status
-    } for p in payslips])
-
-@app.route('/api/employee/leaves', methods=['GET', 'POST'])
+    employee_id = session['employee_id']
+    
+    def load():
+        payslips = db.session.execute(employee_payslips_query(employee_id)).all()
+        archives = db.session.execute(archived_payroll_paths_query()).scalars().all()
+        payslips = with_archived_payslips(payslips, archives, employee_id)
+        return [serialize(p, PAYSLIP_FIELDS) for p in payslips]
+    
+    return cached_employee_response(('payslips', employee_id), load)
+
+@bp.route('/api/employee/payslips/<int:year>/<int:month>/document', methods=['GET'])
+@login_required
+def employee_payslip_document(year, month):
+    if session.get('role') != 'employee':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    content_hash = current_payslip_hash(session['employee_id'], year, month)
+    if content_hash is None:
+        return jsonify({'error': 'Payslip not found'}), 404
+    return redirect(url_for('.payslip_document', content_hash=content_hash))
+
+# Read from the primary: a document rendered moments ago may not have
+# reached the replica yet.
+@bp.route('/api/payslips/<content_hash>', methods=['GET'])
+@login_required
+def payslip_document(content_hash):
+    stmt = db.select(PayslipDocument.content, PayslipDocument.year, PayslipDocument.month) \
+        .filter_by(content_hash=content_hash)
+    if session.get('role') != 'admin':
+        stmt = stmt.filter_by(employee_id=session.get('employee_id'))
+    document = db.session.execute(stmt.limit(1)).first()
+    if document is None:
+        return jsonify({'error': 'Payslip not found'}), 404
+    
+    response = current_app.response_class(document.content, mimetype='text/html')
+    response.set_etag(content_hash)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    response.headers['Content-Disposition'] = f'inline; filename="payslip_{document.year}-{document.month:02d}.html"'
+    return response.make_conditional(request)
+
+@bp.route('/api/employee/leaves', methods=['GET', 'POST'])
 @login_required
+@read_replica
 def employee_leaves():
     if session.get('role') != 'employee':
         return jsonify({'error': 'Access denied'}), 403
@@ -583,58 +3271,346 @@ def employee_leaves():
         return jsonify({'success': True})
     
     # GET
-    leaves = Leave.query.filter_by(
-        employee_id=session['employee_id']
-    ).order_by(Leave.applied_at.desc()).all()
-    
-    return jsonify([{
-        'id': l.id,
-        'leave_type': l.leave_type,
-        'start_date': l.start_date.strftime('%Y-%m-%d'),
-        'end_date': l.end_date.strftime('%Y-%m-%d'),
-        'days': l.days,
-        'reason': l.reason,
-        'status': l.status,
-        'applied_at': l.applied_at.strftime('%Y-%m-%d %H:%M')
-    } for l in leaves])
-
-@app.route('/api/employee/attendance', methods=['GET'])
+    employee_id = session['employee_id']
+    
+    def load():
+        leaves = db.session.execute(employee_leaves_query(employee_id)).all()
+        return [serialize(l, EMPLOYEE_LEAVE_FIELDS) for l in leaves]
+    
+    return cached_employee_response(('leaves', employee_id), load)
+
+@bp.route('/api/employee/attendance', methods=['GET'])
 @login_required
+@read_replica
 def employee_attendance():
     if session.get('role') != 'employee':
         return jsonify({'error': 'Access denied'}), 403
     
-    month = request.args.get('month')
-    year = request.args.get('year')
+    start_date, end_date = attendance_month(request.args.get('month'), request.args.get('year'))
+    employee_id = session['employee_id']
     
-    if not month or not year:
-        now = datetime.now()
-        month = now.month
-        year = now.year
+    def load():
+        archive = db.session.get(ArchivedYear, ('attendance', start_date.year))
+        if archive:
+            records = archived_attendance(archive.path, employee_id, start_date, end_date)
+            return [serialize(a, EMPLOYEE_ATTENDANCE_FIELDS) for a in records]
+        if current_app.config['ATTENDANCE_STORAGE'] == 'bitmap':
+            records = bitmap_attendance_days(employee_id, start_date, end_date, reverse=False)
+            return [serialize(a, EMPLOYEE_ATTENDANCE_FIELDS) for a in records]
+        records = db.session.execute(employee_attendance_query(employee_id, start_date, end_date)).all()
+        return [serialize(a, EMPLOYEE_ATTENDANCE_FIELDS) for a in records]
     
-    start_date = datetime(int(year), int(month), 1).date()
-    if int(month) == 12:
-        end_date = datetime(int(year) + 1, 1, 1).date()
+    return cached_employee_response(('attendance', employee_id, start_date.year, start_date.month), load)
+
+# Synthetic data
+SEED_DEPARTMENTS = {
+    'Engineering': ['Software Engineer', 'Senior Engineer', 'Engineering Manager'],
+    'Finance': ['Accountant', 'Financial Analyst', 'Finance Manager'],
+    'Human Resources': ['HR Executive', 'HR Manager'],
+    'Sales': ['Sales Executive', 'Account Manager', 'Sales Manager'],
+    'Operations': ['Operations Associate', 'Operations Manager'],
+}
+SEED_FIRST_NAMES = [
+    'Aarav', 'Aditi', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Neha', 'Nikhil', 'Priya',
+    'Rahul', 'Riya', 'Rohan', 'Sanya', 'Siddharth', 'Sneha', 'Tanvi', 'Varun', 'Vikram', 'Zoya',
+]
+SEED_LAST_NAMES = [
+    'Agarwal', 'Bose', 'Chopra', 'Desai', 'Gupta', 'Iyer', 'Joshi', 'Kapoor', 'Kumar', 'Mehta',
+    'Nair', 'Patel', 'Rao', 'Reddy', 'Shah', 'Sharma', 'Singh', 'Verma',
+]
+SEED_LEAVE_TYPES = ['sick', 'casual', 'earned']
+
+def write_seed_attendance(attendance):
+    if current_app.config['ATTENDANCE_STORAGE'] == 'bitmap':
+        write_attendance_bitmaps(attendance, overwrite=True)
     else:
-        end_date = datetime(int(year), int(month) + 1, 1).date()
-    
-    records = Attendance.query.filter(
-        Attendance.employee_id == session['employee_id'],
-        Attendance.date >= start_date,
-        Attendance.date < end_date
-    ).order_by(Attendance.date).all()
-    
-    return jsonify([{
-        'date': a.date.strftime('%Y-%m-%d'),
-        'status': a.status,
-        'remarks': a.remarks
-    } for a in records])
+        db.session.execute(insert(Attendance), attendance)
+    db.session.commit()
+    return len(attendance)
+
+def seed_synthetic_data(employees, years, seed=0, password='password'):
+    """Add ``employees`` employees with ``years`` years of attendance, leave
+    and payroll history up to the end of last month, through the same bulk
+    paths the app uses. Each employee can log in as ``emp<id>`` with
+    ``password``. Returns the number of rows created per table."""
+    rnd = random.Random(seed)
+    today = datetime.now().date()
+    end_date = today.replace(day=1)
+    start_date = end_date.replace(year=end_date.year - years)
+    first_id = (db.session.execute(db.select(func.max(Employee.id))).scalar() or 0) + 1
+    password_hash = generate_password_hash(password)
+    batch_size = current_app.config['ATTENDANCE_BATCH_SIZE']
+
+    new_employees = []
+    for number in range(first_id, first_id + employees):
+        first_name, last_name = rnd.choice(SEED_FIRST_NAMES), rnd.choice(SEED_LAST_NAMES)
+        department = rnd.choice(list(SEED_DEPARTMENTS))
+        basic_salary = round(rnd.lognormvariate(10.3, 0.4), 2)
+        new_employees.append(({
+            'name': f'{first_name} {last_name}',
+            'email': f'{first_name}.{last_name}.{number}@example.com'.lower(),
+            'phone': f'9{rnd.randrange(10 ** 9):09d}',
+            'department': department,
+            'designation': rnd.choice(SEED_DEPARTMENTS[department]),
+            'date_of_joining': start_date - timedelta(days=rnd.randrange(2000)),
+            'basic_salary': basic_salary,
+            'hra': round(basic_salary * 0.4, 2),
+            'da': round(basic_salary * 0.1, 2),
+            'ta': float(rnd.choice([1600, 2400, 3200])),
+            'other_allowances': round(rnd.uniform(0, 5000), 2),
+            'pf_deduction': round(basic_salary * 0.12, 2),
+            'tax_deduction': round(basic_salary * rnd.uniform(0.05, 0.2), 2),
+            'other_deductions': float(rnd.choice([0, 200, 500])),
+        }, (f'emp{number}', password_hash)))
+    for offset in range(0, len(new_employees), batch_size):
+        insert_employees(new_employees[offset:offset + batch_size])
+    db.session.commit()
+    employee_ids = db.session.execute(db.select(Employee.id).filter(Employee.id >= first_id)).scalars().all()
+
+    leaves = []
+    leave_days = set()
+    for employee_id in employee_ids:
+        for _ in range(years * rnd.randint(2, 6)):
+            leave_start = start_date + timedelta(days=rnd.randrange((end_date - start_date).days))
+            leave_end = min(leave_start + timedelta(days=rnd.randint(0, 4)), end_date - timedelta(days=1))
+            status = rnd.choices(['approved', 'rejected', 'pending'], [0.75, 0.1, 0.15])[0]
+            leaves.append({
+                'employee_id': employee_id,
+                'leave_type': rnd.choice(SEED_LEAVE_TYPES),
+                'start_date': leave_start,
+                'end_date': leave_end,
+                'days': (leave_end - leave_start).days + 1,
+                'reason': 'Synthetic leave',
+                'status': status,
+                'applied_at': datetime.combine(leave_start - timedelta(days=rnd.randint(1, 14)), datetime.min.time()),
+            })
+            if status == 'approved':
+                leave_days.update(
+                    (employee_id, leave_start + timedelta(days=n)) for n in range((leave_end - leave_start).days + 1)
+                )
+    for offset in range(0, len(leaves), batch_size):
+        db.session.execute(insert(Leave), leaves[offset:offset + batch_size])
+    db.session.commit()
+
+    attendance = []
+    attendance_count = 0
+    for employee_id in employee_ids:
+        day = start_date
+        while day < end_date:
+            if day.weekday() < 5:
+                if (employee_id, day) in leave_days:
+                    status, remarks = 'leave', 'Approved leave'
+                else:
+                    status, remarks = rnd.choices(['present', 'half-day', 'absent'], [0.92, 0.03, 0.05])[0], ''
+                attendance.append({'employee_id': employee_id, 'date': day, 'status': status, 'remarks': remarks})
+            day += timedelta(days=1)
+        if len(attendance) >= batch_size:
+            attendance_count += write_seed_attendance(attendance)
+            attendance = []
+    if attendance:
+        attendance_count += write_seed_attendance(attendance)
+    rebuild_attendance_summary()
+
+    # Every month but the last has been paid out.
+    payroll_count = 0
+    months = list(months_between(start_date, end_date - timedelta(days=1)))
+    for year, month in months:
+        payroll_count += insert_payroll(month, year, Employee.id >= first_id)
+        if (year, month) != months[-1]:
+            db.session.execute(
+                db.update(Payroll)
+                .filter(Payroll.month == month, Payroll.year == year, Payroll.employee_id >= first_id)
+                .values(status='paid')
+            )
+        db.session.commit()
+
+    return {
+        'employees': len(employee_ids),
+        'leaves': len(leaves),
+        'attendance': attendance_count,
+        'payroll': payroll_count,
+    }
+
+@bp.cli.command('seed-data')
+@click.option('--employees', default=200, show_default=True, help='Employees to create.')
+@click.option('--years', default=2, show_default=True, help='Years of history per employee.')
+@click.option('--seed', default=0, show_default=True, help='Random seed.')
+def seed_data_command(employees, years, seed):
+    """Generate synthetic employees with attendance, leave and payroll history."""
+    counts = seed_synthetic_data(employees, years, seed)
+    click.echo(', '.join(f'{count} {name}' for name, count in counts.items()))
+
+# Batch commands
+def drain_workers():
+    """Wait for the payroll and payslip worker pools to finish everything
+    queued, so a command does not exit before its background work is done."""
+    global payroll_executor, payslip_executor
+    # Payroll shards queue payslip renders, so drain them first.
+    if payroll_executor is not None:
+        payroll_executor.shutdown(wait=True)
+        payroll_executor = None
+    if payslip_executor is not None:
+        payslip_executor.shutdown(wait=True)
+        payslip_executor = None
+
+@bp.cli.command('run-payroll')
+@click.option('--month', type=click.IntRange(1, 12), required=True, help='Month to process.')
+@click.option('--year', type=int, required=True, help='Year to process.')
+@click.option('--shard-by', type=click.Choice(['employee_range', 'department']), default='employee_range',
+              show_default=True, help='How to split the workforce between workers.')
+def run_payroll_command(month, year, shard_by):
+    """Process a month's payroll and its payslip documents. Exits with 1 if any employee failed."""
+    if db.session.get(ArchivedYear, ('payroll', year)):
+        raise click.ClickException(f'Payroll for {year} is archived')
+    job_id = submit_payroll_job(month, year, shard_by).id
+    drain_workers()
+    db.session.expire_all()
+    status = payroll_job_status(db.session.get(PayrollJob, job_id))
+    if status['status'] in ('queued', 'running'):
+        raise click.ClickException(f'Payroll job {job_id} for {month}/{year} is already running in another process')
+    click.echo(f"Payroll job {job_id} {status['status']}: {status['processed_count']} payroll rows created "
+               f"in {status['elapsed_seconds']}s")
+    for error in status['errors']:
+        click.echo(f"Shard {error['shard']}: {error['error']}", err=True)
+    if status['status'] == 'failed':
+        raise SystemExit(1)
+
+@bp.cli.command('recompute-payroll')
+@click.option('--month', type=click.IntRange(1, 12), help='Only recompute this month (with --year).')
+@click.option('--year', type=int, help='Only recompute this year\'s month given by --month.')
+def recompute_payroll_command(month, year):
+    """Regenerate the payroll rows flagged dirty by attendance, leave and salary changes."""
+    if bool(month) != bool(year):
+        raise click.UsageError('Give both --month and --year, or neither')
+    result = recompute_dirty_payroll(month, year)
+    drain_workers()
+    click.echo(f"Recomputed {result['recomputed']} payroll rows, skipped {result['skipped_paid']} paid rows, "
+               f"cleared {result['cleared']} flags")
+
+@bp.cli.command('rebuild-caches')
+@click.option('--year', type=int, help='Only rebuild this year.')
+@click.option('--month', type=click.IntRange(1, 12), help='Only rebuild this month (with --year).')
+def rebuild_caches_command(year, month):
+    """Rebuild the attendance rollup, cached payroll reports, analytics snapshots and payslip documents."""
+    if month and not year:
+        raise click.UsageError('--month needs --year')
+    summaries = rebuild_attendance_summary(year, month)
+
+    query = db.select(Payroll.year, Payroll.month).distinct().order_by(Payroll.year, Payroll.month)
+    if year:
+        query = query.filter(Payroll.year == year)
+    if month:
+        query = query.filter(Payroll.month == month)
+    periods = [tuple(period) for period in db.session.execute(query)]
+    invalidate_payroll_summary([(period_month, period_year) for period_year, period_month in periods])
+    db.session.commit()
+    closed = [(period_year, period_month) for period_year, period_month in periods
+              if is_finalized(period_month, period_year)]
+    for period_year, period_month in closed:
+        payroll_summary_for(period_month, period_year)
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        snapshots = 0
+    else:
+        # One month at a time keeps a single month's frame in memory.
+        for period in closed:
+            payroll_analytics_frame([period])
+        snapshots = len(closed)
+    rendered = sum(render_payslips(period_month, period_year) for period_year, period_month in periods)
+
+    click.echo(f'Rebuilt {summaries} attendance summary rows, {len(closed)} payroll reports, '
+               f'{snapshots} analytics snapshots and {rendered} payslip documents')
+
+# Schema management
+def hot_queries():
+    """The filter/sort shapes of the busiest queries, with sample values, for
+    checking that each one is served by an index."""
+    start_date, end_date = datetime(2025, 1, 1).date(), datetime(2025, 2, 1).date()
+    return [
+        ('admin attendance by month', select_fields(Attendance, ATTENDANCE_FIELDS)
+            .filter(Attendance.date >= start_date, Attendance.date < end_date)
+            .order_by(Attendance.date.desc(), Attendance.id.desc()).limit(100)),
+        ('admin attendance by employee', select_fields(Attendance, ATTENDANCE_FIELDS)
+            .filter(Attendance.employee_id == 1).order_by(Attendance.date.desc())),
+        ('employee attendance', select_fields(Attendance, EMPLOYEE_ATTENDANCE_FIELDS)
+            .filter(Attendance.employee_id == 1, Attendance.date >= start_date, Attendance.date < end_date)
+            .order_by(Attendance.date)),
+        ('packed attendance by month', db.select(AttendanceMonth).filter_by(year=2025, month=1)),
+        ('packed attendance by employee', db.select(AttendanceMonth)
+            .filter_by(employee_id=1).order_by(AttendanceMonth.year.desc(), AttendanceMonth.month.desc())),
+        ('attendance remarks by month', db.select(AttendanceRemark)
+            .filter(AttendanceRemark.date >= start_date, AttendanceRemark.date < end_date)),
+        ('attendance summary for payroll', db.select(AttendanceMonthlySummary)
+            .filter_by(year=2025, month=1)),
+        ('leaves by status', select_fields(Leave, LEAVE_FIELDS)
+            .filter(Leave.status == 'pending').order_by(Leave.applied_at.desc())),
+        ('employee leaves', select_fields(Leave, EMPLOYEE_LEAVE_FIELDS)
+            .filter(Leave.employee_id == 1).order_by(Leave.applied_at.desc())),
+        ('payroll by month', select_fields(Payroll, PAYROLL_FIELDS)
+            .filter(Payroll.month == 1, Payroll.year == 2025)
+            .order_by(Payroll.created_at.desc(), Payroll.id.desc())),
+        ('existing payroll keys', db.select(Payroll.employee_id).filter_by(month=1, year=2025)),
+        ('employee payslips', select_fields(Payroll, PAYSLIP_FIELDS)
+            .filter(Payroll.employee_id == 1).order_by(Payroll.year.desc(), Payroll.month.desc())),
+        ('payroll summary', db.select(func.sum(Payroll.net_salary)).filter_by(month=1, year=2025)),
+        ('payslip document', db.select(PayslipDocument.content).filter_by(content_hash='0' * 64)),
+        *[(f'{model.__tablename__} changes', db.select(model).filter(model.updated_at >= datetime(2025, 1, 1)))
+          for model in (Employee, Attendance, AttendanceMonth, Leave, Payroll)],
+    ]
+
+@bp.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    applied = upgrade(db.engine, db.metadata)
+    click.echo(f"Applied migrations: {', '.join(map(str, applied))}" if applied else 'Schema is up to date')
+
+@bp.cli.command('create-partitions')
+@click.option('--ahead', default=1, show_default=True, help='Years after the current one to prepare.')
+def create_partitions_command(ahead):
+    """Add missing yearly PostgreSQL partitions for attendance and payroll."""
+    this_year = datetime.now().year
+    with db.engine.begin() as connection:
+        for table_name in PARTITION_KEYS:
+            if not is_partitioned(connection, table_name):
+                raise click.ClickException(f'{table_name} is not partitioned; run db-upgrade on PostgreSQL first')
+            for year in range(this_year, this_year + ahead + 1):
+                if create_year_partition(connection, table_name, year):
+                    click.echo(f'Created {table_name}_y{year}')
+
+@bp.cli.command('archive-year')
+@click.argument('year', type=int)
+@click.option('--drop', is_flag=True, help='Drop the detached PostgreSQL partitions instead of keeping them.')
+def archive_year_command(year, drop):
+    """Export a closed year of attendance and payroll to Parquet and take it out of the live tables."""
+    try:
+        archived = archive_year(year, drop)
+    except ImportError:
+        raise click.ClickException('Archiving requires pyarrow')
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if not archived:
+        click.echo(f'{year} is already archived')
+    for table_name, rows in archived.items():
+        click.echo(f'Archived {rows} {table_name} rows for {year}')
+
+@bp.cli.command('check-query-plans')
+def check_query_plans_command():
+    """EXPLAIN the hot queries and fail if any falls back to a sequential scan."""
+    failures = 0
+    with db.engine.begin() as connection:
+        for name, stmt in hot_queries():
+            scans = sequential_scans(connection, stmt)
+            click.echo(f"{'FAIL' if scans else 'ok  '} {name}" + (f": {'; '.join(scans)}" if scans else ''))
+            failures += bool(scans)
+    if failures:
+        raise SystemExit(1)
 
 # Initialize database
-@app.route('/api/init-db', methods=['POST'])
+@bp.route('/api/init-db', methods=['POST'])
 def init_db():
     try:
-        db.create_all()
+        upgrade(db.engine, db.metadata)
         
         # Create default admin user if not exists
         admin = User.query.filter_by(username='admin').first()
@@ -651,7 +3627,32 @@ def init_db():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Application factory
+def create_app(config=None):
+    """Build the app from ``config``, a config object. By default it is the
+    class named by ``APP_CONFIG``: ``production`` (the default) or
+    ``development``."""
+    if config is None:
+        name = os.environ.get('APP_CONFIG', 'production')
+        if name not in CONFIGS:
+            raise RuntimeError(f"APP_CONFIG must be one of {', '.join(CONFIGS)}")
+        config = CONFIGS[name]()
+    app = Flask(__name__)
+    app.config.from_object(config)
+    for key, folder in [('ARCHIVE_DIR', 'archive'), ('ANALYTICS_DIR', 'analytics_snapshots')]:
+        if not app.config.get(key):
+            app.config[key] = os.path.join(app.instance_path, folder)
+    app.json = TimedJSONProvider(app)
+    db.init_app(app)
+    CORS(app)
+    app.register_blueprint(bp)
+    employee_cache.maxsize = app.config['EMPLOYEE_CACHE_SIZE']
+    employee_cache.ttl = app.config['EMPLOYEE_CACHE_TTL']
+    snapshot_cache.maxsize = app.config['ANALYTICS_CACHE_SIZE']
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        db.create_all()
+        upgrade(db.engine, db.metadata)
     app.run(host='0.0.0.0', port=5000, debug=True)
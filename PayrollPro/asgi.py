@@ -0,0 +1,314 @@
+"""ASGI entry point with async employee self-service reads.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+The employee dashboard's reads (profile, payslips, leaves and attendance) are
+served on the event loop through an async driver and pool (asyncpg for
+PostgreSQL, aiosqlite for SQLite), so a payday crowd waiting on the database
+costs a coroutine per request instead of a worker thread. They authenticate
+with the same signed session cookie as the Flask app, answer with the same
+JSON and ETags and share ``employee_cache`` with it.
+
+Every other request is handed to the Flask app, which runs in a pool of
+``ASGI_WSGI_THREADS`` threads with its usual blocking engine. Logins, admin
+writes and cache invalidations therefore behave exactly as under
+``python app.py``.
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from itsdangerous import BadSignature
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import InternalServerError, NotFound
+from werkzeug.utils import redirect
+from werkzeug.wrappers import Request
+
+from app import (
+    EMPLOYEE_ATTENDANCE_FIELDS, EMPLOYEE_LEAVE_FIELDS, EMPLOYEE_PROFILE_FIELDS, PAYSLIP_FIELDS,
+    archived_attendance, archived_attendance_path_query, archived_payroll_paths_query, attendance_month,
+    create_app, employee_attendance_query, employee_cache, employee_cache_entry, employee_cache_response,
+    employee_leaves_query, employee_payslips_query, employee_profile_query, engine_options, month_remarks_query,
+    packed_month_days, packed_month_query, request_seconds, serialize, with_archived_payslips
+)
+
+ASYNC_DRIVERS = {'postgres': 'postgresql+asyncpg', 'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_url(url):
+    """``url`` with its driver swapped for the async one."""
+    url = make_url(url)
+    backend = url.drivername.split('+')[0]
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f'No async driver configured for {backend} databases')
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if 'sslmode' in url.query:
+        # asyncpg takes libpq's sslmode values under the name ssl.
+        url = url.difference_update_query(['sslmode']).update_query_dict({'ssl': url.query['sslmode']})
+    return url
+
+
+def async_engine_options(url):
+    options = engine_options(url)
+    options.pop('connect_args', None)
+    statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    if statement_timeout and url.startswith('postgres'):
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(statement_timeout)}}
+    return options
+
+
+def create_engine(url):
+    try:
+        return create_async_engine(async_url(url), **async_engine_options(url))
+    except ImportError as e:
+        raise RuntimeError(
+            'The async serving mode needs an async database driver: '
+            'pip install asyncpg (PostgreSQL) or aiosqlite (SQLite)'
+        ) from e
+
+
+app = create_app()
+primary_engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+read_url = app.config.get('SQLALCHEMY_BINDS', {}).get('replica', {}).get('url')
+replica_engine = create_engine(read_url) if read_url else None
+wsgi_executor = ThreadPoolExecutor(app.config['ASGI_WSGI_THREADS'], thread_name_prefix='wsgi')
+session_serializer = app.session_interface.get_signing_serializer(app)
+
+
+# Employee reads. Each handler returns the cache key and an async loader that
+# takes a connection, like the ``load`` functions of the Flask routes.
+def profile(employee_id, args):
+    async def load(connection):
+        employee = (await connection.execute(employee_profile_query(employee_id))).first()
+        if employee is None:
+            raise NotFound()
+        return serialize(employee, EMPLOYEE_PROFILE_FIELDS)
+
+    return ('profile', employee_id), load
+
+
+def payslips(employee_id, args):
+    async def load(connection):
+        rows = (await connection.execute(employee_payslips_query(employee_id))).all()
+        archives = (await connection.execute(archived_payroll_paths_query())).scalars().all()
+        if archives:
+            rows = await asyncio.to_thread(with_archived_payslips, rows, archives, employee_id)
+        return [serialize(p, PAYSLIP_FIELDS) for p in rows]
+
+    return ('payslips', employee_id), load
+
+
+def leaves(employee_id, args):
+    async def load(connection):
+        rows = (await connection.execute(employee_leaves_query(employee_id))).all()
+        return [serialize(l, EMPLOYEE_LEAVE_FIELDS) for l in rows]
+
+    return ('leaves', employee_id), load
+
+
+def attendance(employee_id, args):
+    start_date, end_date = attendance_month(args.get('month'), args.get('year'))
+    year, month = start_date.year, start_date.month
+
+    async def load(connection):
+        archive = (await connection.execute(archived_attendance_path_query(year))).scalar()
+        if archive:
+            records = await asyncio.to_thread(archived_attendance, archive, employee_id, start_date, end_date)
+            return [serialize(a, EMPLOYEE_ATTENDANCE_FIELDS) for a in records]
+        if app.config['ATTENDANCE_STORAGE'] == 'bitmap':
+            masks = (await connection.execute(packed_month_query(employee_id, year, month))).first()
+            remarks = dict((await connection.execute(month_remarks_query(employee_id, start_date, end_date))).all())
+            records = packed_month_days(employee_id, masks, remarks, year, month)
+            return [serialize(a, EMPLOYEE_ATTENDANCE_FIELDS) for a in records]
+        records = (await connection.execute(employee_attendance_query(employee_id, start_date, end_date))).all()
+        return [serialize(a, EMPLOYEE_ATTENDANCE_FIELDS) for a in records]
+
+    return ('attendance', employee_id, year, month), load
+
+
+EMPLOYEE_READS = {
+    '/api/employee/profile': profile,
+    '/api/employee/payslips': payslips,
+    '/api/employee/leaves': leaves,
+    '/api/employee/attendance': attendance,
+}
+
+
+def load_session(req):
+    """The Flask session carried by ``req``'s cookie, or {} when it is
+    missing, tampered with or expired."""
+    cookie = req.cookies.get(app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    try:
+        return session_serializer.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+async def employee_response(req, handler):
+    """What ``login_required``, ``read_replica`` and
+    ``cached_employee_response`` do for the Flask routes."""
+    session = load_session(req)
+    if 'user_id' not in session:
+        return redirect('/login')
+    if session.get('role') != 'employee':
+        response = app.json.response({'error': 'Access denied'})
+        response.status_code = 403
+        return response
+
+    key, load = handler(session['employee_id'], req.args)
+    entry = employee_cache.get(key)
+    if entry is None:
+        generation = employee_cache.generation
+        replica = replica_engine is not None and session.get('primary_until', 0) < time.time()
+        async with (replica_engine if replica else primary_engine).connect() as connection:
+            entry = employee_cache_entry(await load(connection))
+        settle = app.config['REPLICA_STICKY_SECONDS'] if replica else 0
+        employee_cache.set(key, entry, generation, settle=settle)
+    return employee_cache_response(entry, req)
+
+
+async def send_response(send, response, environ):
+    """Send a werkzeug ``response`` (which also handles HEAD) over ASGI."""
+    started = []
+    body = b''.join(response(environ, lambda status, headers, exc_info=None: started.append((status, headers))))
+    status_line, headers = started[0]
+    await send({
+        'type': 'http.response.start',
+        'status': int(status_line.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def serve_employee_read(scope, send, handler):
+    started = time.perf_counter()
+    environ = wsgi_environ(scope, b'')
+    req = Request(environ)
+    try:
+        # The shared helpers read the config through ``current_app``.
+        with app.app_context():
+            response = await employee_response(req, handler)
+    except NotFound as e:
+        response = e.get_response(environ)
+    except Exception:
+        app.logger.exception('Exception on %s [%s]', scope['path'], scope['method'])
+        response = InternalServerError().get_response(environ)
+    await send_response(send, response, environ)
+    if app.config['METRICS_ENABLED']:
+        request_seconds.observe(time.perf_counter() - started, scope['method'], scope['path'])
+
+
+# Everything else runs through the Flask app.
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope['headers']:
+        name, value = name.decode('latin1'), value.decode('latin1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    return environ
+
+
+async def call_flask(scope, receive, send):
+    """Run the Flask app for one request on ``wsgi_executor``. The whole
+    response, streamed bodies included, is produced on one thread so Flask's
+    request context stays on the thread that pushed it; each chunk is sent
+    from there and waits for the client to take it."""
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    environ = wsgi_environ(scope, bytes(body))
+    loop = asyncio.get_running_loop()
+
+    def send_from_thread(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        started = []
+
+        def write(data):
+            if started:
+                status, headers = started.pop()
+                send_from_thread({
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+                })
+            if data:
+                send_from_thread({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [(status, headers)]
+            return write
+
+        iterable = app(environ, start_response)
+        try:
+            for chunk in iterable:
+                write(chunk)
+            write(b'')
+            send_from_thread({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    await loop.run_in_executor(wsgi_executor, run)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await primary_engine.dispose()
+            if replica_engine is not None:
+                await replica_engine.dispose()
+            wsgi_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    handler = EMPLOYEE_READS.get(scope['path'])
+    if handler is not None and scope['method'] in ('GET', 'HEAD'):
+        await serve_employee_read(scope, send, handler)
+    else:
+        await call_flask(scope, receive, send)
@@ -0,0 +1,81 @@
+"""Packed monthly attendance.
+
+In the ``bitmap`` storage mode a month of attendance for one employee is a
+single row holding one 31-bit mask per status: bit ``d - 1`` of
+``present_mask`` is set when the employee was present on day ``d``. A day has
+at most one status bit set, and no bit at all when nothing was recorded.
+Counting days is a popcount and changing days is bitwise arithmetic, so both
+can run in SQL as well as here.
+
+Each recorded day also keeps the id it has, or would have, as an
+``attendance`` row, packed next to the masks as 31 little-endian 32-bit ints
+(0 for days without attendance), so listings give the same ids either way.
+
+The helpers in this module are pure; they work on ``{column: mask}`` dicts.
+"""
+import struct
+from datetime import date
+
+STATUS_MASKS = {
+    'present': 'present_mask',
+    'half-day': 'half_day_mask',
+    'absent': 'absent_mask',
+    'leave': 'leave_mask',
+}
+
+ALL_DAYS = (1 << 31) - 1
+
+DAY_IDS = struct.Struct('<31i')
+
+
+def day_bit(day):
+    return 1 << (day.day - 1)
+
+
+def empty_masks():
+    return dict.fromkeys(STATUS_MASKS.values(), 0)
+
+
+def status_on(masks, day):
+    """Return the status recorded for ``day`` in ``masks``, or None."""
+    bit = day_bit(day)
+    for status, column in STATUS_MASKS.items():
+        if masks[column] & bit:
+            return status
+    return None
+
+
+def set_status(masks, day, status):
+    """Record ``status`` for ``day`` in ``masks``, replacing any earlier one."""
+    bit = day_bit(day)
+    for column in STATUS_MASKS.values():
+        masks[column] &= ~bit
+    masks[STATUS_MASKS[status]] |= bit
+    return masks
+
+
+def count_days(masks):
+    """Days per status in ``masks``, keyed like ``STATUS_MASKS``."""
+    return {status: masks[column].bit_count() for status, column in STATUS_MASKS.items()}
+
+
+def expand(masks, year, month, reverse=False):
+    """Yield ``(date, status)`` for every recorded day of the month, in date
+    order (newest first with ``reverse``)."""
+    recorded = 0
+    for column in STATUS_MASKS.values():
+        recorded |= masks[column]
+    days = range(recorded.bit_length(), 0, -1) if reverse else range(1, recorded.bit_length() + 1)
+    for day_number in days:
+        if recorded & (1 << (day_number - 1)):
+            day = date(year, month, day_number)
+            yield day, status_on(masks, day)
+
+
+def unpack_ids(packed):
+    """The per-day ids in ``packed``, a list indexed by ``day - 1``."""
+    return list(DAY_IDS.unpack(packed)) if packed else [0] * 31
+
+
+def pack_ids(ids):
+    return DAY_IDS.pack(*ids)
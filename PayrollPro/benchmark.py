@@ -0,0 +1,364 @@
+"""Endpoint benchmark for the payroll API.
+
+Seeds a database with synthetic data, drives every API route through the
+Flask test client and records latency percentiles, SQL statements per request
+and peak Python memory per route. ``--base-url`` drives a running server over
+HTTP instead; only latency is measured then. Every run also measures startup:
+the time a fresh interpreter takes to import ``app`` and to build the app with
+``create_app``, and which heavy libraries the import pulls in.
+
+    python benchmark.py --employees 500 --years 2 --save benchmark_baseline.json
+    python benchmark.py --employees 500 --years 2 --baseline benchmark_baseline.json
+
+The second run exits with status 1 if any route got slower, allocates more or
+issues more statements than in the baseline, or if startup got slower or
+started importing a heavy library. ``--database-url`` defaults to a
+fresh SQLite file; point it at a scratch PostgreSQL database to measure the
+production dialect. The benchmark writes to the database, so never point it
+at real data.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', help='Database to seed and benchmark (default: a new SQLite file).')
+    parser.add_argument('--base-url', help='Benchmark a running server, e.g. http://localhost:5000.')
+    parser.add_argument('--employees', type=int, default=200, help='Employees to seed (default: 200).')
+    parser.add_argument('--years', type=int, default=1, help='Years of history to seed (default: 1).')
+    parser.add_argument('--no-seed', action='store_true', help='Use the data already in the database.')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per route (default: 20).')
+    parser.add_argument('--routes', help='Comma-separated route names to run (default: all).')
+    parser.add_argument('--save', metavar='PATH', help='Write the results as a JSON baseline.')
+    parser.add_argument('--baseline', metavar='PATH', help='Compare against a saved baseline.')
+    parser.add_argument('--startup-runs', type=int, default=5,
+                        help='Fresh interpreters to time the import in (default: 5).')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative slowdown or memory growth (default: 0.25).')
+    return parser.parse_args()
+
+
+def scenarios(month, year, employee_id, employee_username):
+    """``(name, role, method, path, body)`` for every API route. ``body`` may
+    be a function of the iteration number, for writes that must differ on
+    each request."""
+    period = f'month={month}&year={year}'
+    today = datetime.now().date()
+    # A delta sync token from a minute ago, in the API's cursor encoding.
+    since = base64.urlsafe_b64encode(
+        json.dumps([(datetime.utcnow() - timedelta(minutes=1)).isoformat()]).encode()
+    ).decode().rstrip('=')
+    return [
+        ('login', None, 'POST', '/login', {'username': employee_username, 'password': 'password'}),
+        ('employees_list', 'admin', 'GET', '/api/admin/employees', None),
+        ('employees_page', 'admin', 'GET', '/api/admin/employees?limit=100', None),
+        ('employees_stream', 'admin', 'GET', '/api/admin/employees?stream=1', None),
+        ('employees_changes', 'admin', 'GET', f'/api/admin/employees?since={since}', None),
+        ('employee_detail', 'admin', 'GET', f'/api/admin/employees/{employee_id}', None),
+        ('employee_update', 'admin', 'PUT', f'/api/admin/employees/{employee_id}', {'phone': '9000000000'}),
+        ('employees_bulk', 'admin', 'POST', '/api/admin/employees/bulk', lambda i: [
+            {'name': f'Bench {i}-{n}', 'email': f'bench.{time.time_ns()}.{n}@example.com',
+             'department': 'Engineering', 'designation': 'Software Engineer',
+             'date_of_joining': today.isoformat(), 'basic_salary': 30000}
+            for n in range(10)
+        ]),
+        ('attendance_list', 'admin', 'GET', f'/api/admin/attendance?{period}', None),
+        ('attendance_page', 'admin', 'GET', f'/api/admin/attendance?{period}&limit=100', None),
+        ('attendance_employee', 'admin', 'GET', f'/api/admin/attendance?employee_id={employee_id}', None),
+        ('attendance_changes', 'admin', 'GET', f'/api/admin/attendance?since={since}', None),
+        ('attendance_mark', 'admin', 'POST', '/api/admin/attendance',
+         {'employee_id': employee_id, 'date': today.isoformat(), 'status': 'present'}),
+        ('attendance_bulk', 'admin', 'POST', '/api/admin/attendance/bulk', lambda i: [
+            {'employee_id': employee_id + n, 'date': today.isoformat(), 'status': ('present', 'absent')[i % 2]}
+            for n in range(100)
+        ]),
+        ('leaves_list', 'admin', 'GET', '/api/admin/leaves?status=approved', None),
+        ('leaves_changes', 'admin', 'GET', f'/api/admin/leaves?since={since}', None),
+        ('leaves_bulk', 'admin', 'PUT', '/api/admin/leaves/bulk',
+         lambda i: {'leave_ids': list(range(1, 51)), 'status': ('approved', 'rejected')[i % 2]}),
+        ('payroll_list', 'admin', 'GET', f'/api/admin/payroll?{period}', None),
+        ('payroll_page', 'admin', 'GET', f'/api/admin/payroll?{period}&limit=100', None),
+        ('payroll_changes', 'admin', 'GET', f'/api/admin/payroll?{period}&since={since}', None),
+        ('payroll_process', 'admin', 'POST', '/api/admin/payroll/process',
+         {'month': today.month, 'year': today.year}),
+        ('payroll_recompute', 'admin', 'POST', '/api/admin/payroll/recompute', {}),
+        ('payroll_simulate', 'admin', 'POST', '/api/admin/payroll/simulate', {'scenarios': [
+            {'name': f'{percent}% raise', 'rules': [
+                {'type': 'raise', 'percent': percent, 'components': ['basic_salary', 'hra', 'da']},
+                {'type': 'rate', 'percent_of_basic': {'pf_deduction': 12}},
+            ]} for percent in range(100)
+        ], 'group_by': 'department'}),
+        ('payroll_export_csv', 'admin', 'GET', f'/api/admin/payroll/export?{period}&format=csv', None),
+        ('payroll_export_zip', 'admin', 'GET', f'/api/admin/payroll/export?{period}&format=zip', None),
+        ('reports_summary', 'admin', 'GET', f'/api/admin/reports/summary?{period}', None),
+        ('reports_attendance', 'admin', 'GET', f'/api/admin/reports/attendance?{period}', None),
+        ('analytics_payroll', 'admin', 'GET',
+         f'/api/admin/analytics/payroll?start={year - 2}-{month:02d}&end={year}-{month:02d}', None),
+        ('cache_stats', 'admin', 'GET', '/api/admin/cache/stats', None),
+        ('employee_profile', 'employee', 'GET', '/api/employee/profile', None),
+        ('employee_payslips', 'employee', 'GET', '/api/employee/payslips', None),
+        ('employee_leaves', 'employee', 'GET', '/api/employee/leaves', None),
+        ('employee_leave_apply', 'employee', 'POST', '/api/employee/leaves',
+         {'leave_type': 'casual', 'start_date': today.isoformat(), 'end_date': today.isoformat()}),
+        ('employee_attendance', 'employee', 'GET', f'/api/employee/attendance?{period}', None),
+    ]
+
+
+class TestClientDriver:
+    """Runs requests in-process, counting the SQL statements each one issues."""
+
+    def __init__(self, app, db, credentials):
+        self.statements = 0
+        self.clients = {None: app.test_client()}
+        for role, (username, password) in credentials.items():
+            client = app.test_client()
+            response = client.post('/login', json={'username': username, 'password': password})
+            if response.status_code != 200:
+                sys.exit(f'Could not log in as {username}')
+            self.clients[role] = client
+        from sqlalchemy import event
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self.count_statement)
+
+    def count_statement(self, *args):
+        self.statements += 1
+
+    def request(self, role, method, path, body):
+        response = self.clients[role].open(path, method=method, json=body)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+
+class HTTPDriver:
+    """Runs requests against a live server; statement counts are unknown."""
+    statements = None
+
+    def __init__(self, base_url, credentials):
+        self.base_url = base_url.rstrip('/')
+        self.openers = {None: build_opener()}
+        for role, (username, password) in credentials.items():
+            self.openers[role] = build_opener(HTTPCookieProcessor(CookieJar()))
+            if self.request(role, 'POST', '/login', {'username': username, 'password': password}) != 200:
+                sys.exit(f'Could not log in as {username}')
+
+    def request(self, role, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = Request(self.base_url + path, data=data, method=method,
+                      headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with self.openers[role].open(req) as response:
+                response.read()
+                return response.status
+        except HTTPError as e:
+            return e.code
+
+
+def run_route(driver, route, iterations, measure_memory):
+    name, role, method, path, body = route
+    latencies, statements, statuses = [], [], set()
+    for i in range(iterations):
+        payload = body(i) if callable(body) else body
+        before = driver.statements
+        started = time.perf_counter()
+        statuses.add(driver.request(role, method, path, payload))
+        latencies.append((time.perf_counter() - started) * 1000)
+        if before is not None:
+            statements.append(driver.statements - before)
+
+    peak_kb = None
+    if measure_memory:
+        payload = body(iterations) if callable(body) else body
+        tracemalloc.start()
+        driver.request(role, method, path, payload)
+        peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': iterations,
+        'status': sorted(statuses),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'p50_ms': round(quantiles[49], 2),
+        'p95_ms': round(quantiles[94], 2),
+        'p99_ms': round(quantiles[98], 2),
+        'max_ms': round(max(latencies), 2),
+        'statements': int(statistics.median(statements)) if statements else None,
+        'peak_kb': peak_kb,
+    }
+
+
+HEAVY_MODULES = {'numpy', 'pandas', 'pyarrow'}
+
+STARTUP_SCRIPT = f"""
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'modules': len(sys.modules),
+    'heavy_modules': sorted(set(sys.modules) & set({sorted(HEAVY_MODULES)!r})),
+}}))
+"""
+
+
+def measure_startup(runs):
+    """Median import and ``create_app`` times over ``runs`` fresh
+    interpreters, after one untimed run that leaves the bytecode cache warm."""
+    env = dict(os.environ)
+    # Building the app does not connect, so any URL will do.
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    samples = []
+    for _ in range(runs + 1):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT], cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.splitlines()[-1]))
+    samples = samples[1:]
+    return {
+        'runs': runs,
+        'import_ms': round(statistics.median(sample['import_ms'] for sample in samples), 1),
+        'create_app_ms': round(statistics.median(sample['create_app_ms'] for sample in samples), 1),
+        'modules': samples[-1]['modules'],
+        'heavy_modules': samples[-1]['heavy_modules'],
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a description of every route that regressed against ``baseline``."""
+    regressions = []
+    for name, current in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if not before:
+            continue
+        for metric in ('p95_ms', 'peak_kb'):
+            if before.get(metric) and current.get(metric) is not None \
+                    and current[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {before[metric]} -> {current[metric]}')
+        if before.get('statements') is not None and current.get('statements') is not None \
+                and current['statements'] > before['statements']:
+            regressions.append(f"{name}: statements {before['statements']} -> {current['statements']}")
+    before, current = baseline.get('startup'), results.get('startup')
+    if before and current:
+        # create_app takes a few milliseconds, too little to compare reliably.
+        if current['import_ms'] > before['import_ms'] * (1 + tolerance):
+            regressions.append(f"startup: import_ms {before['import_ms']} -> {current['import_ms']}")
+        added = sorted(set(current['heavy_modules']) - set(before['heavy_modules']))
+        if added:
+            regressions.append(f"startup: now imports {', '.join(added)}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    scratch = tempfile.mkdtemp(prefix='payroll-bench-')
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    elif not args.base_url:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    # Snapshots of the benchmark's data never belong next to real ones.
+    os.environ.setdefault('ANALYTICS_DIR', os.path.join(scratch, 'analytics'))
+    os.environ.setdefault('ARCHIVE_DIR', os.path.join(scratch, 'archive'))
+    # Run payroll jobs and payslip rendering inline so a process request
+    # measures the whole run.
+    os.environ.setdefault('PAYROLL_WORKERS', '0')
+    os.environ.setdefault('PAYSLIP_WORKERS', '0')
+
+    startup = measure_startup(args.startup_runs)
+    print(f"startup: import {startup['import_ms']} ms, create_app {startup['create_app_ms']} ms, "
+          f"{startup['modules']} modules, heavy: {', '.join(startup['heavy_modules']) or 'none'}")
+
+    from app import Employee, User, create_app, db, seed_synthetic_data
+    from migrations import upgrade
+
+    app = create_app()
+
+    with app.app_context():
+        upgrade(db.engine, db.metadata)
+        app.test_client().post('/api/init-db')
+        if not args.no_seed:
+            started = time.perf_counter()
+            counts = seed_synthetic_data(args.employees, args.years)
+            print(f'Seeded {counts} in {time.perf_counter() - started:.1f}s')
+        user = db.session.execute(
+            db.select(User.username, User.employee_id).filter(User.role == 'employee').order_by(User.id)
+        ).first()
+        if user is None:
+            sys.exit('No employee logins in the database; run without --no-seed')
+        dialect = db.engine.dialect.name
+        employee_count = db.session.execute(db.select(db.func.count(Employee.id))).scalar()
+
+    now = datetime.now()
+    month, year = (12, now.year - 1) if now.month == 1 else (now.month - 1, now.year)
+    credentials = {'admin': ('admin', 'admin123'), 'employee': (user.username, 'password')}
+    if args.base_url:
+        driver = HTTPDriver(args.base_url, credentials)
+    else:
+        driver = TestClientDriver(app, db, credentials)
+
+    routes = scenarios(month, year, user.employee_id, user.username)
+    if args.routes:
+        wanted = set(args.routes.split(','))
+        routes = [route for route in routes if route[0] in wanted]
+
+    results = {
+        'meta': {
+            'created_at': now.isoformat(timespec='seconds'),
+            'dialect': dialect,
+            'mode': 'http' if args.base_url else 'test_client',
+            'employees': employee_count,
+            'requests_per_route': args.requests,
+            'python': platform.python_version(),
+        },
+        'startup': startup,
+        'routes': {},
+    }
+    print(f"{'route':<24}{'status':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql':>6}{'peak KB':>10}")
+    for route in routes:
+        stats = run_route(driver, route, args.requests, measure_memory=not args.base_url)
+        results['routes'][route[0]] = stats
+        print(f"{route[0]:<24}{','.join(map(str, stats['status'])):>10}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['statements'] if stats['statements'] is not None else '-':>6}"
+              f"{stats['peak_kb'] if stats['peak_kb'] is not None else '-':>10}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Saved baseline to {args.save}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ('dialect', 'mode', 'employees'):
+            if baseline['meta'].get(key) != results['meta'][key]:
+                print(f"warning: baseline {key} is {baseline['meta'].get(key)!r}, this run {results['meta'][key]!r}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions against baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Bounded in-process LRU cache with per-entry expiry.
+
+The cache lives in each worker process, so an invalidation only reaches the
+process that made the write; ``ttl`` bounds how long another worker can keep
+serving its own copy.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped on every invalidation; see ``set``.
+        self.generation = 0
+        self.invalidated_at = float('-inf')
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None, counting the lookup."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, generation=None, settle=0):
+        """Store ``value`` under ``key``, evicting the least recently used
+        entries beyond ``maxsize``.
+
+        Pass the ``generation`` read before loading ``value``: if anything was
+        invalidated in the meantime the value may predate that write, so it is
+        not stored. Likewise nothing is stored within ``settle`` seconds of
+        the last invalidation."""
+        with self._lock:
+            if self.maxsize <= 0 or (generation is not None and generation != self.generation):
+                return
+            if settle and time.monotonic() - self.invalidated_at < settle:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        with self._lock:
+            self.generation += 1
+            self.invalidated_at = time.monotonic()
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.invalidated_at = time.monotonic()
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
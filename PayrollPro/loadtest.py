@@ -0,0 +1,269 @@
+"""Concurrency load test of the employee self-service reads.
+
+Seeds a database, starts the app twice, once through the sync Flask server
+(what ``python app.py`` runs) and once through the ASGI entry point
+(``uvicorn asgi:application``), and drives both with the same number of
+concurrent logged-in employees fetching their payslips and attendance. For
+each concurrency level it reports throughput, latency percentiles and errors.
+
+    python loadtest.py --employees 500 --concurrency 50,200,1000 --duration 10
+
+``--database-url`` defaults to a fresh SQLite file; point it at a scratch
+PostgreSQL database to measure the production driver. The employee response
+cache is turned off so every request reaches the database, unless ``--cache``
+is given. ``--sync-command`` and ``--async-command`` replace the servers, e.g.
+``--sync-command "gunicorn -w 4 -b 127.0.0.1:{port} 'app:create_app()'"``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+SYNC_COMMAND = '{python} -m flask --app app run --host 127.0.0.1 --port {port} --with-threads'
+ASYNC_COMMAND = '{python} -m uvicorn asgi:application --host 127.0.0.1 --port {port} --log-level warning --no-access-log'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', help='Database to seed and serve (default: a new SQLite file).')
+    parser.add_argument('--employees', type=int, default=200, help='Employees to seed (default: 200).')
+    parser.add_argument('--years', type=int, default=1, help='Years of history to seed (default: 1).')
+    parser.add_argument('--no-seed', action='store_true', help='Use the data already in the database.')
+    parser.add_argument('--concurrency', default='50,200,1000',
+                        help='Comma-separated numbers of concurrent clients (default: 50,200,1000).')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per level (default: 10).')
+    parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as failed.')
+    parser.add_argument('--cache', action='store_true', help='Keep the employee response cache on.')
+    parser.add_argument('--port', type=int, default=5100, help='First of the two ports to serve on (default: 5100).')
+    parser.add_argument('--sync-command', default=SYNC_COMMAND, help='Sync server command; {port} is filled in.')
+    parser.add_argument('--async-command', default=ASYNC_COMMAND, help='Async server command; {port} is filled in.')
+    parser.add_argument('--save', metavar='PATH', help='Write the results as JSON.')
+    return parser.parse_args()
+
+
+def employee_sessions(app, db, Employee, User, count):
+    """Session cookies for ``count`` employee logins, signed like the ones
+    ``/login`` hands out, so the test does not spend its time hashing
+    passwords."""
+    serializer = app.session_interface.get_signing_serializer(app)
+    users = db.session.execute(
+        db.select(User.id, User.username, User.employee_id)
+        .join(Employee, Employee.id == User.employee_id)
+        .filter(User.role == 'employee', Employee.is_active.is_(True))
+        .order_by(User.id).limit(count)
+    ).all()
+    return [
+        f"{app.config['SESSION_COOKIE_NAME']}=" + serializer.dumps({
+            'user_id': user.id, 'username': user.username, 'role': 'employee', 'employee_id': user.employee_id
+        })
+        for user in users
+    ]
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 client connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def get(self, path, cookie):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write((
+            f'GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nCookie: {cookie}\r\n'
+            'Connection: keep-alive\r\n\r\n'
+        ).encode('latin1'))
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by server')
+        version, status = status_line.decode('latin1').split(' ', 2)[:2]
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.read()
+            self.close()
+        if version == 'HTTP/1.0' or headers.get('connection', '').lower() == 'close':
+            self.close()
+        return int(status)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def run_level(port, paths, cookies, concurrency, duration, timeout):
+    """Run ``concurrency`` clients for ``duration`` seconds, each issuing one
+    request after another over its own connection."""
+    latencies = []
+    errors = 0
+    in_flight = peak = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(number):
+        nonlocal errors, in_flight, peak
+        connection = Connection('127.0.0.1', port)
+        request_no = number
+        while time.perf_counter() < deadline:
+            path = paths[request_no % len(paths)]
+            cookie = cookies[request_no % len(cookies)]
+            request_no += concurrency
+            started = time.perf_counter()
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                status = await asyncio.wait_for(connection.get(path, cookie), timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                connection.close()
+                status = None
+            finally:
+                in_flight -= 1
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+        connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed, concurrency, peak)
+
+
+def summarize(latencies, errors, elapsed, concurrency, peak):
+    def percentile(p):
+        if not latencies:
+            return None
+        if len(latencies) == 1:
+            return round(latencies[0] * 1000, 2)
+        return round(statistics.quantiles(latencies, n=100, method='inclusive')[p - 1] * 1000, 2)
+
+    return {
+        'concurrency': concurrency,
+        'peak_in_flight': peak,
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+def start_server(command, port, env):
+    # Server output goes to a file: the dev server logs every request and
+    # would block once an unread pipe filled up.
+    log = tempfile.TemporaryFile('w+')
+    process = subprocess.Popen(
+        shlex.split(command.format(python=shlex.quote(sys.executable), port=port)),
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            sys.exit(f'Server exited during startup ({command}):\n{log.read()}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit(f'Server did not start within 60s: {command}')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def main():
+    args = parse_args()
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'loadtest.db')
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import Employee, User, create_app, db, seed_synthetic_data
+    from migrations import upgrade
+
+    app = create_app()
+
+    with app.app_context():
+        upgrade(db.engine, db.metadata)
+        app.test_client().post('/api/init-db')
+        if not args.no_seed:
+            started = time.perf_counter()
+            counts = seed_synthetic_data(args.employees, args.years)
+            print(f'Seeded {counts} in {time.perf_counter() - started:.1f}s')
+        cookies = employee_sessions(app, db, Employee, User, 1000)
+        if not cookies:
+            sys.exit('No employee logins in the database; run without --no-seed')
+        dialect = db.engine.dialect.name
+
+    now = datetime.now()
+    month, year = (12, now.year - 1) if now.month == 1 else (now.month - 1, now.year)
+    paths = ['/api/employee/payslips', f'/api/employee/attendance?month={month}&year={year}']
+    levels = [int(level) for level in args.concurrency.split(',')]
+    env = dict(os.environ, DATABASE_URL=database_url, SESSION_SECRET=app.config['SECRET_KEY'])
+    if not args.cache:
+        env['EMPLOYEE_CACHE_SIZE'] = '0'
+
+    results = {}
+    for offset, (mode, command) in enumerate([('sync', args.sync_command), ('async', args.async_command)]):
+        port = args.port + offset
+        process = start_server(command, port, env)
+        try:
+            results[mode] = [
+                asyncio.run(run_level(port, paths, cookies, level, args.duration, args.timeout))
+                for level in levels
+            ]
+        finally:
+            stop_server(process)
+
+    print(f"\n{'mode':<7}{'clients':>8}{'peak':>7}{'requests':>10}{'errors':>8}{'req/s':>9}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for index, level in enumerate(levels):
+        for mode in ('sync', 'async'):
+            r = results[mode][index]
+            print(f"{mode:<7}{level:>8}{r['peak_in_flight']:>7}{r['requests']:>10}{r['errors']:>8}"
+                  f"{r['requests_per_second']:>9}{str(r['p50_ms']):>10}{str(r['p95_ms']):>10}"
+                  f"{str(r['p99_ms']):>10}{str(r['max_ms']):>10}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'dialect': dialect, 'employees': len(cookies), 'paths': paths, 'duration': args.duration,
+                'cache': args.cache, 'results': results,
+            }, f, indent=2)
+        print(f'Saved results to {args.save}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""Versioned schema migrations.
+
+Each migration is a function registered with ``@migration(version, description)``
+that receives a connection and the application's metadata. ``upgrade`` runs
+every migration newer than the version recorded in ``schema_migrations`` in
+order, each in its own transaction.
+
+Migration 1 creates any missing table straight from the current models, so a
+fresh database already has every later change. Later migrations therefore have
+to be safe to run against a schema that already contains them (use
+``checkfirst`` and the inspector rather than bare DDL).
+"""
+from datetime import date, datetime
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, bindparam, case, func, inspect, select, text
+)
+
+from attendance_bitmap import expand, pack_ids
+
+MIGRATIONS = []
+
+version_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def current_version(connection):
+    schema_migrations.create(connection, checkfirst=True)
+    versions = connection.execute(select(schema_migrations.c.version)).scalars().all()
+    return max(versions, default=0)
+
+
+def upgrade(engine, metadata, target=None):
+    """Apply pending migrations up to ``target`` (default: latest).
+    Returns the list of versions applied."""
+    applied = []
+    with engine.begin() as connection:
+        version = current_version(connection)
+    for number, description, fn in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        with engine.begin() as connection:
+            fn(connection, metadata)
+            connection.execute(schema_migrations.insert().values(
+                version=number, description=description, applied_at=datetime.utcnow()
+            ))
+        applied.append(number)
+    return applied
+
+
+def add_columns(connection, metadata, table_name, column_names):
+    """Add model columns missing from an existing table. New columns must be
+    nullable; scalar defaults become the column DEFAULT for existing rows."""
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    table = metadata.tables[table_name]
+    for name in column_names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f'ALTER TABLE {table_name} ADD COLUMN {name} {column.type.compile(connection.dialect)}'
+        if column.default is not None and column.default.is_scalar:
+            ddl += f' DEFAULT {column.default.arg!r}'
+        connection.execute(text(ddl))
+
+
+def rebuild_attendance_summary(connection, metadata):
+    attendance = metadata.tables['attendance']
+    summary = metadata.tables['attendance_monthly_summary']
+    year = func.extract('year', attendance.c.date)
+    month = func.extract('month', attendance.c.date)
+
+    def days(status):
+        return func.sum(case((attendance.c.status == status, 1), else_=0))
+
+    connection.execute(summary.delete())
+    connection.execute(summary.insert().from_select(
+        ['employee_id', 'year', 'month', 'present_days', 'half_days', 'absent_days', 'leave_days'],
+        select(
+            attendance.c.employee_id, year, month,
+            days('present'), days('half-day'), days('absent'), days('leave')
+        ).group_by(attendance.c.employee_id, year, month)
+    ))
+
+
+def create_indexes(connection, metadata, table_name):
+    """Create the model's indexes on ``table_name`` that are missing. Indexes
+    on columns the table does not have yet are skipped; the migration that
+    adds those columns creates them."""
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    for index in metadata.tables[table_name].indexes:
+        if all(column.name in existing for column in index.columns):
+            index.create(connection, checkfirst=True)
+
+
+def allocate_ids(connection, metadata, table_name, count, floor=0):
+    """Reserve ``count`` new ids of ``table_name`` for rows stored elsewhere,
+    such as packed attendance days, and return them in ascending order.
+
+    On PostgreSQL they come from the table's own sequence. SQLite has none,
+    so the ``id_counters`` row for the table keeps the highest id handed
+    out, which never falls below the table's largest id or ``floor``."""
+    if connection.dialect.name == 'postgresql':
+        if not count:
+            return []
+        return connection.execute(
+            text("SELECT nextval(pg_get_serial_sequence(:name, 'id')) FROM generate_series(1, :count)"),
+            {'name': table_name, 'count': count}
+        ).scalars().all()
+    counters = metadata.tables['id_counters']
+    connection.execute(counters.insert().prefix_with('OR IGNORE').values(name=table_name, value=0))
+    largest = select(func.coalesce(func.max(metadata.tables[table_name].c.id), 0)).scalar_subquery()
+    top = connection.execute(
+        counters.update().where(counters.c.name == table_name)
+        .values(value=func.max(counters.c.value, largest, floor) + count)
+        .returning(counters.c.value)
+    ).scalar_one()
+    return list(range(top - count + 1, top + 1))
+
+
+@migration(1, 'Create base tables')
+def create_base_tables(connection, metadata):
+    for name in ['employees', 'users', 'attendance', 'attendance_monthly_summary', 'leaves', 'payroll']:
+        metadata.tables[name].create(connection, checkfirst=True)
+
+
+@migration(2, 'Indexes and unique keys for attendance, payroll and leaves')
+def add_hot_path_indexes(connection, metadata):
+    # Keep the newest row for any (employee, day) recorded twice by the old
+    # check-then-insert code, then recount the rollup from what is left.
+    removed = connection.execute(text(
+        'DELETE FROM attendance WHERE id NOT IN '
+        '(SELECT MAX(id) FROM attendance GROUP BY employee_id, date)'
+    )).rowcount
+    summary = metadata.tables['attendance_monthly_summary']
+    if removed or connection.execute(select(func.count()).select_from(summary)).scalar() == 0:
+        rebuild_attendance_summary(connection, metadata)
+
+    duplicates = connection.execute(text(
+        'SELECT employee_id, month, year FROM payroll '
+        'GROUP BY employee_id, month, year HAVING COUNT(*) > 1'
+    )).all()
+    if duplicates:
+        raise RuntimeError(
+            'Duplicate payroll rows must be resolved before migrating: '
+            + ', '.join(f'employee {e} {m}/{y}' for e, m, y in duplicates)
+        )
+
+    for name in ['attendance', 'attendance_monthly_summary', 'leaves', 'payroll']:
+        create_indexes(connection, metadata, name)
+
+
+@migration(3, 'Payroll summary cache')
+def create_payroll_summary_cache(connection, metadata):
+    metadata.tables['payroll_summary_cache'].create(connection, checkfirst=True)
+
+
+@migration(4, 'Payroll jobs and shards')
+def create_payroll_jobs(connection, metadata):
+    metadata.tables['payroll_jobs'].create(connection, checkfirst=True)
+    metadata.tables['payroll_job_shards'].create(connection, checkfirst=True)
+
+
+@migration(5, 'Payroll shard checkpoints')
+def add_shard_checkpoints(connection, metadata):
+    add_columns(connection, metadata, 'payroll_job_shards',
+                ['chunks_done', 'checkpoint_employee_id', 'failed_employee_ids'])
+
+
+@migration(6, 'Payroll dirty tracking')
+def create_payroll_dirty(connection, metadata):
+    metadata.tables['payroll_dirty'].create(connection, checkfirst=True)
+
+
+@migration(7, 'Packed attendance tables')
+def create_attendance_months(connection, metadata):
+    for name in ['attendance_months', 'attendance_remarks']:
+        metadata.tables[name].create(connection, checkfirst=True)
+        create_indexes(connection, metadata, name)
+
+
+# Yearly range partitions (PostgreSQL only). Each table has one partition per
+# year named ``<table>_y<year>`` plus ``<table>_default`` for anything else.
+PARTITION_KEYS = {'attendance': 'date', 'payroll': 'year'}
+
+
+def is_partitioned(connection, table_name):
+    if connection.dialect.name != 'postgresql':
+        return False
+    relkind = connection.execute(
+        text('SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)'), {'name': table_name}
+    ).scalar()
+    return relkind == 'p'
+
+
+def partition_bounds(table_name, year):
+    if PARTITION_KEYS[table_name] == 'date':
+        return f"'{year}-01-01'", f"'{year + 1}-01-01'"
+    return str(year), str(year + 1)
+
+
+def create_year_partition(connection, table_name, year):
+    """Attach the partition of ``table_name`` for ``year`` if it is missing,
+    moving that year's rows out of the default partition first. Returns
+    whether a partition was created."""
+    name = f'{table_name}_y{year}'
+    if connection.execute(text('SELECT to_regclass(:name)'), {'name': name}).scalar():
+        return False
+    key = PARTITION_KEYS[table_name]
+    lower, upper = partition_bounds(table_name, year)
+    connection.execute(text(f'CREATE TABLE {name} (LIKE {table_name} INCLUDING DEFAULTS)'))
+    connection.execute(text(
+        f'WITH moved AS (DELETE FROM {table_name}_default WHERE "{key}" >= {lower} AND "{key}" < {upper} '
+        f'RETURNING *) INSERT INTO {name} SELECT * FROM moved'
+    ))
+    connection.execute(text(f'ALTER TABLE {table_name} ATTACH PARTITION {name} FOR VALUES FROM ({lower}) TO ({upper})'))
+    return True
+
+
+def detach_year_partition(connection, table_name, year, drop=False):
+    """Detach the ``year`` partition of ``table_name`` and, with ``drop``,
+    drop it. Returns whether there was one."""
+    name = f'{table_name}_y{year}'
+    if not connection.execute(text('SELECT to_regclass(:name)'), {'name': name}).scalar():
+        return False
+    connection.execute(text(f'ALTER TABLE {table_name} DETACH PARTITION {name}'))
+    if drop:
+        connection.execute(text(f'DROP TABLE {name}'))
+    return True
+
+
+def partition_by_year(connection, metadata, table_name):
+    """Rebuild ``table_name`` as a table range-partitioned by year and copy
+    its rows across. The primary key becomes ``(id, <partition key>)``, as
+    PostgreSQL requires; ``id`` keeps its sequence."""
+    key = PARTITION_KEYS[table_name]
+    old = f'{table_name}_unpartitioned'
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence(:name, 'id')"), {'name': table_name}).scalar()
+    if sequence:
+        connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY NONE'))
+    connection.execute(text(f'ALTER TABLE {table_name} RENAME TO {old}'))
+    connection.execute(text(f'ALTER TABLE {old} DROP CONSTRAINT IF EXISTS {table_name}_pkey'))
+    for index in metadata.tables[table_name].indexes:
+        connection.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+
+    connection.execute(text(f'CREATE TABLE {table_name} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE ("{key}")'))
+    connection.execute(text(f'ALTER TABLE {table_name} ADD PRIMARY KEY (id, "{key}")'))
+    connection.execute(text(f'ALTER TABLE {table_name} ADD FOREIGN KEY (employee_id) REFERENCES employees (id)'))
+    connection.execute(text(f'CREATE TABLE {table_name}_default PARTITION OF {table_name} DEFAULT'))
+
+    year = f'EXTRACT(YEAR FROM "{key}")' if key == 'date' else f'"{key}"'
+    first, last = connection.execute(text(f'SELECT MIN({year}), MAX({year}) FROM {old}')).one()
+    this_year = date.today().year
+    for partition_year in range(int(first or this_year), max(int(last or this_year), this_year) + 2):
+        create_year_partition(connection, table_name, partition_year)
+
+    connection.execute(text(f'INSERT INTO {table_name} SELECT * FROM {old}'))
+    connection.execute(text(f'DROP TABLE {old}'))
+    if sequence:
+        connection.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {table_name}.id'))
+    create_indexes(connection, metadata, table_name)
+
+
+@migration(8, 'Yearly partitions for attendance and payroll, archive registry')
+def partition_history(connection, metadata):
+    metadata.tables['archived_years'].create(connection, checkfirst=True)
+    if connection.dialect.name != 'postgresql':
+        return
+    for table_name in PARTITION_KEYS:
+        if not is_partitioned(connection, table_name):
+            partition_by_year(connection, metadata, table_name)
+
+
+@migration(9, 'Payroll analytics snapshots')
+def create_payroll_snapshots(connection, metadata):
+    metadata.tables['payroll_snapshots'].create(connection, checkfirst=True)
+
+
+@migration(10, 'Change tracking for delta sync')
+def add_updated_at(connection, metadata):
+    # Existing rows count as changed when they were created.
+    now = datetime.utcnow()
+    for name, changed in [('employees', 'created_at'), ('attendance', 'created_at'), ('leaves', 'applied_at'),
+                          ('payroll', 'created_at'), ('attendance_months', None)]:
+        add_columns(connection, metadata, name, ['updated_at'])
+        table = metadata.tables[name]
+        connection.execute(
+            table.update().where(table.c.updated_at.is_(None))
+            .values(updated_at=func.coalesce(table.c[changed], now) if changed else now)
+        )
+        create_indexes(connection, metadata, name)
+
+
+@migration(11, 'Pre-rendered payslip documents')
+def create_payslip_documents(connection, metadata):
+    metadata.tables['payslip_documents'].create(connection, checkfirst=True)
+
+
+@migration(12, 'Payroll shard progress and heartbeats')
+def add_shard_heartbeats(connection, metadata):
+    add_columns(connection, metadata, 'payroll_job_shards', ['employees_done', 'heartbeat_at'])
+
+
+@migration(13, 'Attendance ids for packed days')
+def add_packed_day_ids(connection, metadata):
+    # Packed days take the id of their attendance row when it is still there
+    # and a new one from the attendance ids otherwise.
+    metadata.tables['id_counters'].create(connection, checkfirst=True)
+    add_columns(connection, metadata, 'attendance_months', ['day_ids'])
+
+    months = metadata.tables['attendance_months']
+    attendance = metadata.tables['attendance']
+    employee_ids = connection.execute(
+        select(months.c.employee_id).distinct().where(months.c.day_ids.is_(None))
+    ).scalars().all()
+    for employee_id in employee_ids:
+        row_ids = dict(connection.execute(
+            select(attendance.c.date, attendance.c.id).where(attendance.c.employee_id == employee_id)
+        ).all())
+        packed = connection.execute(
+            select(months).where(months.c.employee_id == employee_id, months.c.day_ids.is_(None))
+            .order_by(months.c.year, months.c.month)
+        ).all()
+        updates = []
+        missing = []
+        for row in packed:
+            ids = [0] * 31
+            for day, _ in expand(row._asdict(), row.year, row.month):
+                ids[day.day - 1] = row_ids.get(day, 0)
+                if not ids[day.day - 1]:
+                    missing.append((ids, day.day - 1))
+            updates.append((row, ids))
+        for (ids, index), new_id in zip(missing, allocate_ids(connection, metadata, 'attendance', len(missing))):
+            ids[index] = new_id
+        connection.execute(
+            months.update().where(
+                months.c.employee_id == employee_id,
+                months.c.year == bindparam('p_year'),
+                months.c.month == bindparam('p_month')
+            ).values(day_ids=bindparam('p_day_ids')),
+            [{'p_year': row.year, 'p_month': row.month, 'p_day_ids': pack_ids(ids)} for row, ids in updates]
+        )
+
+
+def sequential_scans(connection, stmt):
+    """Return the plan lines of ``stmt`` that read a whole table instead of
+    going through an index."""
+    compiled = stmt.compile(dialect=connection.dialect)
+    if connection.dialect.name == 'postgresql':
+        # Small seeded tables make a sequential scan the cheapest plan, so
+        # forbid it to check that an index can serve the query at all.
+        connection.execute(text('SET LOCAL enable_seqscan = off'))
+        plan = connection.exec_driver_sql('EXPLAIN ' + str(compiled), compiled.params).scalars().all()
+        return [line.strip() for line in plan if 'Seq Scan' in line]
+    plan = connection.exec_driver_sql(
+        'EXPLAIN QUERY PLAN ' + str(compiled), tuple(compiled.params[name] for name in compiled.positiontup)
+    ).all()
+    return [row[-1] for row in plan if row[-1].startswith('SCAN') and ' USING ' not in row[-1]]
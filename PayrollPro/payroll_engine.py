@@ -0,0 +1,251 @@
+"""Vectorized payroll calculations.
+
+The functions here work on whole cohorts of employees at once. They take and
+return pandas DataFrames and never touch the database, so the same math can be
+used by the HTTP handlers, batch jobs and simulations. numpy and pandas are
+imported by the functions that use them, so importing the module is cheap.
+"""
+from datetime import date
+
+SALARY_COMPONENTS = ['basic_salary', 'hra', 'da', 'ta', 'other_allowances']
+DEDUCTION_COMPONENTS = ['pf_deduction', 'tax_deduction', 'other_deductions']
+
+
+def month_dates(month, year):
+    """Return the first day of the month and the first day of the next one."""
+    start_date = date(year, month, 1)
+    if month == 12:
+        end_date = date(year + 1, 1, 1)
+    else:
+        end_date = date(year, month + 1, 1)
+    return start_date, end_date
+
+
+def working_days_in_month(month, year):
+    start_date, end_date = month_dates(month, year)
+    return (end_date - start_date).days
+
+
+def compute_payroll(employees, working_days):
+    """Calculate payroll columns for every employee in ``employees``.
+
+    ``employees`` needs an ``employee_id`` column, the salary and deduction
+    components and the ``present_days``/``absent_days`` counts for the month.
+    The additions are done in the same order as the per-employee formula so
+    the floating point results are identical.
+    """
+    frame = employees.copy()
+    for column in SALARY_COMPONENTS + DEDUCTION_COMPONENTS:
+        frame[column] = frame[column].fillna(0).astype(float)
+    for column in ['present_days', 'absent_days']:
+        frame[column] = frame[column].fillna(0).astype(int)
+
+    gross_salary, total_deductions, absence_deduction, net_salary = payroll_amounts(
+        frame, frame['absent_days'], working_days
+    )
+    frame['gross_salary'] = gross_salary
+    frame['other_deductions'] = frame['other_deductions'] + absence_deduction
+    frame['total_deductions'] = total_deductions
+    frame['net_salary'] = net_salary
+    frame['working_days'] = working_days
+    return frame
+
+
+def payroll_amounts(components, absent_days, working_days):
+    """The payroll formula. ``components`` maps each salary and deduction
+    component to a Series or array; everything is elementwise.
+
+    Returns ``(gross_salary, total_deductions, absence_deduction,
+    net_salary)``, where ``total_deductions`` includes the absence deduction.
+    """
+    gross_salary = (
+        components['basic_salary'] +
+        components['hra'] +
+        components['da'] +
+        components['ta'] +
+        components['other_allowances']
+    )
+
+    total_deductions = (
+        components['pf_deduction'] +
+        components['tax_deduction'] +
+        components['other_deductions']
+    )
+
+    # Adjust for absences
+    per_day_salary = gross_salary / working_days
+    absence_deduction = per_day_salary * absent_days
+
+    net_salary = gross_salary - total_deductions - absence_deduction
+    return gross_salary, total_deductions + absence_deduction, absence_deduction, net_salary
+
+
+PAYROLL_COLUMNS = [
+    'employee_id', 'basic_salary', 'hra', 'da', 'ta', 'other_allowances',
+    'gross_salary', 'pf_deduction', 'tax_deduction', 'other_deductions',
+    'total_deductions', 'net_salary', 'working_days', 'present_days',
+    'absent_days',
+]
+
+
+def payroll_records(frame, month, year, status='processed'):
+    """Turn a computed payroll frame into dicts ready for a bulk insert."""
+    records = frame[PAYROLL_COLUMNS].to_dict('records')
+    for record in records:
+        record['employee_id'] = int(record['employee_id'])
+        for column in ['working_days', 'present_days', 'absent_days']:
+            record[column] = int(record[column])
+        record['month'] = month
+        record['year'] = year
+        record['status'] = status
+    return records
+
+
+# What-if simulation. A scenario is ``{'name': ..., 'rules': [...]}`` and its
+# rules are applied in order to the matching employees:
+#   {'type': 'raise', 'percent': 5, 'components': ['basic_salary', 'hra']}
+#   {'type': 'cap', 'max': {'basic_salary': 150000}}
+#   {'type': 'rate', 'percent_of_basic': {'pf_deduction': 12}}
+# Any rule can be narrowed with 'department' and/or 'designation', each a
+# value or a list of values.
+STRUCTURE_COMPONENTS = SALARY_COMPONENTS + DEDUCTION_COMPONENTS
+SIMULATION_FILTERS = ('department', 'designation')
+
+
+def compile_rule(rule, employees):
+    """Turn one rule into ``(mask, multiplier, cap, rate)`` arrays: the
+    employees it applies to and, per component, the factor, upper bound and
+    share of basic salary (NaN when unset) to apply."""
+    import numpy as np
+    multiplier = np.ones(len(STRUCTURE_COMPONENTS))
+    cap = np.full(len(STRUCTURE_COMPONENTS), np.inf)
+    rate = np.full(len(STRUCTURE_COMPONENTS), np.nan)
+    mask = np.ones(len(employees), dtype=bool)
+    for column in SIMULATION_FILTERS:
+        if rule.get(column) is not None:
+            values = rule[column] if isinstance(rule[column], list) else [rule[column]]
+            mask &= employees[column].isin(values).to_numpy()
+
+    kind = rule.get('type')
+    if kind == 'raise':
+        components = rule.get('components', ['basic_salary'])
+        unknown = set(components) - set(SALARY_COMPONENTS)
+        if unknown:
+            raise ValueError(f'raise applies to salary components, not {sorted(unknown)}')
+        for component in components:
+            multiplier[STRUCTURE_COMPONENTS.index(component)] = 1 + float(rule['percent']) / 100
+    elif kind == 'cap':
+        for component, maximum in rule['max'].items():
+            if component not in STRUCTURE_COMPONENTS:
+                raise ValueError(f'Unknown component: {component!r}')
+            cap[STRUCTURE_COMPONENTS.index(component)] = float(maximum)
+    elif kind == 'rate':
+        for component, percent in rule['percent_of_basic'].items():
+            if component not in DEDUCTION_COMPONENTS:
+                raise ValueError(f'rate applies to deductions, not {component!r}')
+            rate[STRUCTURE_COMPONENTS.index(component)] = float(percent) / 100
+    else:
+        raise ValueError(f'Unknown rule type: {kind!r}')
+    return mask, multiplier, cap, rate
+
+
+def compile_scenarios(scenarios, employees):
+    """Validate ``scenarios`` and compile their rules. Raises ValueError
+    naming the first bad scenario."""
+    compiled = []
+    for index, scenario in enumerate(scenarios):
+        try:
+            compiled.append([compile_rule(rule, employees) for rule in scenario.get('rules', [])])
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f'Scenario {index}: {e}') from e
+    return compiled
+
+
+def apply_rules(structure, compiled):
+    """Apply each scenario's rules to a copy of ``structure`` (employees x
+    components). Returns an array of scenarios x employees x components.
+
+    Rule ``k`` of every scenario is applied in the same array operation, so
+    the Python loop runs once per rule position rather than per scenario and
+    employee."""
+    import numpy as np
+    values = np.repeat(structure[np.newaxis], len(compiled), axis=0)
+    basic = STRUCTURE_COMPONENTS.index('basic_salary')
+    for position in range(max(map(len, compiled), default=0)):
+        mask = np.zeros(values.shape[:2], dtype=bool)
+        multiplier = np.ones((len(compiled), values.shape[2]))
+        cap = np.full((len(compiled), values.shape[2]), np.inf)
+        rate = np.full((len(compiled), values.shape[2]), np.nan)
+        for index, rules in enumerate(compiled):
+            if position < len(rules):
+                mask[index], multiplier[index], cap[index], rate[index] = rules[position]
+        updated = np.minimum(values * multiplier[:, np.newaxis], cap[:, np.newaxis])
+        rated = ~np.isnan(rate)
+        if rated.any():
+            updated = np.where(
+                rated[:, np.newaxis], updated[:, :, [basic]] * np.nan_to_num(rate)[:, np.newaxis], updated
+            )
+        values = np.where(mask[:, :, np.newaxis], updated, values)
+    return values
+
+
+def simulate_payroll(employees, scenarios, working_days, group_by=None, max_elements=4_000_000):
+    """Evaluate salary-revision ``scenarios`` against ``employees`` (the
+    cohort ``compute_payroll`` takes, plus the ``SIMULATION_FILTERS``
+    columns) with the payroll formula, without touching the database.
+
+    Returns ``(baseline, results)``: the totals for the current structure
+    and, per scenario, its totals, the change from the baseline, how many
+    employees' net pay changes and, with ``group_by``, the change per
+    department or designation. Scenarios are evaluated ``max_elements``
+    array cells at a time to bound memory.
+    """
+    import numpy as np
+    import pandas as pd
+    structure = employees[STRUCTURE_COMPONENTS].fillna(0).astype(float).to_numpy()
+    absent_days = employees['absent_days'].fillna(0).astype(int).to_numpy()
+    compiled = compile_scenarios(scenarios, employees)
+
+    def evaluate(values):
+        return payroll_amounts(
+            {component: values[..., i] for i, component in enumerate(STRUCTURE_COMPONENTS)},
+            absent_days, working_days
+        )
+
+    base_gross, base_deductions, _, base_net = evaluate(structure)
+    baseline = {
+        'total_gross_salary': float(base_gross.sum()),
+        'total_deductions': float(base_deductions.sum()),
+        'total_net_salary': float(base_net.sum()),
+    }
+    if group_by:
+        codes, groups = pd.factorize(employees[group_by], use_na_sentinel=False)
+        membership = np.zeros((len(employees), len(groups)))
+        membership[np.arange(len(employees)), codes] = 1
+
+    results = []
+    batch_size = max(1, max_elements // max(structure.size, 1))
+    for start in range(0, len(compiled), batch_size):
+        batch = scenarios[start:start + batch_size]
+        gross, deductions, _, net = evaluate(apply_rules(structure, compiled[start:start + batch_size]))
+        totals = np.stack([gross.sum(axis=1), deductions.sum(axis=1), net.sum(axis=1)], axis=1)
+        affected = (net != base_net).sum(axis=1)
+        if group_by:
+            gross_by_group = (gross - base_gross) @ membership
+            net_by_group = (net - base_net) @ membership
+        for index, scenario in enumerate(batch):
+            result = {'name': scenario.get('name', f'Scenario {start + index + 1}')}
+            for (column, base), total in zip(baseline.items(), totals[index]):
+                result[column] = float(total)
+                result[column.replace('total_', 'delta_')] = float(total) - base
+            result['employees_affected'] = int(affected[index])
+            if group_by:
+                result[f'by_{group_by}'] = sorted((
+                    {
+                        group_by: None if pd.isna(group) else group,
+                        'delta_gross_salary': float(gross_by_group[index, n]),
+                        'delta_net_salary': float(net_by_group[index, n]),
+                    } for n, group in enumerate(groups)
+                ), key=lambda row: (row[group_by] is None, row[group_by] or ''))
+            results.append(result)
+    return baseline, results
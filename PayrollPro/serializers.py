@@ -0,0 +1,73 @@
+"""Field lists and formatting shared by the JSON endpoints.
+
+Each ``*_FIELDS`` tuple names the keys an endpoint returns. The same names are
+used to build column projections in ``app.py``, so a field list is defined once
+and drives both the SQL query and the response body.
+"""
+
+
+def format_date(value):
+    return value.strftime('%Y-%m-%d')
+
+
+def format_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M')
+
+
+FORMATTERS = {
+    'date': format_date,
+    'date_of_joining': format_date,
+    'start_date': format_date,
+    'end_date': format_date,
+    'applied_at': format_datetime,
+}
+
+EMPLOYEE_LIST_FIELDS = (
+    'id', 'name', 'email', 'phone', 'department', 'designation', 'date_of_joining',
+    'basic_salary', 'is_active',
+)
+
+EMPLOYEE_PROFILE_FIELDS = (
+    'id', 'name', 'email', 'phone', 'department', 'designation', 'date_of_joining',
+    'basic_salary', 'hra', 'da', 'ta', 'other_allowances',
+)
+
+EMPLOYEE_DETAIL_FIELDS = EMPLOYEE_PROFILE_FIELDS + (
+    'pf_deduction', 'tax_deduction', 'other_deductions', 'is_active',
+)
+
+ATTENDANCE_FIELDS = ('id', 'employee_id', 'employee_name', 'date', 'status', 'remarks')
+
+EMPLOYEE_ATTENDANCE_FIELDS = ('date', 'status', 'remarks')
+
+EMPLOYEE_LEAVE_FIELDS = (
+    'id', 'leave_type', 'start_date', 'end_date', 'days', 'reason', 'status', 'applied_at',
+)
+
+LEAVE_FIELDS = ('id', 'employee_id', 'employee_name') + EMPLOYEE_LEAVE_FIELDS[1:]
+
+PAYROLL_FIELDS = (
+    'id', 'employee_id', 'employee_name', 'month', 'year', 'gross_salary',
+    'total_deductions', 'net_salary', 'status',
+)
+
+PAYSLIP_FIELDS = (
+    'id', 'month', 'year', 'basic_salary', 'hra', 'da', 'ta', 'other_allowances',
+    'gross_salary', 'pf_deduction', 'tax_deduction', 'other_deductions',
+    'total_deductions', 'net_salary', 'working_days', 'present_days', 'absent_days',
+    'status',
+)
+
+PAYSLIP_EXPORT_FIELDS = (
+    'employee_id', 'employee_name', 'department', 'designation',
+) + PAYSLIP_FIELDS
+
+
+def serialize(row, fields):
+    """Build the response dict for ``row`` (an ORM object or a result row)."""
+    data = {}
+    for field in fields:
+        value = getattr(row, field)
+        formatter = FORMATTERS.get(field)
+        data[field] = formatter(value) if formatter else value
+    return data
@@ -1,5 +1,56 @@
 let currentTab = 'employees';
 let employees = [];
+let employeesSince = null;
+let attendanceRecords = [];
+let attendanceCursor = null;
+let attendanceSince = null;
+let leaves = [];
+let leavesSince = null;
+let payrolls = [];
+let payrollSince = null;
+let payrollPeriod = null;
+
+const PAGE_SIZE = 500;
+
+async function fetchPage(url, cursor = null, limit = PAGE_SIZE) {
+    const params = new URLSearchParams({ limit });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`${url}${url.includes('?') ? '&' : '?'}${params}`);
+    return response.json();
+}
+
+// Returns every row plus the first page's `since` token, which covers
+// changes made while the later pages were being fetched.
+async function fetchAllPages(url) {
+    let items = [];
+    let since = null;
+    let cursor = null;
+    do {
+        const page = await fetchPage(url, cursor);
+        items = items.concat(page.items);
+        since = since || page.since;
+        cursor = page.next_cursor;
+    } while (cursor);
+    return { items, since };
+}
+
+// Rows changed since `since`, or null when the server asks for a full reload.
+async function fetchChanges(url, since) {
+    const response = await fetch(`${url}${url.includes('?') ? '&' : '?'}since=${encodeURIComponent(since)}`);
+    if (!response.ok) return null;
+    return response.json();
+}
+
+function mergeChanges(items, changes, compare) {
+    const merged = new Map(items.map(item => [item.id, item]));
+    changes.forEach(item => merged.set(item.id, item));
+    return [...merged.values()].sort(compare);
+}
+
+const byId = (a, b) => a.id - b.id;
+const byNewestDate = (a, b) => b.date.localeCompare(a.date) || b.id - a.id;
+const byNewestApplied = (a, b) => b.applied_at.localeCompare(a.applied_at) || b.id - a.id;
+const byNewestId = (a, b) => b.id - a.id;
 
 document.addEventListener('DOMContentLoaded', () => {
     initYearSelects();
@@ -51,8 +102,13 @@ function showTab(tabName) {
 
 async function loadEmployees() {
     try {
-        const response = await fetch('/api/admin/employees');
-        employees = await response.json();
+        const changes = employeesSince && await fetchChanges('/api/admin/employees', employeesSince);
+        if (changes) {
+            employees = mergeChanges(employees, changes.items, byId);
+            employeesSince = changes.since;
+        } else {
+            ({ items: employees, since: employeesSince } = await fetchAllPages('/api/admin/employees'));
+        }
         
         const html = `
             <table class="min-w-full">
@@ -173,10 +229,22 @@ async function markAttendance() {
     }
 }
 
-async function loadAttendance() {
+async function loadAttendance(append = false) {
     try {
-        const response = await fetch('/api/admin/attendance');
-        const records = await response.json();
+        const changes = !append && attendanceSince && await fetchChanges('/api/admin/attendance', attendanceSince);
+        if (changes) {
+            // Changes older than the loaded pages arrive with "Load more".
+            const oldest = attendanceRecords[attendanceRecords.length - 1];
+            attendanceRecords = mergeChanges(attendanceRecords, changes.items, byNewestDate)
+                .filter(rec => !attendanceCursor || !oldest || byNewestDate(rec, oldest) <= 0);
+            attendanceSince = changes.since;
+        } else {
+            const page = await fetchPage('/api/admin/attendance', append ? attendanceCursor : null, 100);
+            attendanceRecords = append ? attendanceRecords.concat(page.items) : page.items;
+            attendanceCursor = page.next_cursor;
+            if (!append) attendanceSince = page.since;
+        }
+        const records = attendanceRecords;
         
         const html = `
             <table class="min-w-full">
@@ -207,6 +275,9 @@ async function loadAttendance() {
                     `).join('')}
                 </tbody>
             </table>
+            ${attendanceCursor ? `
+                <button onclick="loadAttendance(true)" class="mt-4 bg-gray-200 text-gray-800 px-4 py-2 rounded hover:bg-gray-300">Load more</button>
+            ` : ''}
         `;
         
         document.getElementById('attendanceList').innerHTML = html;
@@ -217,14 +288,35 @@ async function loadAttendance() {
 
 async function loadLeaves() {
     try {
-        const response = await fetch('/api/admin/leaves');
-        const leaves = await response.json();
+        // Changes include leaves that were decided, which drop out of the list.
+        let changes = leavesSince && await fetchChanges('/api/admin/leaves', leavesSince);
+        if (!changes) {
+            leaves = [];
+            changes = await fetchChanges('/api/admin/leaves', 0);
+        }
+        leaves = mergeChanges(leaves, changes.items, byNewestApplied).filter(leave => leave.status === 'pending');
+        leavesSince = changes.since;
+        
+        const pending = leaves.filter(leave => leave.status === 'pending');
+        const bulkActions = pending.length ? `
+            <div class="flex items-center gap-2 pb-4 border-b">
+                <input type="checkbox" id="selectAllLeaves" onchange="toggleAllLeaves(this.checked)">
+                <label for="selectAllLeaves" class="text-sm text-gray-600 mr-4">Select all</label>
+                <button onclick="bulkUpdateLeaveStatus('approved')" 
+                        class="bg-green-600 text-white px-3 py-1 rounded text-sm hover:bg-green-700">Approve selected</button>
+                <button onclick="bulkUpdateLeaveStatus('rejected')" 
+                        class="bg-red-600 text-white px-3 py-1 rounded text-sm hover:bg-red-700">Reject selected</button>
+            </div>
+        ` : '';
         
         const html = leaves.map(leave => `
             <div class="border-b py-4">
                 <div class="flex justify-between items-start">
                     <div>
-                        <h3 class="font-semibold">${leave.employee_name}</h3>
+                        <h3 class="font-semibold">
+                            ${leave.status === 'pending' ? `<input type="checkbox" class="leave-select mr-2" value="${leave.id}">` : ''}
+                            ${leave.employee_name}
+                        </h3>
                         <p class="text-sm text-gray-600">${leave.leave_type} - ${leave.days} days</p>
                         <p class="text-sm text-gray-600">${leave.start_date} to ${leave.end_date}</p>
                         <p class="text-sm mt-2">${leave.reason}</p>
@@ -245,7 +337,7 @@ async function loadLeaves() {
             </div>
         `).join('');
         
-        document.getElementById('leavesList').innerHTML = html || '<p class="text-gray-500">No leave applications</p>';
+        document.getElementById('leavesList').innerHTML = html ? bulkActions + html : '<p class="text-gray-500">No leave applications</p>';
     } catch (error) {
         console.error('Error loading leaves:', error);
     }
@@ -268,6 +360,35 @@ async function updateLeaveStatus(leaveId, status) {
     }
 }
 
+function toggleAllLeaves(checked) {
+    document.querySelectorAll('.leave-select').forEach(box => box.checked = checked);
+}
+
+async function bulkUpdateLeaveStatus(status) {
+    const leaveIds = [...document.querySelectorAll('.leave-select:checked')].map(box => Number(box.value));
+    if (!leaveIds.length) {
+        alert('Please select at least one leave application');
+        return;
+    }
+    
+    try {
+        const response = await fetch('/api/admin/leaves/bulk', {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ leave_ids: leaveIds, status })
+        });
+        
+        const result = await response.json();
+        if (result.success) {
+            alert(`${result.updated} leave applications ${status}` +
+                (status === 'approved' ? `, ${result.attendance_created} attendance days marked as leave` : ''));
+            loadLeaves();
+        }
+    } catch (error) {
+        console.error('Error updating leaves:', error);
+    }
+}
+
 async function processPayroll() {
     const month = document.getElementById('payrollMonth').value;
     const year = document.getElementById('payrollYear').value;
@@ -282,8 +403,7 @@ async function processPayroll() {
             
             const result = await response.json();
             if (result.success) {
-                alert(result.message);
-                loadPayroll();
+                pollPayrollJob(result.status_url);
             }
         } catch (error) {
             console.error('Error processing payroll:', error);
@@ -292,13 +412,68 @@ async function processPayroll() {
     }
 }
 
+async function pollPayrollJob(statusUrl) {
+    const container = document.getElementById('payrollJobStatus');
+    container.classList.remove('hidden');
+    
+    try {
+        const response = await fetch(statusUrl);
+        const job = await response.json();
+        const percent = Math.round(job.progress * 100);
+        const resumable = job.stale || job.status === 'failed';
+        
+        container.innerHTML = `
+            <div class="flex justify-between text-sm text-gray-600 mb-1">
+                <span>Payroll ${job.month}/${job.year}: ${job.stale ? 'stalled' : job.status} (${job.employees_done}/${job.total_employees} employees)</span>
+                <span>${job.processed_count} processed${job.employees_per_second ? ` · ${job.employees_per_second}/s` : ''}</span>
+            </div>
+            <div class="w-full bg-gray-200 rounded h-2">
+                <div class="bg-green-600 h-2 rounded" style="width: ${percent}%"></div>
+            </div>
+            ${job.errors.map(e => `<p class="text-sm text-red-600 mt-1">Shard ${e.shard}: ${e.error}</p>`).join('')}
+            ${resumable ? `
+                <button onclick="resumePayrollJob('${statusUrl}')" 
+                        class="mt-2 bg-yellow-600 text-white px-3 py-1 rounded text-sm hover:bg-yellow-700">Resume</button>
+            ` : ''}
+        `;
+        
+        if (!job.stale && (job.status === 'queued' || job.status === 'running')) {
+            setTimeout(() => pollPayrollJob(statusUrl), 1000);
+        } else {
+            loadPayroll();
+        }
+    } catch (error) {
+        console.error('Error polling payroll job:', error);
+    }
+}
+
+async function resumePayrollJob(statusUrl) {
+    try {
+        const response = await fetch(`${statusUrl}/resume`, { method: 'POST' });
+        const result = await response.json();
+        if (result.success) {
+            pollPayrollJob(result.status_url);
+        }
+    } catch (error) {
+        console.error('Error resuming payroll job:', error);
+        alert('Failed to resume payroll');
+    }
+}
+
 async function loadPayroll() {
     const month = document.getElementById('payrollMonth').value;
     const year = document.getElementById('payrollYear').value;
     
     try {
-        const response = await fetch(`/api/admin/payroll?month=${month}&year=${year}`);
-        const payrolls = await response.json();
+        const url = `/api/admin/payroll?month=${month}&year=${year}`;
+        const changes = payrollPeriod === url && await fetchChanges(url, payrollSince);
+        if (changes) {
+            payrolls = mergeChanges(payrolls, changes.items, byNewestId);
+            payrollSince = changes.since;
+        } else {
+            ({ items: payrolls, since: payrollSince } = await fetchAllPages(url));
+            payrollPeriod = url;
+        }
         
         const html = `
             <table class="min-w-full">
@@ -335,6 +510,12 @@ async function loadPayroll() {
     }
 }
 
+function exportPayroll(format) {
+    const month = document.getElementById('payrollMonth').value;
+    const year = document.getElementById('payrollYear').value;
+    window.location = `/api/admin/payroll/export?month=${month}&year=${year}&format=${format}`;
+}
+
 async function loadReports() {
     const month = document.getElementById('reportMonth').value;
     const year = document.getElementById('reportYear').value;
@@ -363,6 +544,53 @@ async function loadReports() {
         `;
         
         document.getElementById('reportSummary').innerHTML = html;
+        
+        const change = summary.change_from_previous_month;
+        const money = value => value === null ? '-' : `₹${value.toFixed(2)}`;
+        const signed = value => `${value >= 0 ? '+' : '-'}₹${Math.abs(value).toFixed(2)}`;
+        
+        document.getElementById('reportBreakdown').innerHTML = `
+            <div class="grid grid-cols-1 md:grid-cols-4 gap-4 mb-6">
+                <div class="bg-gray-50 p-4 rounded-lg">
+                    <h3 class="text-sm font-semibold text-gray-600">Median Net Salary</h3>
+                    <p class="text-xl font-bold">${money(summary.median_net_salary)}</p>
+                </div>
+                <div class="bg-gray-50 p-4 rounded-lg">
+                    <h3 class="text-sm font-semibold text-gray-600">Net Salary Range</h3>
+                    <p class="text-xl font-bold">${money(summary.min_net_salary)} - ${money(summary.max_net_salary)}</p>
+                </div>
+                <div class="bg-gray-50 p-4 rounded-lg">
+                    <h3 class="text-sm font-semibold text-gray-600">Employees vs Last Month</h3>
+                    <p class="text-xl font-bold">${change.total_employees >= 0 ? '+' : ''}${change.total_employees}</p>
+                </div>
+                <div class="bg-gray-50 p-4 rounded-lg">
+                    <h3 class="text-sm font-semibold text-gray-600">Net Salary vs Last Month</h3>
+                    <p class="text-xl font-bold">${signed(change.total_net_salary)}</p>
+                </div>
+            </div>
+            <table class="min-w-full">
+                <thead class="bg-gray-50">
+                    <tr>
+                        <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Department</th>
+                        <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Employees</th>
+                        <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Gross Salary</th>
+                        <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Deductions</th>
+                        <th class="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">Net Salary</th>
+                    </tr>
+                </thead>
+                <tbody class="bg-white divide-y divide-gray-200">
+                    ${summary.by_department.map(d => `
+                        <tr>
+                            <td class="px-6 py-4 whitespace-nowrap">${d.department || '-'}</td>
+                            <td class="px-6 py-4 whitespace-nowrap">${d.total_employees}</td>
+                            <td class="px-6 py-4 whitespace-nowrap">₹${d.total_gross_salary.toFixed(2)}</td>
+                            <td class="px-6 py-4 whitespace-nowrap">₹${d.total_deductions.toFixed(2)}</td>
+                            <td class="px-6 py-4 whitespace-nowrap font-semibold">₹${d.total_net_salary.toFixed(2)}</td>
+                        </tr>
+                    `).join('')}
+                </tbody>
+            </table>
+        `;
     } catch (error) {
         console.error('Error loading reports:', error);
     }
@@ -215,6 +215,11 @@ function showPayslipDetails(slip) {
             <div class="text-sm text-gray-600 border-t pt-4">
                 <p>Working Days: ${slip.working_days} | Present: ${slip.present_days} | Absent: ${slip.absent_days}</p>
             </div>
+
+            <div class="text-right">
+                <a href="/api/employee/payslips/${slip.year}/${slip.month}/document" target="_blank" rel="noopener"
+                   class="bg-blue-600 text-white px-4 py-2 rounded hover:bg-blue-700">Open printable payslip</a>
+            </div>
         </div>
     `;
     
@@ -0,0 +1,31 @@
+import pytest
+
+from app import DevelopmentConfig, create_app, db, employee_cache, snapshot_cache
+from migrations import upgrade
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on a fresh SQLite database, with payroll and payslip work run
+    inline rather than on worker threads."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'payroll.db'}")
+    monkeypatch.setenv('PAYROLL_WORKERS', '0')
+    monkeypatch.setenv('PAYSLIP_WORKERS', '0')
+    monkeypatch.setenv('ARCHIVE_DIR', str(tmp_path / 'archive'))
+    monkeypatch.setenv('ANALYTICS_DIR', str(tmp_path / 'analytics'))
+    app = create_app(DevelopmentConfig())
+    with app.app_context():
+        upgrade(db.engine, db.metadata)
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    employee_cache.clear()
+    snapshot_cache.clear()
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    client.post('/api/init-db')
+    client.post('/login', json={'username': 'admin', 'password': 'admin123'})
+    return client
@@ -0,0 +1,60 @@
+from datetime import date, datetime
+
+import pytest
+
+from app import (
+    Attendance, AttendanceMonth, AttendanceMonthlySummary, AttendanceRemark, Leave, archive_year, db, employee_cache,
+    rebuild_attendance_summary, recompute_dirty_payroll, seed_synthetic_data, upsert_attendance
+)
+
+
+@pytest.mark.parametrize('storage', ['rows', 'bitmap'])
+def test_archived_attendance_reads_like_live_attendance(app, storage):
+    pytest.importorskip('pyarrow')
+    app.config['ATTENDANCE_STORAGE'] = storage
+    year = datetime.now().year - 1
+    seed_synthetic_data(3, 2)
+    upsert_attendance([{'employee_id': 1, 'date': date(year, 3, 2), 'status': 'half-day', 'remarks': 'Clinic'}])
+    recompute_dirty_payroll()
+    db.session.commit()
+
+    client = app.test_client()
+    client.post('/login', json={'username': 'emp1', 'password': 'password'})
+    paths = [f'/api/employee/attendance?month={month}&year={year}' for month in range(1, 13)]
+    live = [client.get(path).get_json() for path in paths]
+    assert {'date': f'{year}-03-02', 'status': 'half-day', 'remarks': 'Clinic'} in live[2]
+    summaries = db.session.query(AttendanceMonthlySummary).filter_by(year=year).count()
+
+    archive_year(year)
+    employee_cache.clear()
+
+    assert [client.get(path).get_json() for path in paths] == live
+    for model in (Attendance, AttendanceRemark):
+        assert db.session.query(model).filter(model.date >= date(year, 1, 1), model.date < date(year + 1, 1, 1)).count() == 0
+    assert db.session.query(AttendanceMonth).filter_by(year=year).count() == 0
+    rebuild_attendance_summary()
+    db.session.commit()
+    assert db.session.query(AttendanceMonthlySummary).filter_by(year=year).count() == summaries
+
+
+def test_writes_to_an_archived_year_are_rejected(app, admin_client):
+    pytest.importorskip('pyarrow')
+    year = datetime.now().year - 1
+    seed_synthetic_data(2, 2)
+    leave = Leave(employee_id=1, leave_type='sick', start_date=date(year, 3, 20), end_date=date(year, 3, 21),
+                  days=2, reason='Flu')
+    db.session.add(leave)
+    db.session.commit()
+    archive_year(year)
+
+    response = admin_client.post('/api/admin/attendance', json={
+        'employee_id': 1, 'date': f'{year}-03-20', 'status': 'present'
+    })
+    assert response.status_code == 400
+    assert response.get_json()['error'] == f'Attendance for {year} is archived'
+    for path, body in [('/api/admin/leaves', {'leave_id': leave.id, 'status': 'approved'}),
+                       ('/api/admin/leaves/bulk', {'leave_ids': [leave.id], 'status': 'approved'})]:
+        response = admin_client.put(path, json=body)
+        assert response.status_code == 400, path
+    db.session.expire_all()
+    assert db.session.get(Leave, leave.id).status == 'pending'
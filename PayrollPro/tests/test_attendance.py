@@ -0,0 +1,71 @@
+import json
+from datetime import date
+
+from app import Employee, db, pack_attendance
+
+
+def add_employee(name='Asha'):
+    employee = Employee(name=name, email=f'{name.lower()}@example.com', date_of_joining=date(2024, 1, 1),
+                        basic_salary=40000)
+    db.session.add(employee)
+    db.session.commit()
+    return employee
+
+
+def test_bulk_attendance_reports_bad_rows_without_failing_the_batch(admin_client):
+    employee = add_employee()
+    response = admin_client.post('/api/admin/attendance/bulk', json=[
+        {'employee_id': employee.id, 'date': '2025-03-03', 'status': 'present'},
+        {'employee_id': employee.id, 'date': '2025-03-04', 'status': 'present', 'remarks': 123},
+        {'employee_id': employee.id, 'date': '2025-03-05', 'status': 'sleeping'},
+        {'employee_id': employee.id, 'date': 'yesterday', 'status': 'present'},
+        {'employee_id': employee.id, 'date': '2025-03-06', 'status': 'absent', 'remarks': 'Sick'},
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['upserted'] == 2
+    assert [error['row'] for error in body['errors']] == [1, 2, 3]
+    assert 'Remarks must be a string' in body['errors'][0]['error']
+
+
+def test_bulk_attendance_reports_repeated_days(admin_client):
+    employee = add_employee()
+    response = admin_client.post('/api/admin/attendance/bulk', json=[
+        {'employee_id': employee.id, 'date': '2025-03-03', 'status': 'present'},
+        {'employee_id': employee.id, 'date': '2025-03-04', 'status': 'present'},
+        {'employee_id': employee.id, 'date': '2025-03-03', 'status': 'absent'},
+    ])
+    body = response.get_json()
+    assert body['upserted'] == 2
+    assert body['errors'] == [{'row': 2, 'error': 'Duplicate of row 0'}]
+    response = admin_client.get(f'/api/admin/attendance?employee_id={employee.id}&month=3&year=2025')
+    assert {row['date']: row['status'] for row in response.get_json()} == {'2025-03-03': 'present', '2025-03-04': 'present'}
+
+
+def test_packed_attendance_keeps_row_ids(app, admin_client):
+    first, second = add_employee(), add_employee('Ravi')
+    admin_client.post('/api/admin/attendance/bulk', json=[
+        {'employee_id': employee.id, 'date': f'2025-03-0{day}', 'status': status}
+        for day, status in [(3, 'present'), (4, 'absent'), (5, 'half-day')] for employee in (second, first)
+    ])
+    path = '/api/admin/attendance?month=3&year=2025'
+    rows = admin_client.get(path).get_data()
+
+    pack_attendance(delete_rows=True)
+    app.config['ATTENDANCE_STORAGE'] = 'bitmap'
+    assert admin_client.get(path).get_data() == rows
+
+    admin_client.post('/api/admin/attendance/bulk', json=[
+        {'employee_id': first.id, 'date': '2025-03-04', 'status': 'present'},
+        {'employee_id': first.id, 'date': '2025-03-06', 'status': 'present'},
+        {'employee_id': second.id, 'date': '2025-03-06', 'status': 'present'},
+    ])
+    listing = admin_client.get(path).get_json()
+    ids = {(row['employee_id'], row['date']): row['id'] for row in listing}
+    before = {(row['employee_id'], row['date']): row['id'] for row in json.loads(rows)}
+    assert ids[(first.id, '2025-03-04')] == before[(first.id, '2025-03-04')]
+    assert len(set(ids.values())) == 8
+    assert min(ids[(employee.id, '2025-03-06')] for employee in (first, second)) > max(before.values())
+    assert [row['id'] for row in listing] == [
+        row['id'] for row in sorted(listing, key=lambda row: (row['date'], row['id']), reverse=True)
+    ]
@@ -0,0 +1,44 @@
+import csv
+import io
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from app import seed_synthetic_data
+
+
+def last_month():
+    today = datetime.now()
+    return (12, today.year - 1) if today.month == 1 else (today.month - 1, today.year)
+
+
+@pytest.fixture
+def export(app, admin_client):
+    """Fetch last month's payslip export of seeded data in a format."""
+    app.config['STREAM_BATCH_SIZE'] = 4
+    seed_synthetic_data(10, 1)
+    month, year = last_month()
+
+    def get(export_format):
+        response = admin_client.get(f'/api/admin/payroll/export?month={month}&year={year}&format={export_format}')
+        assert response.status_code == 200
+        return response.get_data()
+
+    return get
+
+
+def test_csv_and_zip_exports(export):
+    rows = list(csv.DictReader(io.StringIO(export('csv').decode())))
+    assert len(rows) == 10
+    with zipfile.ZipFile(io.BytesIO(export('zip'))) as archive:
+        assert len(archive.namelist()) == 10
+
+
+def test_parquet_export_matches_csv(export):
+    pq = pytest.importorskip('pyarrow.parquet')
+    table = pq.read_table(io.BytesIO(export('parquet')))
+    rows = list(csv.DictReader(io.StringIO(export('csv').decode())))
+    assert table.num_rows == len(rows) == 10
+    assert table.column_names == list(rows[0])
+    assert [str(value) for value in table.column('employee_id').to_pylist()] == [row['employee_id'] for row in rows]
@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.mark.parametrize('body, error', [
+    ('{', 'Expected a JSON object'),
+    ('[1, 2]', 'Expected a JSON object'),
+    ('{"leave_ids": [1], "status": "pending"}', 'status must be approved or rejected'),
+    ('{"leave_ids": ["x"], "status": "approved"}', 'leave_ids must be a list of integers'),
+    ('{"leave_ids": [true], "status": "approved"}', 'leave_ids must be a list of integers'),
+    ('{"leave_ids": 1, "status": "approved"}', 'leave_ids must be a list of integers'),
+])
+def test_bulk_leave_update_rejects_malformed_bodies(admin_client, body, error):
+    response = admin_client.put('/api/admin/leaves/bulk', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': error}
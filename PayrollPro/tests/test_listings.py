@@ -0,0 +1,75 @@
+import base64
+from datetime import date, datetime
+
+from sqlalchemy import event
+
+from app import Attendance, Employee, Leave, db, run_payroll
+
+
+def seed(first, count, month, year):
+    """Add employees numbered from ``first``, each with two attendance days
+    and an approved leave in the month, and process the month's payroll."""
+    for number in range(first, first + count):
+        employee = Employee(name=f'Employee {number}', email=f'employee{number}@example.com',
+                            department='Engineering', date_of_joining=date(2024, 1, 1), basic_salary=30000)
+        db.session.add(employee)
+        db.session.flush()
+        db.session.add_all([
+            Attendance(employee_id=employee.id, date=date(year, month, day), status='present') for day in (1, 2)
+        ])
+        db.session.add(Leave(employee_id=employee.id, leave_type='casual', start_date=date(year, month, 3),
+                             end_date=date(year, month, 3), days=1, reason='Errand', status='approved'))
+    db.session.commit()
+    run_payroll(month, year)
+
+
+def statements_per_listing(client, paths):
+    """The number of SQL statements each path issues, and how many items it
+    returned."""
+    counts = {}
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for path in paths:
+            statements.clear()
+            response = client.get(path)
+            assert response.status_code == 200, path
+            body = response.get_json()
+            items = body if isinstance(body, list) else body['items']
+            counts[path] = (len(statements), len(items))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return counts
+
+
+def test_listing_statements_do_not_grow_with_rows(app, admin_client):
+    app.config['PAGE_SIZE'] = app.config['MAX_PAGE_SIZE'] = 100000
+    today = datetime.now()
+    month, year = (12, today.year - 1) if today.month == 1 else (today.month - 1, today.year)
+    paths = [
+        '/api/admin/employees',
+        f'/api/admin/attendance?month={month}&year={year}',
+        '/api/admin/leaves?status=approved',
+        f'/api/admin/payroll?month={month}&year={year}',
+    ]
+
+    seed(1, 3, month, year)
+    small = statements_per_listing(admin_client, paths)
+    seed(4, 27, month, year)
+    large = statements_per_listing(admin_client, paths)
+
+    for path in paths:
+        assert large[path][1] >= 5 * small[path][1] > 0, path
+        assert large[path][0] == small[path][0], path
+
+
+def test_malformed_cursors_are_rejected(admin_client):
+    for values in (b'[null]', b'["x"]', b'{}', b'[1, 2]', b'not json'):
+        cursor = base64.urlsafe_b64encode(values).decode()
+        response = admin_client.get(f'/api/admin/employees?limit=10&cursor={cursor}')
+        assert response.status_code == 400, values
+        assert response.get_json() == {'error': 'Invalid cursor'}
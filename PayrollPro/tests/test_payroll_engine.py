@@ -0,0 +1,97 @@
+from datetime import date
+
+from app import Attendance, Employee, Leave, Payroll, db, run_payroll
+from payroll_engine import PAYROLL_COLUMNS
+
+EMPLOYEES = [
+    # basic, hra, da, ta, other allowances, pf, tax, other deductions
+    (50000, 20000, 5000, 1600, 2500, 6000, 4200, 0),
+    (33333.33, 13333.33, 0, 1250.5, 0, 3999.99, 0, 150.75),
+    (87500.5, 35000.25, 8750.05, 3200, 1234.56, 10500.06, 15750.1, 999.99),
+    (12000, 0, 0, 0, 0, 0, 0, 0),
+]
+
+
+def per_employee_payroll(employee, month, year):
+    """The payroll row as the original per-employee loop computed it, from
+    the employee's attendance rows."""
+    start_date = date(year, month, 1)
+    end_date = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    working_days = (end_date - start_date).days
+    records = Attendance.query.filter(
+        Attendance.employee_id == employee.id, Attendance.date >= start_date, Attendance.date < end_date
+    ).all()
+    present_days = sum(1 for a in records if a.status in ['present', 'half-day'])
+    absent_days = sum(1 for a in records if a.status == 'absent')
+
+    gross_salary = employee.basic_salary + employee.hra + employee.da + employee.ta + employee.other_allowances
+    total_deductions = employee.pf_deduction + employee.tax_deduction + employee.other_deductions
+    per_day_salary = gross_salary / working_days
+    absence_deduction = per_day_salary * absent_days
+    net_salary = gross_salary - total_deductions - absence_deduction
+    return {
+        'employee_id': employee.id,
+        'basic_salary': employee.basic_salary,
+        'hra': employee.hra,
+        'da': employee.da,
+        'ta': employee.ta,
+        'other_allowances': employee.other_allowances,
+        'gross_salary': gross_salary,
+        'pf_deduction': employee.pf_deduction,
+        'tax_deduction': employee.tax_deduction,
+        'other_deductions': employee.other_deductions + absence_deduction,
+        'total_deductions': total_deductions + absence_deduction,
+        'net_salary': net_salary,
+        'working_days': working_days,
+        'present_days': present_days,
+        'absent_days': absent_days,
+    }
+
+
+def test_vectorized_payroll_matches_per_employee_formula(app, admin_client):
+    month, year = 2, 2025
+    employees = []
+    for index, amounts in enumerate(EMPLOYEES):
+        employee = Employee(
+            name=f'Employee {index}', email=f'employee{index}@example.com', department='Engineering',
+            date_of_joining=date(2024, 1, 1),
+            **dict(zip(['basic_salary', 'hra', 'da', 'ta', 'other_allowances',
+                        'pf_deduction', 'tax_deduction', 'other_deductions'], amounts))
+        )
+        db.session.add(employee)
+        employees.append(employee)
+    db.session.commit()
+
+    statuses = ['present', 'present', 'absent', 'half-day', 'present', 'absent', 'leave']
+    rows = [
+        {'employee_id': employee.id, 'date': f'{year}-{month:02d}-{day:02d}',
+         'status': statuses[(day + index) % len(statuses)]}
+        for index, employee in enumerate(employees[:3])
+        for day in range(1, 21 - 5 * index)
+    ]
+    # Outside the month; must not count.
+    rows.append({'employee_id': employees[0].id, 'date': f'{year}-03-01', 'status': 'absent'})
+    for row in rows:
+        assert admin_client.post('/api/admin/attendance', json=row).status_code == 200
+
+    leaves = [
+        Leave(employee_id=employees[1].id, leave_type='sick', start_date=date(year, month, 20),
+              end_date=date(year, month, 24), days=5, reason='Flu'),
+        Leave(employee_id=employees[3].id, leave_type='casual', start_date=date(year, month, 27),
+              end_date=date(year, month + 1, 2), days=4, reason='Trip'),
+    ]
+    db.session.add_all(leaves)
+    db.session.commit()
+    for leave in leaves:
+        response = admin_client.put('/api/admin/leaves', json={'leave_id': leave.id, 'status': 'approved'})
+        assert response.status_code == 200
+
+    expected = [per_employee_payroll(employee, month, year) for employee in employees]
+    assert run_payroll(month, year) == len(employees)
+
+    actual = [
+        {column: getattr(payroll, column) for column in PAYROLL_COLUMNS}
+        for payroll in Payroll.query.filter_by(month=month, year=year).order_by(Payroll.employee_id)
+    ]
+    assert actual == expected
+    assert any(row['absent_days'] for row in expected)
@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+
+from app import Config, Employee, PayrollJob, db, insert_payroll
+
+
+def add_employees(count):
+    db.session.add_all(
+        Employee(name=f'Employee {number}', email=f'employee{number}@example.com', department='Engineering',
+                 date_of_joining=date(2024, 1, 1), basic_salary=30000)
+        for number in range(count)
+    )
+    db.session.commit()
+
+
+def process(client, month=3, year=2025):
+    response = client.post('/api/admin/payroll/process', json={'month': month, 'year': year})
+    assert response.status_code == 202
+    # Shards run in their own app context, so this session's job is stale.
+    db.session.expire_all()
+    return client.get(response.get_json()['status_url']).get_json()
+
+
+def test_a_failed_chunk_retried_per_employee_counts_as_one_chunk(app, admin_client, monkeypatch):
+    app.config['PAYROLL_CHUNK_SIZE'] = 2
+    add_employees(5)
+    calls = []
+
+    def insert_payroll_failing_once(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError('Connection lost')
+        return insert_payroll(*args)
+
+    monkeypatch.setattr('app.insert_payroll', insert_payroll_failing_once)
+    status = process(admin_client)
+    assert status['status'] == 'completed'
+    assert status['processed_count'] == 5
+    assert status['chunks_done'] == 3
+
+
+def test_a_stale_job_is_resumed_instead_of_blocking_the_month(app, admin_client, monkeypatch):
+    add_employees(5)
+    with monkeypatch.context() as patch:
+        # The process that queued the job dies before running it.
+        patch.setattr('app.start_payroll_shards', lambda job, shards: None)
+        queued = process(admin_client)
+    assert (queued['status'], queued['stale'], queued['employees_done'], queued['progress']) == ('queued', False, 0, 0)
+
+    status = process(admin_client)
+    assert (status['job_id'], status['status']) == (queued['job_id'], 'queued')
+
+    job = db.session.get(PayrollJob, queued['job_id'])
+    job.created_at -= timedelta(seconds=app.config['PAYROLL_JOB_STALE_SECONDS'] + 1)
+    db.session.commit()
+    assert admin_client.get(f"/api/admin/payroll/jobs/{job.id}").get_json()['stale']
+
+    status = process(admin_client)
+    assert status['job_id'] == queued['job_id']
+    assert (status['status'], status['stale'], status['processed_count']) == ('completed', False, 5)
+    assert (status['employees_done'], status['progress']) == (5, 1.0)
+
+
+def test_sqlite_defaults_to_one_payroll_worker(monkeypatch):
+    monkeypatch.delenv('PAYROLL_WORKERS', raising=False)
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///payroll.db')
+    assert Config().PAYROLL_WORKERS == 1
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://localhost/payroll')
+    monkeypatch.setattr('os.cpu_count', lambda: 8)
+    assert Config().PAYROLL_WORKERS == 8
@@ -0,0 +1,8 @@
+from app import db, hot_queries
+from migrations import sequential_scans
+
+
+def test_hot_queries_are_served_by_indexes(app):
+    with db.engine.begin() as connection:
+        scans = {name: sequential_scans(connection, stmt) for name, stmt in hot_queries()}
+    assert {name: lines for name, lines in scans.items() if lines} == {}